@@ -0,0 +1,229 @@
+"""
+Times and memory-profiles every stage of the main.py pipeline on synthetic schedules.
+
+Run from the repository root:
+
+    python -m benchmarks.benchmark_stages --sizes 1000 10000 100000 1000000
+
+Results are written as JSON (one record per size and stage, plus the environment), so runs can be
+compared over time. They go to benchmarks/results/, which git ignores, unless --output is given.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from functions.import_data import import_schedule
+from functions.explode_schedule import explode_schedule
+from functions.data_enrich import add_movement_flag, add_day_eight
+from functions.time_conversion import convert_time_columns_to_fraction, create_utc_floats
+from functions.build_connections import build_and_filter_connections
+from functions.connections_export import export_connections, OUTPUT_FORMATS
+from functions.synthetic_schedule import generate_airport_data, generate_schedule, lines_for_flight_days
+from utils.config import HUB, ROOT_DIR, time_columns
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+# Flight-days per week at one hub before another hub is added. Keeps the banks at a realistic size as the
+# schedule grows; connections are built at HUB only, so the connection stages scale with the whole schedule
+# through the arrival side of the join
+HUB_FLIGHT_DAYS = 5000
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+
+def pipeline_stages(airport_data, schedule_path, output_dir, output_format = 'xlsx'):
+    """
+    Returns the stages of main.py in order, as (name, function of the previous stage's output).
+
+    Parameters:
+    airport_data (dict): Airport data used for circuity.
+    schedule_path (str): Path of the schedule file read by the import stage.
+    output_dir (str): Directory the export stage writes to.
+    output_format (str): Format of the export stage, one of OUTPUT_FORMATS. Defaults to the one of main.py.
+
+    Returns:
+    list: (stage name, callable) tuples.
+    """
+    return [
+        ('import_schedule', lambda _: import_schedule(schedule_path, sheet_name=0)),
+        ('explode_schedule', explode_schedule),
+        ('add_movement_flag', add_movement_flag),
+        ('add_day_eight', add_day_eight),
+        ('convert_time_columns_to_fraction', lambda df: convert_time_columns_to_fraction(df, time_columns)),
+        ('create_utc_floats', create_utc_floats),
+        ('build_and_filter_connections', lambda df: build_and_filter_connections(df, airport_data=airport_data)),
+        ('export_connections', lambda dfs: export_connections(
+            *dfs, output_format=output_format, output_path=os.path.join(output_dir, 'connections'))),
+    ]
+
+
+def _copy(value):
+    # Stages may modify their input in place, every repeat gets a fresh copy
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy(item) for item in value)
+    return value
+
+
+def _rows(value):
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_rows(item) for item in value)
+    return None
+
+
+def measure(function, argument, repeat = 1, memory = True):
+    """
+    Runs a stage, timing it and recording its peak traced memory.
+
+    Timed runs are done without tracemalloc, which slows allocation-heavy code down. Peak memory
+    comes from one extra traced run.
+
+    Parameters:
+    function (callable): The stage.
+    argument: Input of the stage, copied before every run.
+    repeat (int): Number of timed runs.
+    memory (bool): Also measure the peak memory.
+
+    Returns:
+    tuple: (output of the last run, list of run times in seconds, peak memory in bytes or None).
+    """
+    times = []
+    for _ in range(repeat):
+        value = _copy(argument)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function(value)
+            times.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        value = _copy(argument)
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                function(value)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, times, peak
+
+
+def run_size(flight_days, repeat = 1, memory = True, n_airports = 300, n_banks = 6, input_format = 'xlsx', output_format = 'xlsx',
+             seed = 0):
+    """
+    Benchmarks every pipeline stage on a synthetic schedule of a given size.
+
+    Parameters:
+    flight_days (int): Target number of flight-days per week.
+    repeat (int): Number of timed runs per stage.
+    memory (bool): Also measure the peak memory of each stage.
+    n_airports (int): Number of airports of the synthetic network.
+    n_banks (int): Number of connection banks per day at each hub.
+    input_format (str): 'xlsx' or 'csv', the file format read by the import stage.
+    output_format (str): Format written by the export stage, one of OUTPUT_FORMATS.
+    seed (int): Seed of the generator.
+
+    Returns:
+    list: One result dict per stage. Stages after a failing one are not run.
+    """
+    n_hubs = max(1, math.ceil(flight_days / HUB_FLIGHT_DAYS))
+    hubs = [HUB] + [f'H{i:02d}' for i in range(1, n_hubs)]
+    airport_data = generate_airport_data(max(n_airports, 2 * n_hubs), hubs=hubs, seed=seed)
+    schedule = generate_schedule(airport_data, lines_for_flight_days(flight_days), hubs=hubs, n_banks=n_banks, seed=seed)
+    actual_flight_days = int(schedule['Dep Day'].str.count(r'\d').sum())
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        schedule_path = os.path.join(tmp_dir, f'schedule.{input_format}')
+        if input_format == 'csv':
+            schedule.to_csv(schedule_path, index=False)
+        else:
+            schedule.to_excel(schedule_path, index=False)
+
+        value = None
+        for stage, function in pipeline_stages(airport_data, schedule_path, tmp_dir, output_format):
+            record = {'flight_days': actual_flight_days, 'schedule_lines': len(schedule), 'hubs': n_hubs,
+                      'stage': stage, 'rows_in': _rows(value)}
+            try:
+                value, times, peak = measure(function, value, repeat=repeat, memory=memory)
+            except Exception as error:
+                record['error'] = f'{type(error).__name__}: {error}'
+                results.append(record)
+                print(f'{actual_flight_days:>9} flight-days  {stage:<34} failed: {record["error"]}')
+                break
+            record.update({'rows_out': _rows(value), 'seconds': min(times), 'seconds_all': times, 'peak_memory_bytes': peak})
+            results.append(record)
+            peak_text = f'{peak / 2**20:9.1f} MiB' if peak is not None else ''
+            print(f'{actual_flight_days:>9} flight-days  {stage:<34} {min(times):9.3f} s {peak_text}')
+    return results
+
+
+def environment():
+    """
+    Describes the environment of a benchmark run, so results can be compared across machines and commits.
+
+    Returns:
+    dict: Timestamp, git commit, Python, platform and library versions.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Times and memory-profiles every pipeline stage on synthetic schedules.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Schedule sizes in flight-days per week.')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per stage, the fastest is reported.')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced run measuring peak memory.')
+    parser.add_argument('--airports', type=int, default=300, help='Number of airports of the synthetic network.')
+    parser.add_argument('--banks', type=int, default=6, help='Connection banks per day at each hub.')
+    parser.add_argument('--input-format', choices=['xlsx', 'csv'], default='xlsx', help='File format read by the import stage.')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='xlsx', help='Format written by the export stage.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Result file, benchmarks/results/stages_<timestamp>.json by default.')
+    args = parser.parse_args(argv)
+
+    run = environment()
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(size, repeat=args.repeat, memory=not args.no_memory, n_airports=args.airports,
+                                n_banks=args.banks, input_format=args.input_format,
+                                output_format=args.output_format, seed=args.seed))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"stages_{run['timestamp'].replace(':', '').replace('+0000', 'Z')}.json")
+    with open(output, 'w') as f:
+        json.dump({'environment': run, 'parameters': vars(args), 'results': results}, f, indent=2)
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
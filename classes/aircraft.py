@@ -0,0 +1,23 @@
+class Aircraft:
+    """One aircraft of a rotation plan: its subfleet, where it starts the week and the legs it flies."""
+
+    __slots__ = ('number', 'subfleet', 'start_station', 'legs')
+
+    def __init__(self, number, subfleet, start_station, legs):
+        """
+        Parameters:
+        number (int): Aircraft number within the plan.
+        subfleet (str): Subfleet code.
+        start_station (str): Station the aircraft is at, or flying to, at the start of the week.
+        legs (numpy.ndarray): Positions of its legs in the plan's leg table, in flying order.
+        """
+        self.number = number
+        self.subfleet = subfleet
+        self.start_station = start_station
+        self.legs = legs
+
+    def __len__(self):
+        return len(self.legs)
+
+    def __repr__(self):
+        return f"Aircraft({self.number}, {self.subfleet!r}, start={self.start_station!r}, {len(self.legs)} legs)"
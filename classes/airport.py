@@ -0,0 +1,216 @@
+import os
+import pickle
+import numpy as np
+from functions.distance import distance_matrix
+from utils.config import AIRPORT_DATA_PATH, AIRPORT_REGISTRY_PATH
+
+# Record layout of the prebuilt binary registry, one fixed-size row per airport
+REGISTRY_DTYPE = np.dtype([
+    ('code', 'U3'),
+    ('latitude', 'f8'),
+    ('longitude', 'f8'),
+    ('timezone', 'U32'),
+])
+
+
+class Airport:
+    """A single airport, as returned by AirportRegistry lookups."""
+
+    __slots__ = ('code', 'latitude', 'longitude', 'timezone')
+
+    def __init__(self, code, latitude, longitude, timezone):
+        self.code = code
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+
+    def __repr__(self):
+        return f"Airport({self.code!r}, {self.latitude}, {self.longitude}, {self.timezone!r})"
+
+
+class AirportRegistry:
+    """
+    Array-backed airport reference data: codes map to integer ids, and latitude, longitude
+    and timezone are held in contiguous arrays indexed by id. Small registries can also hold the
+    distance matrix between their airports (see with_distances).
+    """
+
+    __slots__ = ('codes', 'latitudes', 'longitudes', 'timezones', 'distances', '_index')
+
+    def __init__(self, codes, latitudes, longitudes, timezones, distances=None):
+        self.codes = codes
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.timezones = timezones
+        self.distances = distances
+        self._index = {code: i for i, code in enumerate(codes.tolist())}
+
+    @classmethod
+    def from_airport_data(cls, airport_data):
+        """
+        Builds a registry from the dict-of-dicts airport data (code -> {'Latitude': ..., ...}).
+
+        Parameters:
+        airport_data (dict): Airport data keyed by code.
+
+        Returns:
+        AirportRegistry: The registry.
+        """
+        records = np.empty(len(airport_data), dtype=REGISTRY_DTYPE)
+        for i, (code, data) in enumerate(airport_data.items()):
+            records[i] = (code, data['Latitude'], data['Longitude'], data.get('Timezone') or '')
+        return cls.from_records(records)
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Builds a registry on top of a REGISTRY_DTYPE structured array, without copying it.
+
+        Parameters:
+        records (numpy.ndarray): Structured array (possibly memory-mapped).
+
+        Returns:
+        AirportRegistry: The registry.
+        """
+        return cls(records['code'], records['latitude'], records['longitude'], records['timezone'])
+
+    @classmethod
+    def load(cls, path=AIRPORT_REGISTRY_PATH, mmap=True):
+        """
+        Loads a registry saved with save(), memory-mapped by default.
+
+        Parameters:
+        path (str): Path to the .npy file.
+        mmap (bool): Memory-map the file instead of reading it.
+
+        Returns:
+        AirportRegistry: The registry.
+        """
+        return cls.from_records(np.load(path, mmap_mode='r' if mmap else None))
+
+    def save(self, path=AIRPORT_REGISTRY_PATH):
+        """
+        Writes the registry as a single structured .npy file that load() can memory-map.
+
+        Parameters:
+        path (str): Path to the .npy file.
+        """
+        records = np.empty(len(self), dtype=REGISTRY_DTYPE)
+        records['code'] = self.codes
+        records['latitude'] = self.latitudes
+        records['longitude'] = self.longitudes
+        records['timezone'] = self.timezones
+        np.save(path, records)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self._index
+
+    def __getitem__(self, code):
+        i = self._index[code]
+        return Airport(str(self.codes[i]), float(self.latitudes[i]), float(self.longitudes[i]), str(self.timezones[i]))
+
+    def ids(self, codes):
+        """
+        Maps airport codes to integer ids.
+
+        Parameters:
+        codes (iterable): Airport codes.
+
+        Returns:
+        numpy.ndarray: The id of each code.
+        """
+        index = self._index
+        try:
+            return np.fromiter((index[code] for code in codes), dtype=np.intp)
+        except KeyError:
+            missing = sorted({code for code in codes if code not in index}, key=str)
+            raise KeyError(f"Airports not found in airport data: {missing}") from None
+
+    def subset(self, codes):
+        """
+        Returns a registry holding only the given airports, e.g. to send to worker processes.
+
+        Parameters:
+        codes (iterable): Airport codes, without duplicates.
+
+        Returns:
+        AirportRegistry: The smaller registry, its arrays copied out of this one.
+        """
+        ids = self.ids(codes)
+        return AirportRegistry(np.array(self.codes[ids]), np.array(self.latitudes[ids]), np.array(self.longitudes[ids]),
+                               np.array(self.timezones[ids]))
+
+    def with_distances(self, dtype=np.float64):
+        """
+        Returns a copy of the registry holding the great circle distance matrix between all its
+        airports, which circuity_arrays reads instead of recomputing it. Meant for subsets: the
+        matrix grows with the square of the number of airports.
+
+        Parameters:
+        dtype (numpy.dtype): Dtype of the distance matrix (np.float32 halves its memory).
+
+        Returns:
+        AirportRegistry: The registry with distances, indexed by airport id.
+        """
+        return AirportRegistry(self.codes, self.latitudes, self.longitudes, self.timezones,
+                               distance_matrix(self.latitudes, self.longitudes, dtype=dtype))
+
+    def coordinates(self, codes):
+        """
+        Returns latitude and longitude arrays for a sequence of airport codes.
+
+        Parameters:
+        codes (iterable): Airport codes.
+
+        Returns:
+        tuple: Latitude and longitude numpy arrays.
+        """
+        ids = self.ids(codes)
+        return np.asarray(self.latitudes[ids], dtype=np.float64), np.asarray(self.longitudes[ids], dtype=np.float64)
+
+
+_registry = None
+
+
+def get_airport_registry():
+    """
+    Returns the shared airport registry, loading it on first use.
+
+    The prebuilt binary (AIRPORT_REGISTRY_PATH) is memory-mapped when it is at least as new as the
+    airport pickle, otherwise the registry is built from the pickle.
+
+    Returns:
+    AirportRegistry: The registry.
+    """
+    global _registry
+    if _registry is None:
+        if (os.path.exists(AIRPORT_REGISTRY_PATH)
+                and os.path.getmtime(AIRPORT_REGISTRY_PATH) >= os.path.getmtime(AIRPORT_DATA_PATH)):
+            _registry = AirportRegistry.load(AIRPORT_REGISTRY_PATH)
+        else:
+            with open(AIRPORT_DATA_PATH, 'rb') as f:
+                _registry = AirportRegistry.from_airport_data(pickle.load(f))
+    return _registry
+
+
+def build_airport_registry(path=AIRPORT_REGISTRY_PATH):
+    """
+    Builds the memory-mappable registry file from the airport pickle.
+
+    Parameters:
+    path (str): Path to write the .npy file to.
+
+    Returns:
+    AirportRegistry: The registry that was written.
+    """
+    with open(AIRPORT_DATA_PATH, 'rb') as f:
+        registry = AirportRegistry.from_airport_data(pickle.load(f))
+    registry.save(path)
+    return registry
+
+
+if __name__ == '__main__':
+    build_airport_registry()
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+from functions.day_mask import days_to_mask
+from functions.build_connections import CONNECTION_KEY_COLUMNS
+from functions.time_conversion import day_fractions_to_time_strings
+
+# Columns of the connections returned by queries, times of day as 'HH:MM' and the connection time in minutes
+RESULT_COLUMNS = ['Inbound Airline', 'Inbound Flt no', 'Inbound Orig Airp', 'Inbound STD (UTC)', 'Inbound STD (Local)',
+                  'Via', 'Inbound STA (UTC)', 'Outbound Airline', 'Outbound Flt no', 'Outbound STD (UTC)',
+                  'Outbound Dest Airp', 'Outbound STA (UTC)', 'Outbound STA (Local)', 'Connection Time (min)',
+                  'Circuity x', 'Inbound Equip', 'Outbound Equip']
+TIME_RESULT_COLUMNS = ['Inbound STD (UTC)', 'Inbound STD (Local)', 'Inbound STA (UTC)', 'Outbound STD (UTC)',
+                       'Outbound STA (UTC)', 'Outbound STA (Local)']
+
+
+class ConnectionIndex:
+    """
+    Connections expanded to one row per inbound day and indexed for O&D queries. A connection-day
+    repeated by the engine's grouping (the exploded engine's output can hold several rows covering
+    the same flights and day) is kept once.
+
+    Rows are held in two sorted orders, by (origin, destination, day, departure minute) and by
+    (destination, origin, day, departure minute), packed into int64 keys. A query on an O&D, or on
+    one end of it, with a day and a departure time window is a few binary searches.
+    """
+
+    __slots__ = ('connections', 'rows', 'day', 'dep_minute', 'orig', 'dest', 'via', 'airports', 'vias',
+                 '_od_keys', '_od_order', '_do_keys', '_do_order', '_results')
+
+    def __init__(self, df_connections):
+        """
+        Parameters:
+        df_connections (pandas.DataFrame): Connections as built by the engines (see rename_connection_columns).
+        """
+        self.connections = df_connections.reset_index(drop=True)
+        mask = days_to_mask(self.connections['Inbound Dep Day (UTC)'])
+        rows, days = [], []
+        for day in range(1, 8):
+            operating = np.flatnonzero(mask >> (day - 1) & 1)
+            rows.append(operating)
+            days.append(np.full(len(operating), day, dtype=np.int64))
+        rows, days = np.concatenate(rows), np.concatenate(days)
+        keys = self.connections[CONNECTION_KEY_COLUMNS].take(rows).reset_index(drop=True).astype(object)
+        keys['Day'] = days
+        first = ~pd.util.hash_pandas_object(keys, index=False).duplicated().to_numpy()
+        self.rows, self.day = rows[first], days[first]
+
+        std = self.connections['Inbound STD (UTC)'].to_numpy(dtype=float)[self.rows]
+        self.dep_minute = np.nan_to_num(np.round(std * 1440), nan=0).astype(np.int64) % 1440
+        codes, airports = pd.factorize(np.concatenate([
+            self.connections['Inbound Orig Airp'].to_numpy(dtype=object)[self.rows],
+            self.connections['Outbound Dest Airp'].to_numpy(dtype=object)[self.rows]]))
+        self.airports = pd.Index(airports)
+        self.orig, self.dest = codes[:len(self.rows)].astype(np.int64), codes[len(self.rows):].astype(np.int64)
+        via_codes, vias = pd.factorize(self.connections['Via'].to_numpy(dtype=object)[self.rows])
+        self.via, self.vias = via_codes.astype(np.int64), pd.Index(vias)
+
+        self._od_keys, self._od_order = self._sorted(self.orig, self.dest)
+        self._do_keys, self._do_order = self._sorted(self.dest, self.orig)
+
+        # Result columns formatted once, so answering a query only gathers them
+        self._results = {}
+        for col in RESULT_COLUMNS:
+            if col not in self.connections.columns:
+                continue
+            values = self.connections[col]
+            if col in TIME_RESULT_COLUMNS:
+                values = day_fractions_to_time_strings(values.to_numpy(dtype=float))
+            elif col == 'Connection Time (min)':
+                values = np.round(values.to_numpy(dtype=float) * 1440).astype(np.int64)
+            elif col == 'Circuity x':
+                values = np.round(values.to_numpy(dtype=float), 3)
+            self._results[col] = np.asarray(values, dtype=object)
+
+    def _sorted(self, first, second):
+        keys = self._key(first, second, self.day, self.dep_minute)
+        order = np.argsort(keys, kind='stable')
+        return keys[order], order
+
+    def _key(self, first, second, day, minute):
+        return ((first * (len(self.airports) + 1) + second) * 8 + day) * 1440 + minute
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return f"ConnectionIndex({len(self)} connection-days, {len(self.connections)} connections, {len(self.airports)} airports)"
+
+    def query(self, orig = None, dest = None, via = None, days = None, dep_from = 0, dep_to = 1439):
+        """
+        Finds the connections of an O&D, or leaving an origin or reaching a destination.
+
+        Parameters:
+        orig (str): Origin airport, any if None (dest is then required).
+        dest (str): Destination airport, any if None (orig is then required).
+        via (str): Connecting airport, any if None.
+        days (iterable): Inbound departure days (1 = Monday), every day if None.
+        dep_from (int): Earliest inbound departure, minutes from midnight UTC.
+        dep_to (int): Latest inbound departure, minutes from midnight UTC. A window ending before
+            it starts runs past midnight into the next day (Sunday into Monday).
+
+        Returns:
+        numpy.ndarray: Positions into the connection-day arrays (rows, day), by day and departure time.
+        """
+        if orig is None and dest is None:
+            raise ValueError("An origin or a destination is required.")
+        days = list(range(1, 8)) if days is None else sorted(set(int(day) for day in days))
+        # Out of range values would reach into the key segment of the next O&D or day
+        if days and not 1 <= days[0] <= days[-1] <= 7:
+            raise ValueError(f"Days must be from 1 (Monday) to 7, got {days}.")
+        if not 0 <= dep_from <= 1439 or not 0 <= dep_to <= 1439:
+            raise ValueError(f"Departure window must be within 0 and 1439 minutes, got {dep_from} to {dep_to}.")
+        codes = self.airports.get_indexer([orig, dest])
+        if (orig is not None and codes[0] < 0) or (dest is not None and codes[1] < 0):
+            return np.zeros(0, dtype=np.int64)
+
+        if orig is not None:
+            keys, order, first, second = self._od_keys, self._od_order, codes[0], codes[1]
+        else:
+            keys, order, first, second = self._do_keys, self._do_order, codes[1], -1
+
+        if dep_from <= dep_to:
+            windows = [(day, dep_from, dep_to) for day in days]
+        else:
+            windows = [window for day in days for window in [(day, dep_from, 1439), (day % 7 + 1, 0, dep_to)]]
+
+        found = []
+        for day, dep_from, dep_to in windows:
+            if second >= 0:
+                start = np.searchsorted(keys, self._key(first, second, day, dep_from), side='left')
+                stop = np.searchsorted(keys, self._key(first, second, day, dep_to), side='right')
+                found.append(order[start:stop])
+            else:
+                # One end only: the whole segment of the airport, filtered on day and time
+                start = np.searchsorted(keys, self._key(first, 0, 0, 0), side='left')
+                stop = np.searchsorted(keys, self._key(first + 1, 0, 0, 0), side='left')
+                segment = order[start:stop]
+                found.append(segment[(self.day[segment] == day) & (self.dep_minute[segment] >= dep_from) &
+                                     (self.dep_minute[segment] <= dep_to)])
+        positions = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+        if via is not None:
+            via_code = self.vias.get_indexer([via])[0]
+            positions = positions[self.via[positions] == via_code]
+        return positions[np.lexsort((self.dep_minute[positions], self.day[positions]))]
+
+    def records(self, positions, limit = None):
+        """
+        Returns query results as JSON-ready records.
+
+        Parameters:
+        positions (numpy.ndarray): Output of query.
+        limit (int): Maximum number of records, all if None.
+
+        Returns:
+        list: One dict per connection-day, with 'Day' and RESULT_COLUMNS (times of day as 'HH:MM',
+        the connection time in whole minutes).
+        """
+        positions = positions[:limit]
+        rows = self.rows[positions]
+        columns = [('Day', self.day[positions].tolist())] + [(col, values[rows].tolist()) for col, values in self._results.items()]
+        names = [name for name, _ in columns]
+        return [dict(zip(names, record)) for record in zip(*(values for _, values in columns))]
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from utils.config import MIN_GROUND_TIME
+
+
+class GroundTime:
+    """
+    Minimum ground times in minutes by equipment and station.
+
+    Lookups fall back from (equipment, station) to equipment, then station, then the default.
+    """
+
+    __slots__ = ('default', 'by_equipment_station', 'by_equipment', 'by_station')
+
+    def __init__(self, default = MIN_GROUND_TIME, by_equipment_station = None, by_equipment = None, by_station = None):
+        """
+        Parameters:
+        default (float): Ground time used when nothing more specific is defined.
+        by_equipment_station (dict): (equipment, station) -> minutes.
+        by_equipment (dict): Equipment -> minutes, at any station.
+        by_station (dict): Station -> minutes, for any equipment.
+        """
+        self.default = default
+        self.by_equipment_station = dict(by_equipment_station or {})
+        self.by_equipment = dict(by_equipment or {})
+        self.by_station = dict(by_station or {})
+
+    @classmethod
+    def from_frame(cls, df, equipment_col = 'Subfl', station_col = 'Station', minutes_col = 'Min ground time', default = MIN_GROUND_TIME):
+        """
+        Builds the table from a DataFrame with one rule per row.
+
+        A missing equipment or station makes the rule apply to any equipment or station; a row
+        with both missing sets the default.
+
+        Parameters:
+        df (pandas.DataFrame): The rules.
+        equipment_col (str): Column holding the equipment (subfleet) code.
+        station_col (str): Column holding the station code.
+        minutes_col (str): Column holding the minimum ground time in minutes.
+        default (float): Ground time used when no rule matches.
+
+        Returns:
+        GroundTime: The table.
+        """
+        ground_times = cls(default)
+        for equipment, station, minutes in df[[equipment_col, station_col, minutes_col]].itertuples(index=False):
+            has_equipment, has_station = pd.notna(equipment), pd.notna(station)
+            if has_equipment and has_station:
+                ground_times.by_equipment_station[(equipment, station)] = minutes
+            elif has_equipment:
+                ground_times.by_equipment[equipment] = minutes
+            elif has_station:
+                ground_times.by_station[station] = minutes
+            else:
+                ground_times.default = minutes
+        return ground_times
+
+    def minutes(self, equipment, station):
+        """
+        Returns the minimum ground time of an equipment at a station.
+
+        Parameters:
+        equipment (str): Equipment (subfleet) code.
+        station (str): Station code.
+
+        Returns:
+        float: Minutes.
+        """
+        if (equipment, station) in self.by_equipment_station:
+            return self.by_equipment_station[(equipment, station)]
+        if equipment in self.by_equipment:
+            return self.by_equipment[equipment]
+        return self.by_station.get(station, self.default)
+
+    def minutes_array(self, equipment, stations):
+        """
+        Looks up the minimum ground times of whole columns, once per distinct (equipment, station) pair.
+
+        Parameters:
+        equipment (array-like): Equipment codes.
+        stations (array-like): Station codes.
+
+        Returns:
+        numpy.ndarray: Minutes per row, as float64.
+        """
+        pairs = pd.MultiIndex.from_arrays([np.asarray(equipment, dtype=object), np.asarray(stations, dtype=object)])
+        codes, uniques = pd.factorize(pairs)
+        values = np.array([self.minutes(equipment, station) for equipment, station in uniques], dtype=float)
+        return values[codes]
+
+    def __repr__(self):
+        return (f"GroundTime(default={self.default}, {len(self.by_equipment_station)} equipment/station, "
+                f"{len(self.by_equipment)} equipment, {len(self.by_station)} station rules)")
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from classes.aircraft import Aircraft
+
+
+class RotationPlan:
+    """
+    Aircraft lines of flying for a weekly schedule.
+
+    The plan is held as arrays over the dated legs (one row per flight-day): the aircraft flying
+    each leg, and per aircraft its subfleet and start station. Aircraft objects are only created
+    when asked for.
+    """
+
+    __slots__ = ('legs', 'aircraft_of_leg', 'aircraft_subfleet', 'aircraft_start_station', 'leg_order', 'leg_offsets')
+
+    def __init__(self, legs, aircraft_of_leg, aircraft_subfleet, aircraft_start_station):
+        """
+        Parameters:
+        legs (pandas.DataFrame): The dated legs, with 'Dep (min)' and 'Arr (min)' in minutes from the start of the week.
+        aircraft_of_leg (numpy.ndarray): Aircraft number flying each leg.
+        aircraft_subfleet (numpy.ndarray): Subfleet of each aircraft.
+        aircraft_start_station (numpy.ndarray): Station each aircraft is at, or flying to, at the start of the week.
+        """
+        self.legs = legs
+        self.aircraft_of_leg = aircraft_of_leg
+        self.aircraft_subfleet = aircraft_subfleet
+        self.aircraft_start_station = aircraft_start_station
+
+        # Legs grouped by aircraft in flying order: the legs of aircraft i are leg_order[leg_offsets[i]:leg_offsets[i + 1]]
+        self.leg_order = np.lexsort((legs['Dep (min)'].to_numpy(), aircraft_of_leg))
+        counts = np.bincount(aircraft_of_leg, minlength=len(aircraft_subfleet))
+        self.leg_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.aircraft_subfleet)
+
+    def __getitem__(self, number):
+        if not 0 <= number < len(self):
+            raise IndexError(f"Aircraft {number} out of range, the plan has {len(self)} aircraft.")
+        legs = self.leg_order[self.leg_offsets[number]:self.leg_offsets[number + 1]]
+        return Aircraft(number, self.aircraft_subfleet[number], self.aircraft_start_station[number], legs)
+
+    def __iter__(self):
+        return (self[number] for number in range(len(self)))
+
+    def __repr__(self):
+        return f"RotationPlan({len(self)} aircraft, {len(self.legs)} legs)"
+
+    def aircraft_counts(self):
+        """
+        Returns the number of aircraft needed per subfleet.
+
+        Returns:
+        pandas.Series: Aircraft count indexed by subfleet.
+        """
+        return pd.Series(self.aircraft_subfleet).value_counts().sort_index().rename('Aircraft')
+
+    def to_frame(self):
+        """
+        Returns the dated legs with the aircraft flying them, in aircraft and flying order.
+
+        Returns:
+        pandas.DataFrame: The legs with 'Aircraft', 'Leg seq' and 'Ground time (min)' (time on the
+        ground before the aircraft's next leg in the week, NaN after its last leg).
+        """
+        df = self.legs.iloc[self.leg_order].reset_index(drop=True)
+        aircraft = self.aircraft_of_leg[self.leg_order]
+        df.insert(0, 'Aircraft', aircraft)
+        df.insert(1, 'Leg seq', np.arange(len(df)) - self.leg_offsets[aircraft])
+
+        next_dep = np.append(df['Dep (min)'].to_numpy(dtype=float)[1:], np.nan)
+        same_aircraft = np.append(aircraft[1:] == aircraft[:-1], False)
+        df['Ground time (min)'] = np.where(same_aircraft, next_dep - df['Arr (min)'].to_numpy(dtype=float), np.nan)
+        return df
+
+    def summary(self):
+        """
+        Summarises the plan per subfleet.
+
+        Returns:
+        pandas.DataFrame: Aircraft, weekly legs and average daily block hours per aircraft, by subfleet.
+        """
+        block = (self.legs['Arr (min)'] - self.legs['Dep (min)']).to_numpy(dtype=float) / 60
+        subfleet = self.aircraft_subfleet[self.aircraft_of_leg]
+        df = pd.DataFrame({'Subfleet': subfleet, 'Block hours': block}).groupby('Subfleet').agg(
+            Legs=('Block hours', 'size'), Block_hours=('Block hours', 'sum'))
+        df.insert(0, 'Aircraft', self.aircraft_counts())
+        df['Daily block hours per aircraft'] = df['Block_hours'] / 7 / df['Aircraft']
+        return df.drop(columns='Block_hours').reset_index()
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+from classes.airport import get_airport_registry
+
+MINUTE = np.timedelta64(1, 'm')
+
+# Margin kept around the season, so that arrivals after its last day and local times across the
+# date line stay inside the table
+MARGIN_DAYS = 3
+
+
+class TimezoneTable:
+    """
+    UTC offsets of a set of airports over a season, for converting whole columns at once.
+
+    Each timezone's offset changes (DST transitions) within the season are found once. Every time
+    zone gets its own segment of one sorted key array, so converting a column is a single binary
+    search (numpy.searchsorted) whatever the number of airports and transitions.
+    """
+
+    __slots__ = ('codes', 'timezones', 'airport_timezone', 'base', 'span', 'utc_keys', 'local_keys', 'offsets', '_index')
+
+    def __init__(self, codes, timezones, airport_timezone, base, span, utc_keys, local_keys, offsets):
+        """
+        Parameters:
+        codes (numpy.ndarray): Airport codes.
+        timezones (numpy.ndarray): Distinct timezone names.
+        airport_timezone (numpy.ndarray): Timezone id of each airport.
+        base (numpy.datetime64): Start of the table, in minutes.
+        span (int): Length of the table in minutes, the width of each timezone's key segment.
+        utc_keys (numpy.ndarray): timezone id * span + UTC minute from base of every offset change,
+            sorted, starting each timezone with the offset at base.
+        local_keys (numpy.ndarray): The same changes as local minutes from base, from which local times take the new offset.
+        offsets (numpy.ndarray): UTC offset in minutes from each change on.
+        """
+        self.codes = codes
+        self.timezones = timezones
+        self.airport_timezone = airport_timezone
+        self.base = base
+        self.span = span
+        self.utc_keys = utc_keys
+        self.local_keys = local_keys
+        self.offsets = offsets
+        self._index = pd.Index(codes)
+
+    @classmethod
+    def build(cls, airports, start, end, airport_data = None):
+        """
+        Finds the UTC offset changes of the airports' timezones between start and end.
+
+        Offsets are sampled hourly with pandas' vectorized timezone conversion, and each change is
+        located to the minute within its hour.
+
+        Parameters:
+        airports (iterable): Airport codes, duplicates allowed (e.g. a schedule's Orig column).
+        start (date-like): First day of the season.
+        end (date-like): Last day of the season.
+        airport_data (dict or AirportRegistry): Airport data keyed by code, with timezones. The shared airport registry if None.
+
+        Returns:
+        TimezoneTable: The table.
+        """
+        if airport_data is None:
+            airport_data = get_airport_registry()
+        codes = np.asarray(pd.unique(np.asarray(list(airports), dtype=object)), dtype=object)
+        if hasattr(airport_data, 'timezones'):
+            zones = airport_data.timezones[airport_data.ids(codes)].astype(object)
+        else:
+            missing = [code for code in codes if code not in airport_data]
+            if missing:
+                raise KeyError(f"Airports not found in airport data: {missing}")
+            zones = np.array([airport_data[code].get('Timezone') or '' for code in codes], dtype=object)
+        no_zone = codes[zones == '']
+        if len(no_zone):
+            raise ValueError(f"Airports without a timezone in airport data: {sorted(no_zone)}")
+        airport_timezone, timezones = pd.factorize(zones)
+
+        base = (pd.Timestamp(start).normalize() - pd.Timedelta(days=MARGIN_DAYS)).to_datetime64().astype('datetime64[m]')
+        stop = (pd.Timestamp(end).normalize() + pd.Timedelta(days=MARGIN_DAYS + 1)).to_datetime64().astype('datetime64[m]')
+        if stop <= base + np.timedelta64(2 * MARGIN_DAYS * 1440, 'm'):
+            raise ValueError(f"The season must end on or after its start, got {start} to {end}.")
+        span = int((stop - base) / MINUTE)
+        hours = pd.date_range(base, stop, freq='h', tz='UTC')
+
+        utc_keys, local_keys, offsets = [], [], []
+        for zone_id, zone in enumerate(timezones):
+            hourly = _offset_minutes(hours, zone)
+            changed = np.flatnonzero(np.diff(hourly))
+
+            # Minute of each change: the first minute of its hour with the new offset
+            minutes = hours[changed].repeat(60) + pd.to_timedelta(np.tile(np.arange(1, 61), len(changed)), unit='m')
+            new_offset = (_offset_minutes(minutes, zone) != np.repeat(hourly[changed], 60)).reshape(-1, 60)
+            change_minute = changed * 60 + np.argmax(new_offset, axis=1) + 1
+
+            minute = np.concatenate([[0], change_minute]).astype(np.int64)
+            offset = np.concatenate([hourly[:1], hourly[changed + 1]]).astype(np.int64)
+            before = np.concatenate([offset[:1], offset[:-1]])
+            utc_keys.append(zone_id * span + minute)
+            # Local times in a gap or a fold keep the offset before the change. Kept within the
+            # timezone's segment, which only moves changes in the margin after the season
+            local_minute = np.clip(minute + np.maximum(before, offset), 0, span - 1)
+            local_minute[0] = 0
+            local_keys.append(zone_id * span + local_minute)
+            offsets.append(offset)
+
+        return cls(codes, np.asarray(timezones, dtype=object), airport_timezone, base, span,
+                   np.concatenate(utc_keys), np.concatenate(local_keys), np.concatenate(offsets))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __repr__(self):
+        return (f"TimezoneTable({len(self)} airports, {len(self.timezones)} timezones, "
+                f"{len(self.offsets) - len(self.timezones)} transitions from {self.base})")
+
+    def _keys(self, airports, times):
+        # Segment key of every (airport, time) query
+        ids = self._index.get_indexer(np.asarray(airports, dtype=object))
+        if (ids < 0).any():
+            missing = sorted({str(code) for code in np.asarray(airports, dtype=object)[ids < 0]})
+            raise KeyError(f"Airports not in the timezone table: {missing}")
+        minutes = (np.asarray(times, dtype='datetime64[ns]') - self.base) / MINUTE
+        outside = (minutes < 0) | (minutes >= self.span)
+        if outside.any():
+            raise ValueError(f"Times outside the timezone table ({self.base} + {self.span} minutes): "
+                             f"{np.asarray(times, dtype='datetime64[m]')[outside][:5]}")
+        return self.airport_timezone[ids].astype(np.int64) * self.span + np.floor(minutes).astype(np.int64)
+
+    def utc_offsets(self, airports, utc):
+        """
+        Returns the UTC offsets in effect at given UTC times.
+
+        Parameters:
+        airports (array-like): Airport codes.
+        utc (array-like): UTC times (naive datetime64).
+
+        Returns:
+        numpy.ndarray: Offsets in minutes.
+        """
+        keys = self._keys(airports, utc)
+        return self.offsets[np.searchsorted(self.utc_keys, keys, side='right') - 1]
+
+    def to_local(self, airports, utc):
+        """
+        Converts UTC times to local times.
+
+        Parameters:
+        airports (array-like): Airport codes.
+        utc (array-like): UTC times (naive datetime64).
+
+        Returns:
+        numpy.ndarray: Local times, naive datetime64[ns].
+        """
+        return np.asarray(utc, dtype='datetime64[ns]') + self.utc_offsets(airports, utc) * MINUTE
+
+    def to_utc(self, airports, local):
+        """
+        Converts local times to UTC.
+
+        Local times skipped when clocks go forward, or repeated when they go back, take the offset
+        before the change (like fold=0 in Python's datetime).
+
+        Parameters:
+        airports (array-like): Airport codes.
+        local (array-like): Local times (naive datetime64).
+
+        Returns:
+        numpy.ndarray: UTC times, naive datetime64[ns].
+        """
+        keys = self._keys(airports, local)
+        offsets = self.offsets[np.searchsorted(self.local_keys, keys, side='right') - 1]
+        return np.asarray(local, dtype='datetime64[ns]') - offsets * MINUTE
+
+
+def _offset_minutes(utc_times, zone):
+    # UTC offset in whole minutes of a zone at tz-aware UTC times
+    local = utc_times.tz_convert(zone).tz_localize(None)
+    return ((local - utc_times.tz_localize(None)) / pd.Timedelta(minutes=1)).to_numpy().round().astype(np.int64)
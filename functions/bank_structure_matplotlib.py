@@ -0,0 +1,314 @@
+import numpy as np
+import pandas as pd
+from utils import config
+from utils.config import HUB
+
+# Width of a time bin in minutes
+BIN_MINUTES = 10
+
+# Waves are the periods where the smoothed arrivals or departures are above this share of the day's peak
+BANK_THRESHOLD = 0.25
+
+# Width of the moving average smoothing the activity before banks are detected, in minutes
+SMOOTHING_MINUTES = 30
+
+# Quiet periods shorter than this do not split a wave, in minutes
+MIN_BANK_GAP = 20
+
+PROFILE_COUNTS = ['Arrivals', 'Departures', 'Arr seats', 'Dep seats', 'Feeding connections', 'Onward connections']
+
+
+def _week_minutes(times):
+    # UTC day floats (day 1 = Monday 00:00) to minutes in the cyclic week
+    return np.mod(np.round((np.asarray(times, dtype=float) - 1) * 1440), 7 * 1440)
+
+
+def _count_in_windows(keys, query, lower, upper):
+    # Number of sorted keys within [query + lower, query + upper] for every query
+    return np.searchsorted(keys, query + upper, side='right') - np.searchsorted(keys, query + lower, side='left')
+
+
+def bank_profile(
+    df,
+    hubs = (HUB,),
+    bin_minutes = BIN_MINUTES,
+    min_connect_time = config.MIN_CONNECT_TIME,
+    max_connect_time = config.MAX_CONNECT_TIME,
+    day_column = 'Dep Day',
+    seats_column = 'Seats'
+    ):
+    """
+    Aggregates the hub movements of a week into time bins.
+
+    Every count is one bincount over (hub, bin) for the whole week, so the cost does not depend on
+    the number of hubs or days. Connecting opportunities are the arrival/departure pairs at the
+    same hub within the connection time window, counted with binary searches on the sorted times:
+    'Feeding connections' counts them on the departure's bin, 'Onward connections' on the
+    arrival's bin. The week is cyclic, Sunday arrivals feed Monday departures.
+
+    Parameters:
+    df (pandas.DataFrame): The exploded schedule with 'UTC Dep Float' and 'UTC Arr Float' (see create_utc_floats).
+        Day 8 rows added by add_day_eight are ignored. A line-based (bitmask) schedule raises ValueError.
+    hubs (iterable): Hub codes to profile.
+    bin_minutes (int): Width of a time bin in minutes, dividing a day.
+    min_connect_time (float): Minimum connection time (fraction of day).
+    max_connect_time (float): Maximum connection time (fraction of day).
+    day_column (str): Column holding the departure day.
+    seats_column (str): Column holding the seats, counted as zero if missing.
+
+    Returns:
+    pandas.DataFrame: One row per hub, day and bin with 'Hub', 'Day', 'Bin' (minutes from midnight
+    UTC), 'Arrivals', 'Departures', 'Arr seats', 'Dep seats', 'Feeding connections' and 'Onward connections'.
+    """
+    if 1440 % bin_minutes:
+        raise ValueError(f"bin_minutes must divide a day, got {bin_minutes}.")
+    missing = [col for col in ['UTC Dep Float', 'UTC Arr Float'] if col not in df.columns]
+    if missing or (day_column in df.columns and not pd.api.types.is_numeric_dtype(df[day_column])):
+        raise ValueError("bank_profile needs the exploded schedule, one row per flight-day with UTC floats "
+                         "(preprocess_schedule with engine='exploded'), not one row per schedule line.")
+    hubs = list(hubs)
+    bins_per_day = 1440 // bin_minutes
+    n_bins = 7 * bins_per_day
+
+    if day_column in df.columns:
+        df = df[df[day_column] <= 7]
+    hub_codes = pd.Index(hubs)
+    arr_hub = hub_codes.get_indexer(df['Dest'])
+    dep_hub = hub_codes.get_indexer(df['Orig'])
+    arriving, departing = arr_hub >= 0, dep_hub >= 0
+    seats = df[seats_column].to_numpy(dtype=float) if seats_column in df.columns else np.zeros(len(df))
+
+    arr_time = _week_minutes(df['UTC Arr Float'].to_numpy()[arriving])
+    dep_time = _week_minutes(df['UTC Dep Float'].to_numpy()[departing])
+    arr_hub, dep_hub = arr_hub[arriving].astype(np.int64), dep_hub[departing].astype(np.int64)
+    arr_bin = arr_hub * n_bins + (arr_time // bin_minutes).astype(np.int64)
+    dep_bin = dep_hub * n_bins + (dep_time // bin_minutes).astype(np.int64)
+
+    # Connecting opportunities: arrivals are also placed one week earlier and departures one week
+    # later, so windows across the end of the week find them. Each hub gets its own segment of the number line
+    week = 7 * 1440
+    span = 3 * week
+    min_ct, max_ct = min_connect_time * 1440, max_connect_time * 1440
+    arr_keys = np.sort(np.concatenate([arr_hub * span + arr_time + week, arr_hub * span + arr_time]))
+    dep_keys = np.sort(np.concatenate([dep_hub * span + dep_time + week, dep_hub * span + dep_time + 2 * week]))
+    feeding = _count_in_windows(arr_keys, dep_hub * span + dep_time + week, -max_ct, -min_ct)
+    onward = _count_in_windows(dep_keys, arr_hub * span + arr_time + week, min_ct, max_ct)
+
+    size = len(hubs) * n_bins
+    counts = {
+        'Arrivals': np.bincount(arr_bin, minlength=size),
+        'Departures': np.bincount(dep_bin, minlength=size),
+        'Arr seats': np.bincount(arr_bin, weights=seats[arriving], minlength=size),
+        'Dep seats': np.bincount(dep_bin, weights=seats[departing], minlength=size),
+        'Feeding connections': np.bincount(dep_bin, weights=feeding, minlength=size).astype(np.int64),
+        'Onward connections': np.bincount(arr_bin, weights=onward, minlength=size).astype(np.int64),
+    }
+    position = np.arange(size)
+    profile = pd.DataFrame({
+        'Hub': np.repeat(hubs, n_bins),
+        'Day': (position % n_bins // bins_per_day + 1).astype(np.int8),
+        'Bin': (position % bins_per_day * bin_minutes).astype(np.int16),
+    })
+    for col, values in counts.items():
+        profile[col] = values
+    return profile
+
+
+def _bin_minutes(profile):
+    # Width of a profile's bins: a day holds as many bins as its first hub and day have rows
+    if profile.empty:
+        return 1440
+    first_day = (profile['Hub'] == profile['Hub'].iloc[0]) & (profile['Day'] == profile['Day'].iloc[0])
+    return 1440 // int(first_day.sum())
+
+
+def _is_full_week(profile, hubs, bins_per_day):
+    # Whether the profile holds every bin of the 7 days of each hub, in the order bank_profile writes them
+    n_bins = 7 * bins_per_day
+    if len(profile) != len(hubs) * n_bins:
+        return False
+    position = np.arange(len(profile))
+    return bool((profile['Hub'].to_numpy() == np.repeat(hubs, n_bins)).all()
+                and (profile['Day'].to_numpy() == position % n_bins // bins_per_day + 1).all()
+                and (profile['Bin'].to_numpy() == position % bins_per_day * (1440 // bins_per_day)).all())
+
+
+def _smooth(values, width):
+    # Circular moving average along the last axis
+    padded = np.concatenate([values[:, values.shape[1] - width // 2:], values, values[:, :width - 1 - width // 2]], axis=1)
+    cumulative = np.concatenate([np.zeros((len(values), 1)), np.cumsum(padded, axis=1)], axis=1)
+    return (cumulative[:, width:] - cumulative[:, :-width]) / width
+
+
+def _waves(active, gap):
+    # [start, end) bin runs of an activity mask starting on a quiet bin, runs closer than gap merged
+    edges = np.diff(np.concatenate([[0], active.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = np.concatenate([[True], starts[1:] - ends[:-1] >= gap]) if len(starts) else np.zeros(0, dtype=bool)
+    return starts[keep], np.append(ends[np.flatnonzero(keep)[1:] - 1], ends[-1:])
+
+
+def detect_banks(
+    profile,
+    threshold = BANK_THRESHOLD,
+    smoothing_minutes = SMOOTHING_MINUTES,
+    min_gap = MIN_BANK_GAP,
+    max_connect_time = config.MAX_CONNECT_TIME
+    ):
+    """
+    Finds the banks of every hub in a bank profile: arrival waves and the departure wave they feed.
+
+    Arrivals and departures are smoothed with a moving average over the cyclic week, and a wave is
+    a run of bins above threshold times the day's peak of that movement, runs separated by fewer
+    than min_gap quiet minutes being merged. A bank starts with an arrival wave, takes the following
+    arrival waves until a departure wave starts within max_connect_time of the last one, and ends
+    with that departure wave. Waves that cannot be paired are banks on their own. A bank crossing
+    midnight belongs to the day it starts on.
+
+    Parameters:
+    profile (pandas.DataFrame): Output of bank_profile, with the whole week of every hub. A profile
+        filtered to some days raises ValueError.
+    threshold (float): Share of the day's smoothed peak above which a bin belongs to a wave.
+    smoothing_minutes (int): Width of the moving average, in minutes.
+    min_gap (int): Shortest quiet period separating two waves, in minutes.
+    max_connect_time (float): Longest gap between an arrival wave and the departure wave it feeds (fraction of day).
+
+    Returns:
+    pandas.DataFrame: One row per bank with 'Hub', 'Day', 'Bank' (number within the day), 'Start'
+    and 'End' (minutes from midnight UTC of the bank's day, End may pass 1440), 'Arr end' and 'Dep start'
+    (end of the arrival waves and start of the departure wave, NaN if the bank has none) and the
+    profile counts summed over the bank.
+    """
+    columns = ['Hub', 'Day', 'Bank', 'Start', 'End', 'Arr end', 'Dep start'] + PROFILE_COUNTS
+    if profile.empty:
+        return pd.DataFrame(columns=columns)
+    bin_minutes = _bin_minutes(profile)
+    bins_per_day = 1440 // bin_minutes
+    n_bins = 7 * bins_per_day
+    hubs = pd.unique(profile['Hub'])
+    if not _is_full_week(profile, hubs, bins_per_day):
+        raise ValueError("detect_banks needs the whole week of every hub, in the row order of bank_profile. "
+                         "Filter the banks it returns rather than the profile.")
+    counts = {col: profile[col].to_numpy().reshape(len(hubs), n_bins) for col in PROFILE_COUNTS}
+    width = max(int(round(smoothing_minutes / bin_minutes)), 1)
+    gap = int(np.ceil(min_gap / bin_minutes))
+    max_gap = max_connect_time * 1440 / bin_minutes
+
+    # Bins above the share of their day's peak, per movement
+    active = {}
+    for col in ['Arrivals', 'Departures']:
+        smooth = _smooth(counts[col].astype(float), width)
+        day_peak = np.repeat(smooth.reshape(len(hubs), 7, bins_per_day).max(axis=2), bins_per_day, axis=1)
+        active[col] = (smooth > threshold * day_peak) & (day_peak > 0)
+
+    banks = []
+    for h, hub in enumerate(hubs):
+        busy = active['Arrivals'][h] | active['Departures'][h]
+        if not busy.any():
+            continue
+        # Rotate the week to start in the middle of its longest quiet period, so that no wave wraps around
+        quiet = np.concatenate([~busy, ~busy]).astype(np.int8)
+        edges = np.diff(np.concatenate([[0], quiet, [0]]))
+        quiet_starts, quiet_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        shift = 0
+        if len(quiet_starts):  # With coarse bins (e.g. whole days) every bin can be busy
+            longest = np.argmax(np.minimum(quiet_ends, quiet_starts + n_bins) - quiet_starts)
+            shift = int((quiet_starts[longest] + min(quiet_ends[longest], quiet_starts[longest] + n_bins)) // 2) % n_bins
+
+        waves = []
+        for col, is_arrival in [('Arrivals', True), ('Departures', False)]:
+            starts, ends = _waves(np.roll(active[col][h], -shift), gap)
+            waves += [(start, end, is_arrival) for start, end in zip(starts, ends)]
+        # At an equal start the arrival wave comes first, so with bins too coarse to separate the
+        # waves (e.g. whole days) the departure wave still closes the arrival wave's bank
+        waves.sort(key=lambda wave: (wave[0], not wave[2], wave[1]))
+
+        # Arrival waves accumulate until the departure wave they feed closes the bank
+        spans = []
+        current = None
+        for start, end, is_arrival in waves:
+            feeds = current is not None and current[3] is None and start - current[2] <= max_gap
+            if is_arrival and feeds and current[2] is not None:
+                current[1], current[2] = max(current[1], end), max(current[2], end)
+            elif not is_arrival and feeds and current[2] is not None:
+                current[1], current[3] = max(current[1], end), start
+            else:
+                current = [start, end, end if is_arrival else None, None if is_arrival else start]
+                spans.append(current)
+
+        rotated = {col: np.concatenate([[0], np.cumsum(np.roll(counts[col][h], -shift))]) for col in PROFILE_COUNTS}
+        starts = np.array([span[0] for span in spans])
+        ends = np.array([span[1] for span in spans])
+        start_day, start_bin = np.divmod((starts + shift) % n_bins, bins_per_day)
+        frame = pd.DataFrame({
+            'Hub': hub,
+            'Day': start_day + 1,
+            'Start': start_bin * bin_minutes,
+            'End': (start_bin + ends - starts) * bin_minutes,
+            'Arr end': [np.nan if span[2] is None else (start_bin[i] + span[2] - span[0]) * bin_minutes for i, span in enumerate(spans)],
+            'Dep start': [np.nan if span[3] is None else (start_bin[i] + span[3] - span[0]) * bin_minutes for i, span in enumerate(spans)],
+        })
+        for col, values in rotated.items():
+            frame[col] = values[ends] - values[starts]
+        banks.append(frame)
+
+    if not banks:
+        return pd.DataFrame(columns=columns)
+    df_banks = pd.concat(banks, ignore_index=True).sort_values(['Hub', 'Day', 'Start'], kind='stable')
+    df_banks.insert(2, 'Bank', df_banks.groupby(['Hub', 'Day']).cumcount() + 1)
+    return df_banks.reset_index(drop=True)[columns]
+
+
+def plot_bank_structure(profile, banks = None, hubs = None, days = None, seats = False, output_path = None):
+    """
+    Plots arrivals above and departures below the axis per time bin, one panel per hub, from a bank profile.
+
+    Only the aggregates are drawn (one step line per series and hub), so the cost does not depend
+    on the number of flights.
+
+    Parameters:
+    profile (pandas.DataFrame): Output of bank_profile.
+    banks (pandas.DataFrame): Output of detect_banks, shaded if given.
+    hubs (list): Hubs to plot, all the hubs of the profile if None.
+    days (list): Days to plot (1 = Monday), the whole week if None.
+    seats (bool): Plot seats rather than flights.
+    output_path (str): Saves the figure there if given.
+
+    Returns:
+    matplotlib.figure.Figure: The figure.
+    """
+    import matplotlib.pyplot as plt
+
+    hubs = list(pd.unique(profile['Hub'])) if hubs is None else list(hubs)
+    days = list(range(1, 8)) if days is None else sorted(days)
+    arr_col, dep_col = ('Arr seats', 'Dep seats') if seats else ('Arrivals', 'Departures')
+    bin_minutes = _bin_minutes(profile)
+
+    fig, axes = plt.subplots(len(hubs), 1, figsize=(max(4 * len(days), 8), 2.5 * len(hubs)), sharex=True, squeeze=False)
+    for ax, hub in zip(axes[:, 0], hubs):
+        selected = profile[(profile['Hub'] == hub) & profile['Day'].isin(days)]
+        # Hours from the start of the first plotted day, with the days laid side by side
+        position = np.searchsorted(days, selected['Day'].to_numpy())
+        edges_start = position * 24 + selected['Bin'].to_numpy() / 60
+        if len(selected):
+            edges = np.append(edges_start, edges_start[-1] + bin_minutes / 60)
+            ax.stairs(selected[arr_col].to_numpy(), edges, fill=True, color='tab:blue', label=arr_col)
+            ax.stairs(-selected[dep_col].to_numpy(), edges, fill=True, color='tab:orange', label=dep_col)
+
+        if banks is not None:
+            hub_banks = banks[(banks['Hub'] == hub) & banks['Day'].isin(days)]
+            bank_position = np.searchsorted(days, hub_banks['Day'].to_numpy()) * 24
+            for start, end in zip(bank_position + hub_banks['Start'].to_numpy() / 60, bank_position + hub_banks['End'].to_numpy() / 60):
+                ax.axvspan(start, end, color='grey', alpha=0.15, linewidth=0)
+
+        ax.axhline(0, color='black', linewidth=0.5)
+        ax.set_ylabel(hub)
+        ax.set_xticks(np.arange(len(days) + 1) * 24)
+        ax.set_xticklabels([f'Day {day}' for day in days] + [''], ha='left')
+    axes[0, 0].legend(loc='upper right')
+    axes[-1, 0].set_xlabel('UTC')
+    fig.tight_layout()
+
+    if output_path:
+        fig.savefig(output_path)
+    return fig
@@ -0,0 +1,197 @@
+import math
+import numpy as np
+import pandas as pd
+from functions.circuity import circuity_arrays
+from functions.build_connections import CONNECTION_COLUMNS, DAY_COLUMNS, classify_connections, rename_connection_columns
+from functions.day_mask import days_to_mask, mask_to_days, rotate_mask, mask_to_columns, columns_to_mask
+from functions.time_window_join import window_join_indices, take_pairs
+from functions.schedule_schema import materialize_categoricals
+from utils import config
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Same columns as the exploded engine, with the masks in place of the per-day columns
+BITMASK_COLUMNS = {old: new for old, new in CONNECTION_COLUMNS.items() if new not in DAY_COLUMNS}
+BITMASK_COLUMNS['Inbound Days Mask'] = 'Inbound Dep Day (UTC)'
+BITMASK_COLUMNS['Outbound Days Mask'] = 'Outbound Dep Day (UTC)'
+
+# Columns identifying one output row, in candidate (merged) and output naming
+GROUP_COLUMNS = [new for new in BITMASK_COLUMNS.values() if new not in DAY_COLUMNS]
+CANDIDATE_GROUP_COLUMNS = [old for old, new in BITMASK_COLUMNS.items() if new not in DAY_COLUMNS]
+
+
+def build_and_filter_connections_bitmask(
+    df,
+    max_circuity = config.MAX_CIRCUITY,
+    max_abs_circuity = config.MAX_ABS_CIRCUITY,
+    max_missed_time = config.MAX_MISSED_CONNECT_TIME,
+    min_connect_time = config.MIN_CONNECT_TIME,
+    max_connect_time = config.MAX_CONNECT_TIME,
+    airport_data = None,
+    day_column = 'Dep Day'
+    ):
+    """
+    Builds and filters connections directly from schedule lines, keeping the operating days
+    of every line as a 7-bit mask instead of exploding the schedule into one row per day.
+
+    For every arrival/departure line pair and every day shift k (0 for same day, 1 for next day,
+    -1 for previous day, ...) the connecting days are the arrival mask AND the departure mask
+    rotated back by k. Week wrap-around (Sunday to Monday) is handled by the rotation, so neither
+    explode_schedule nor add_day_eight is needed.
+
+    The DataFrame must carry the movement flag and time columns converted to fractions of day,
+    but must not be exploded.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, one row per schedule line.
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity.
+    max_missed_time (float): Maximum time for a connection to be considered missed.
+    min_connect_time (float): Minimum connection time for a feasible connection.
+    max_connect_time (float): Maximum connection time for a feasible connection.
+    airport_data (dict or AirportRegistry): Airport data keyed by code, used for circuity. The shared airport registry if None.
+    day_column (str): Column holding the operating days of each line.
+
+    Returns:
+    tuple: A tuple containing DataFrames for logical connections, missed connections, and illogical connections,
+    in the same layout as build_and_filter_connections.
+    """
+
+    window_lower = min(max_missed_time, min_connect_time)
+    window_upper = max(max_connect_time, min_connect_time)
+    df_connections = build_bitmask_candidates(df, window_lower, window_upper, airport_data, day_column)
+
+    dfs = classify_and_group_connections(df_connections, max_circuity, max_abs_circuity,
+                                         max_missed_time, min_connect_time, max_connect_time)
+
+    print (f'Number of logical connections: {len(dfs[0])}')
+    print (f'Number of illogical connections: {len(dfs[2])}')
+    print (f'Number of missed connections: {len(dfs[1])}')
+
+    return dfs
+
+
+def build_bitmask_candidates(df, window_lower, window_upper, airport_data = None, day_column = 'Dep Day'):
+    """
+    Finds every arrival/departure line pair and day shift whose connection time lies inside
+    [window_lower, window_upper] on at least one operating day.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, one row per schedule line, with the movement flag and
+        time columns converted to fractions of day.
+    window_lower (float): Lower bound of the connection time (fraction of day).
+    window_upper (float): Upper bound of the connection time (fraction of day).
+    airport_data (dict or AirportRegistry): Airport data keyed by code, used for circuity. The shared airport registry if None.
+    day_column (str): Column holding the operating days of each line.
+
+    Returns:
+    pandas.DataFrame: Merged-style arrival/departure pairs with 'Connection_time', 'Circuity',
+    'Circuity (abs)', 'Inbound Days Mask' and 'Outbound Days Mask' columns.
+    """
+
+    # Split the main df into arrivals and departures
+    df_arr = df[df['movement_flag'] == 'Arr'].reset_index(drop=True)
+    df_dep = df[df['movement_flag'] == 'Dep'].reset_index(drop=True)
+
+    arr_mask = days_to_mask(df_arr[day_column])
+    dep_mask = days_to_mask(df_dep[day_column])
+
+    # Times relative to midnight UTC of the line's departure day
+    arr_time = (df_arr['STD'] + df_arr['Blk Hrs']).to_numpy(dtype=float)
+    dep_time = df_dep['STD'].to_numpy(dtype=float)
+
+    arr_idx, dep_idx, shifts, in_masks = [], [], [], []
+    if len(arr_time) and len(dep_time):
+        # Every whole-day shift that can put a departure inside the window of some arrival
+        k_min = math.floor(window_lower + np.nanmin(arr_time) - np.nanmax(dep_time))
+        k_max = math.ceil(window_upper + np.nanmax(arr_time) - np.nanmin(dep_time))
+
+        for k in range(k_min, k_max + 1):
+            ai, di = window_join_indices(df_arr['Dest'].to_numpy(), arr_time,
+                                         df_dep['Orig'].to_numpy(), dep_time + k,
+                                         window_lower, window_upper)
+
+            # Arrival day d connects when the departure operates on day d + k
+            in_mask = arr_mask[ai] & rotate_mask(dep_mask[di], -k)
+            keep = in_mask != 0
+            arr_idx.append(ai[keep])
+            dep_idx.append(di[keep])
+            shifts.append(np.full(keep.sum(), k))
+            in_masks.append(in_mask[keep])
+
+    arr_idx = np.concatenate(arr_idx) if arr_idx else np.empty(0, dtype=np.intp)
+    dep_idx = np.concatenate(dep_idx) if dep_idx else np.empty(0, dtype=np.intp)
+    shifts = np.concatenate(shifts) if shifts else np.empty(0, dtype=np.int64)
+    in_mask = np.concatenate(in_masks) if in_masks else np.empty(0, dtype=np.int64)
+
+    order = np.lexsort((shifts, dep_idx, arr_idx))
+    arr_idx, dep_idx, shifts, in_mask = arr_idx[order], dep_idx[order], shifts[order], in_mask[order]
+
+    df_connections = take_pairs(df_arr, df_dep, arr_idx, dep_idx, suffixes=('_arr', '_dep'))
+
+    # Calculate connection time and circuity. Connection times are snapped to whole seconds so that
+    # a connection exactly on a threshold (e.g. 60 minutes) is classified the same way on every day
+    connection_time = (shifts + dep_time[dep_idx]) - arr_time[arr_idx]
+    df_connections['Connection_time'] = np.round(connection_time * SECONDS_PER_DAY) / SECONDS_PER_DAY
+    df_connections['Circuity'], df_connections['Circuity (abs)'] = circuity_arrays(
+        df_connections['Orig_arr'], df_connections['Dest_dep'], df_connections['Dest_arr'], airport_data)
+    df_connections['Inbound Days Mask'] = in_mask
+    df_connections['Outbound Days Mask'] = rotate_mask(in_mask, shifts)
+
+    return df_connections
+
+
+def classify_and_group_connections(
+    df_connections,
+    max_circuity = config.MAX_CIRCUITY,
+    max_abs_circuity = config.MAX_ABS_CIRCUITY,
+    max_missed_time = config.MAX_MISSED_CONNECT_TIME,
+    min_connect_time = config.MIN_CONNECT_TIME,
+    max_connect_time = config.MAX_CONNECT_TIME
+    ):
+    """
+    Classifies bitmask candidates into logical, missed and illogical connections and rolls each set
+    up into one row per connection with day strings.
+
+    Parameters:
+    df_connections (pandas.DataFrame): Output of build_bitmask_candidates.
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity.
+    max_missed_time (float): Maximum time for a connection to be considered missed.
+    min_connect_time (float): Minimum connection time for a feasible connection.
+    max_connect_time (float): Maximum connection time for a feasible connection.
+
+    Returns:
+    tuple: A tuple containing DataFrames for logical connections, missed connections, and illogical connections.
+    """
+    dfs = list(classify_connections(df_connections, max_circuity, max_abs_circuity,
+                                    max_missed_time, min_connect_time, max_connect_time))
+    for i, df in enumerate(dfs):
+        df = rename_connection_columns(df, BITMASK_COLUMNS).reset_index(drop=True)
+        dfs[i] = group_day_masks(df, GROUP_COLUMNS)
+
+    return dfs[0], dfs[1], dfs[2]
+
+
+def group_day_masks(df, group_columns, in_col = 'Inbound Dep Day (UTC)', out_col = 'Outbound Dep Day (UTC)'):
+    """
+    Rolls up rows sharing the same descriptors into one row by OR-ing their day masks,
+    then formats the masks as day strings.
+
+    Parameters:
+    df (pandas.DataFrame): Connections with integer day masks in in_col and out_col.
+    group_columns (list): Columns identifying a connection.
+    in_col (str): Column holding the inbound day masks.
+    out_col (str): Column holding the outbound day masks.
+
+    Returns:
+    pandas.DataFrame: One row per group, with day strings in in_col and out_col.
+    """
+    bits = pd.concat([mask_to_columns(df[in_col], '_in'), mask_to_columns(df[out_col], '_out')], axis=1)
+    df_bits = pd.concat([df[group_columns], bits], axis=1)
+
+    df_agg = df_bits.groupby(group_columns, observed=True).max().reset_index()
+
+    df_agg[in_col] = mask_to_days(columns_to_mask(df_agg, '_in'))
+    df_agg[out_col] = mask_to_days(columns_to_mask(df_agg, '_out'))
+    return materialize_categoricals(df_agg[group_columns + [in_col, out_col]])
@@ -1,8 +1,118 @@
+import numpy as np
 import pandas as pd
 from functions.data_cleaning import clean_frequency
-from functions.circuity import circuity, absolute_circuity
+from functions.circuity import circuity_arrays
 from utils import config
 from .distance import haversine, great_circle_distance
+from .time_window_join import window_join_indices
+from .schedule_schema import materialize_categoricals
+from .time_conversion import SECONDS_PER_DAY
+
+# Output names of the merged arrival/departure columns
+CONNECTION_COLUMNS = {
+    'Aln_arr' : 'Inbound Airline', 
+    'Flt_arr' : 'Inbound Flt no', 
+    'Orig_arr' : 'Inbound Orig Airp', 
+    'STD_arr' : 'Inbound STD (UTC)',
+    'DLcl_arr' : 'Inbound STD (Local)', 
+    'Dest_arr' : 'Via',
+    'STA_arr' : 'Inbound STA (UTC)', 
+    'ALcl_arr' : 'Inbound STA (Local)', 
+    'Blk Hrs_arr' : 'Inbound Block Hrs', 
+    'Dep Day_arr' : 'Inbound Dep Day (UTC)', 
+    'Subfl_arr' : 'Inbound Equip',
+    'Seats_arr' : 'Inbound Seats',
+    # 'Traffic Restrictions (if any)_arr', 
+    # 'Market_arr' 
+    # 'movement_flag_arr', 
+    'UTC Dep Float_arr' :'Inbound Dep Float',
+    'UTC Arr Float_arr' : 'Inbound Arr Float',
+    'Aln_dep' : 'Outbound Airline',
+    'Flt_dep' : 'Outbound Flt no',
+    # 'Orig_dep' : 'Outbound Orig Airp',
+    'STD_dep' : 'Outbound STD (UTC)',
+    'DLcl_dep' : 'Outbound STD (Local)',
+    'Dest_dep' : 'Outbound Dest Airp',
+    'STA_dep' : 'Outbound STA (UTC)',
+    'ALcl_dep' : 'Outbound STA (Local)',
+    'Blk Hrs_dep' : 'Outbound Block Hrs',
+    'Dep Day_dep' : 'Outbound Dep Day (UTC)',
+    'Subfl_dep' : 'Outbound Equip',
+    'Seats_dep' : 'Outbound Seats',
+    # 'Traffic Restrictions (if any)_dep', 
+    # 'Market_dep',
+    # 'movement_flag_dep', 
+    'UTC Dep Float_dep' : 'Outbound Dep Float', 
+    'UTC Arr Float_dep' : 'Outbound Arr Float',
+    'Connection_time' : 'Connection Time (min)',
+    'Circuity' : 'Circuity x',
+    'Circuity (abs)' : 'Circuity (abs)',
+}
+
+# Columns identifying a connection, with the inbound flight's day
+CONNECTION_KEY_COLUMNS = ['Inbound Airline', 'Inbound Flt no', 'Via', 'Outbound Airline', 'Outbound Flt no']
+
+# Columns that vary per operating day and are rolled up into the day strings
+DAY_COLUMNS = [
+    'Inbound Dep Day (UTC)', 
+    'Outbound Dep Day (UTC)', 
+    'Inbound Dep Float', 
+    'Inbound Arr Float', 
+    'Outbound Dep Float',
+    'Outbound Arr Float'
+]
+
+
+def _side_columns(suffix):
+    # Source columns of one side of a connection, in output order: (descriptive columns, all columns)
+    columns = [col for col in CONNECTION_COLUMNS if col.endswith(suffix)]
+    return [col for col in columns if CONNECTION_COLUMNS[col] not in DAY_COLUMNS], columns
+
+
+def lexicographic_ids(columns):
+    """
+    Numbers the distinct rows of several aligned integer/float arrays, in lexicographic order.
+
+    Row ids are dense and ordered like the sorted rows, so sorting by id gives the same order as
+    sorting by the columns, which is the order groupby returns its groups in.
+
+    Parameters:
+    columns (list): Arrays of equal length, most significant first.
+
+    Returns:
+    numpy.ndarray: An int64 id per row.
+    """
+    n = len(columns[0])
+    ids = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return ids
+    order = np.lexsort(columns[::-1])
+    new_row = np.zeros(n, dtype=bool)
+    new_row[0] = True
+    for column in columns:
+        column = np.asarray(column)[order]
+        new_row[1:] |= column[1:] != column[:-1]
+    ids[order] = np.cumsum(new_row) - 1
+    return ids
+
+
+def line_keys(df, columns):
+    """
+    Gives every row an integer key identifying its values in the given columns.
+
+    Keys are ranked like the sorted values, -1 marks rows with a missing value (which groupby drops).
+
+    Parameters:
+    df (pandas.DataFrame): The DataFrame.
+    columns (list): Columns identifying a row.
+
+    Returns:
+    numpy.ndarray: An int64 key per row.
+    """
+    codes = [pd.factorize(df[col], sort=True)[0] for col in columns]
+    keys = lexicographic_ids(codes)
+    keys[np.any(np.array(codes) < 0, axis=0)] = -1
+    return keys
 
 
 def build_and_filter_connections(
@@ -11,37 +121,187 @@ def build_and_filter_connections(
     max_abs_circuity = config.MAX_ABS_CIRCUITY, 
     max_missed_time = config.MAX_MISSED_CONNECT_TIME, 
     min_connect_time = config.MIN_CONNECT_TIME, 
-    max_connect_time = config.MAX_CONNECT_TIME
+    max_connect_time = config.MAX_CONNECT_TIME,
+    airport_data = None,
+    snap_seconds = False
     ):
     """
     Builds connections between arrival and departure dataframes, and filters for logical, illogical, and missed connections.
 
+    Connections are carried as row positions into the arrival and departure tables, with their
+    connection time and circuity. Duplicates are removed and connections are grouped on integer
+    line keys, the descriptive columns are only taken from the two tables for the grouped rows.
+
     Parameters:
-    df_arr (pandas.DataFrame): DataFrame of arrivals.
-    df_dep (pandas.DataFrame): DataFrame of departures.
+    df (pandas.DataFrame): The exploded schedule with movement flag and UTC floats.
     max_circuity (float): Maximum allowed circuity.
     max_abs_circuity (float): Maximum allowed absolute circuity.
     max_missed_time (float): Maximum time for a connection to be considered missed.
     min_connect_time (float): Minimum connection time for a feasible connection.
     max_connect_time (float): Maximum connection time for a feasible connection.
+    airport_data (dict or AirportRegistry): Airport data keyed by code, used for circuity. The shared airport registry if None.
+    snap_seconds (bool): Snap connection times to whole seconds before classifying them, like the
+        bitmask engine, so that connections on a threshold do not depend on the size of the UTC floats.
 
     Returns:
-    tuple: A tuple containing DataFrames for logical connections, illogical connections, and missed connections.
+    tuple: A tuple containing DataFrames for logical connections, missed connections, and illogical connections.
     """
 
     # Split the main df into arrivals and departures 
-    df_arr = df[df['movement_flag'] == 'Arr']
-    df_dep = df[df['movement_flag'] == 'Dep']
+    df_arr = df[df['movement_flag'] == 'Arr'].reset_index(drop=True)
+    df_dep = df[df['movement_flag'] == 'Dep'].reset_index(drop=True)
     
-    # Merge the arrival and departure dataframes
-    df_connections = pd.merge(left=df_arr, right=df_dep, how='left', 
-                              left_on='Dest', right_on='Orig', 
-                              suffixes=('_arr', '_dep'))
+    # Join arrivals to departures at the same station, only keeping pairs whose connection
+    # time can land in one of the windows below (missed, or feasible)
+    window_lower = min(max_missed_time, min_connect_time)
+    window_upper = max(max_connect_time, min_connect_time)
+    arr_time = df_arr['UTC Arr Float'].to_numpy(dtype=float)
+    dep_time = df_dep['UTC Dep Float'].to_numpy(dtype=float)
+    arr_row, dep_row = window_join_indices(df_arr['Dest'].to_numpy(), arr_time, df_dep['Orig'].to_numpy(), dep_time,
+                                           window_lower, window_upper)
+
+    # Stations as integer codes shared by both tables
+    station_codes, stations = pd.factorize(np.concatenate([
+        df_arr['Orig'].to_numpy(dtype=object), df_arr['Dest'].to_numpy(dtype=object), df_dep['Dest'].to_numpy(dtype=object)]))
+    arr_orig, arr_dest, dep_dest = np.split(station_codes, [len(df_arr), 2 * len(df_arr)])
+
+    connection_time = dep_time[dep_row] - arr_time[arr_row]
+    if snap_seconds:
+        connection_time = np.round(connection_time * SECONDS_PER_DAY) / SECONDS_PER_DAY
+    df_connections = pd.DataFrame({
+        'arr_row': arr_row,
+        'dep_row': dep_row,
+        'Orig_arr': arr_orig[arr_row],
+        'Dest_dep': dep_dest[dep_row],
+        'Connection_time': connection_time,
+    })
+
+    # Circuity of every distinct O&D/via triple, spread to the connections
+    n_stations = len(stations) + 1
+    triple_key = (arr_orig[arr_row].astype(np.int64) * n_stations + dep_dest[dep_row]) * n_stations + arr_dest[arr_row]
+    triples, inverse = np.unique(triple_key, return_inverse=True)
+    triples = np.stack([triples // n_stations**2, triples // n_stations % n_stations, triples % n_stations])
+    circuity_values, abs_circuity_values = circuity_arrays(
+        stations[triples[0]], stations[triples[1]], stations[triples[2]], airport_data)
+    df_connections['Circuity'] = circuity_values[inverse]
+    df_connections['Circuity (abs)'] = abs_circuity_values[inverse]
+
+    df_logical_connections, df_missed_connections, df_illogical_connections = classify_connections(
+        df_connections, max_circuity, max_abs_circuity, max_missed_time, min_connect_time, max_connect_time)
+
+    print (f'Number of logical connections: {len(df_logical_connections)}')
+    print (f'Number of illogical connections: {len(df_illogical_connections)}')
+    print (f'Number of missed connections: {len(df_missed_connections)}')
+
+    arr_side = _connection_side(df_arr, '_arr')
+    dep_side = _connection_side(df_dep, '_dep')
+
+    # Perform groupby aggregation so that every flight with the same descriptors is rolled out on the same row
+    return tuple(group_connections(frame, arr_side, dep_side)
+                 for frame in [df_logical_connections, df_missed_connections, df_illogical_connections])
+
+
+def _connection_side(df, suffix):
+    # Per-row keys of one side of the connections, computed once per schedule row instead of per connection
+    descriptive, columns = _side_columns(suffix)
+    source = [col[:-len(suffix)] for col in columns]
+
+    # Make sure that the day 8 appear as D1s
+    days = df['Dep Day'].apply(lambda x: 1 if x == 8 else x)
+
+    # Every output column of the row, for duplicate removal (missing values compare equal, like drop_duplicates)
+    row_values = [pd.factorize(days if col == 'Dep Day' else df[col])[0] for col in source]
+    return {
+        'df': df,
+        'columns': dict(zip(columns, source)),
+        'group_key': line_keys(df, [col[:-len(suffix)] for col in descriptive]),
+        'row_key': lexicographic_ids(row_values),
+        'days': days.astype(str).to_numpy(dtype=object),
+    }
+
+
+def group_connections(df_connections, arr_side, dep_side):
+    """
+    Removes duplicate connections and rolls connections with the same descriptors up into one row,
+    concatenating their inbound and outbound day strings.
+
+    Gives the same rows, in the same order, as renaming the merged columns with CONNECTION_COLUMNS,
+    drop_duplicates() and a groupby over every non-day column joining the day strings.
 
-    # Calculate connection time and circuity
-    df_connections['Connection_time'] = df_connections['UTC Dep Float_dep'] - df_connections['UTC Arr Float_arr']
-    df_connections['Circuity'] = df_connections.apply(lambda row: circuity(row['Orig_arr'], row['Dest_dep'], row['Dest_arr']), axis=1)
-    df_connections['Circuity (abs)'] = df_connections.apply(lambda row: absolute_circuity(row['Orig_arr'], row['Dest_dep'], row['Dest_arr']), axis=1)
+    Parameters:
+    df_connections (pandas.DataFrame): Connections with 'arr_row', 'dep_row', 'Connection_time', 'Circuity' and 'Circuity (abs)'.
+    arr_side (dict): Keys of the arrival table, from _connection_side.
+    dep_side (dict): Keys of the departure table, from _connection_side.
+
+    Returns:
+    pandas.DataFrame: One row per group, with the CONNECTION_COLUMNS outside DAY_COLUMNS and the two day strings.
+    """
+    arr_row = df_connections['arr_row'].to_numpy()
+    dep_row = df_connections['dep_row'].to_numpy()
+    values = [df_connections[col].to_numpy(dtype=float) for col in ['Connection_time', 'Circuity', 'Circuity (abs)']]
+
+    # Remove duplicates, keeping first occurrences in their original order
+    row_pair = arr_side['row_key'][arr_row] * (dep_side['row_key'].max(initial=0) + 1) + dep_side['row_key'][dep_row]
+    duplicate_ids = lexicographic_ids([row_pair] + values)
+    keep = np.sort(np.unique(duplicate_ids, return_index=True)[1])
+
+    # Rows with a missing group value are dropped, like groupby does
+    arr_key = arr_side['group_key'][arr_row[keep]]
+    dep_key = dep_side['group_key'][dep_row[keep]]
+    values = [value[keep] for value in values]
+    complete = (arr_key >= 0) & (dep_key >= 0) & np.all([~np.isnan(value) for value in values], axis=0)
+    keep, arr_key, dep_key = keep[complete], arr_key[complete], dep_key[complete]
+    values = [value[complete] for value in values]
+
+    # Group ids are ordered like the sorted group columns, the rows of a group keep their order
+    group = lexicographic_ids([arr_key * (dep_side['group_key'].max(initial=0) + 1) + dep_key] + values)
+    order = np.argsort(group, kind='stable')
+    group = group[order]
+    starts = np.flatnonzero(np.diff(group, prepend=-1))
+    ends = np.r_[starts[1:], len(group)]
+    first = keep[order[starts]]
+
+    # Only the grouped rows get their descriptive columns
+    df_agg = pd.DataFrame(index=pd.RangeIndex(len(starts)))
+    for side, rows in [(arr_side, arr_row[first]), (dep_side, dep_row[first])]:
+        for col, source in side['columns'].items():
+            if CONNECTION_COLUMNS[col] not in DAY_COLUMNS:
+                df_agg[CONNECTION_COLUMNS[col]] = side['df'][source].take(rows).reset_index(drop=True)
+    for col in ['Connection_time', 'Circuity', 'Circuity (abs)']:
+        df_agg[CONNECTION_COLUMNS[col]] = df_connections[col].to_numpy()[first]
+
+    for name, side, rows in [('Inbound Dep Day (UTC)', arr_side, arr_row), ('Outbound Dep Day (UTC)', dep_side, dep_row)]:
+        days = side['days'][rows[keep[order]]]
+        joined = days[starts]
+        for i in np.flatnonzero(ends - starts > 1):
+            joined[i] = ''.join(days[starts[i]:ends[i]])
+        df_agg[name] = pd.Series(joined, dtype=str)
+
+    return materialize_categoricals(df_agg)
+
+
+def classify_connections(
+    df_connections, 
+    max_circuity = config.MAX_CIRCUITY, 
+    max_abs_circuity = config.MAX_ABS_CIRCUITY, 
+    max_missed_time = config.MAX_MISSED_CONNECT_TIME, 
+    min_connect_time = config.MIN_CONNECT_TIME, 
+    max_connect_time = config.MAX_CONNECT_TIME
+    ):
+    """
+    Splits candidate connections into logical, missed and illogical connections.
+
+    Parameters:
+    df_connections (pandas.DataFrame): Arrival/departure pairs with 'Connection_time', 'Circuity' and 'Circuity (abs)' columns.
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity.
+    max_missed_time (float): Maximum time for a connection to be considered missed.
+    min_connect_time (float): Minimum connection time for a feasible connection.
+    max_connect_time (float): Maximum connection time for a feasible connection.
+
+    Returns:
+    tuple: A tuple containing DataFrames for logical connections, missed connections, and illogical connections.
+    """
 
     # Remove connections that depart and arrive at the same station
     df_connections = df_connections[df_connections['Orig_arr'] != df_connections['Dest_dep']]
@@ -64,100 +324,7 @@ def build_and_filter_connections(
                                             ((df_connections['Circuity'] <= max_circuity) |
                                             (df_connections['Circuity (abs)'] <= max_abs_circuity))]
 
-    print (f'Number of logical connections: {len(df_logical_connections)}')
-    print (f'Number of illogical connections: {len(df_illogical_connections)}')
-    print (f'Number of missed connections: {len(df_missed_connections)}')
-
-    # Define new column names
-    new_cols_name = {
-        'Aln_arr' : 'Inbound Airline', 
-        'Flt_arr' : 'Inbound Flt no', 
-        'Orig_arr' : 'Inbound Orig Airp', 
-        'STD_arr' : 'Inbound STD (UTC)',
-        'DLcl_arr' : 'Inbound STD (Local)', 
-        'Dest_arr' : 'Via',
-        'STA_arr' : 'Inbound STA (UTC)', 
-        'ALcl_arr' : 'Inbound STA (Local)', 
-        'Blk Hrs_arr' : 'Inbound Block Hrs', 
-        'Dep Day_arr' : 'Inbound Dep Day (UTC)', 
-        'Subfl_arr' : 'Inbound Equip',
-        'Seats_arr' : 'Inbound Seats',
-        # 'Traffic Restrictions (if any)_arr', 
-        # 'Market_arr' 
-        # 'movement_flag_arr', 
-        'UTC Dep Float_arr' :'Inbound Dep Float',
-        'UTC Arr Float_arr' : 'Inbound Arr Float',
-        'Aln_dep' : 'Outbound Airline',
-        'Flt_dep' : 'Outbound Flt no',
-        # 'Orig_dep' : 'Outbound Orig Airp',
-        'STD_dep' : 'Outbound STD (UTC)',
-        'DLcl_dep' : 'Outbound STD (Local)',
-        'Dest_dep' : 'Outbound Dest Airp',
-        'STA_dep' : 'Outbound STA (UTC)',
-        'ALcl_dep' : 'Outbound STA (Local)',
-        'Blk Hrs_dep' : 'Outbound Block Hrs',
-        'Dep Day_dep' : 'Outbound Dep Day (UTC)',
-        'Subfl_dep' : 'Outbound Equip',
-        'Seats_dep' : 'Outbound Seats',
-        # 'Traffic Restrictions (if any)_dep', 
-        # 'Market_dep',
-        # 'movement_flag_dep', 
-        'UTC Dep Float_dep' : 'Outbound Dep Float', 
-        'UTC Arr Float_dep' : 'Outbound Arr Float',
-        'Connection_time' : 'Connection Time (min)',
-        'Circuity' : 'Circuity x',
-        'Circuity (abs)' : 'Circuity (abs)',
-    }
-
-    # Rename columns in all DataFrames
-    df_logical_connections = rename_connection_columns(df_logical_connections, new_cols_name)
-    df_illogical_connections = rename_connection_columns(df_illogical_connections, new_cols_name)
-    df_missed_connections = rename_connection_columns(df_missed_connections, new_cols_name)
-    
-    # Make sure that the day 8 appear as D1s 
-    for df in [df_logical_connections, df_illogical_connections, df_missed_connections]: 
-        df['Inbound Dep Day (UTC)'] = df['Inbound Dep Day (UTC)'].apply(lambda x: 1 if x == 8 else x)
-        df['Outbound Dep Day (UTC)'] = df['Outbound Dep Day (UTC)'].apply(lambda x: 1 if x == 8 else x)
-        
-    # Remove duplicates in all DataFrames
-    df_logical_connections = df_logical_connections.drop_duplicates()
-    df_illogical_connections = df_illogical_connections.drop_duplicates()
-    df_missed_connections = df_missed_connections.drop_duplicates()
-
-    # Group everything in compact form
-    group_columns = [col for col in df_logical_connections.columns if col not in [
-        'Inbound Dep Day (UTC)', 
-        'Outbound Dep Day (UTC)', 
-        'Inbound Dep Float', 
-        'Inbound Arr Float', 
-        'Outbound Dep Float',
-        'Outbound Arr Float'
-    ]]
-    
-    dfs = [df_logical_connections, df_missed_connections, df_illogical_connections]
-    print ('Copying to clipboard')
-
-    # df_logical_connections.to_clipboard(index=False)
-    print(f'logical connectionsL {len(df_logical_connections)}')
-
-    # Perform groupby aggregation so that every flight with the same descriptors is rolled out on the same row
-
-    for i, df in enumerate(dfs):
-        df['Inbound Dep Day (UTC)'] = df['Inbound Dep Day (UTC)'].astype(str)
-        df['Outbound Dep Day (UTC)'] = df['Outbound Dep Day (UTC)'].astype(str)
-
-        df_agg = df.groupby(group_columns).agg({
-            'Inbound Dep Day (UTC)': lambda x: ''.join(x), 
-            'Outbound Dep Day (UTC)': lambda x: ''.join(x)
-        }).reset_index()
-
-        # Apply functions to remove duplicates and sort strings
-        # df_agg['Inbound Dep Day (UTC)'] = clean_frequency(df_agg['Inbound Dep Day (UTC)'])
-        # df_agg['Outbound Dep Day (UTC)'] = clean_frequency(df_agg['Outbound Dep Day (UTC)'])
-
-        dfs[i] = df_agg
-
-    return dfs[0], dfs[1], dfs[2]
+    return df_logical_connections, df_missed_connections, df_illogical_connections
 
 def rename_connection_columns(df, new_columns_mapping):
     """
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import re
+import pandas as pd
+from utils.config import CACHE_DIR, CACHE_MAX_BYTES, ROOT_DIR
+
+# Formats tried in order when writing a frame. Parquet needs pyarrow and columns it can type (the
+# schedule schema gives every imported column a single type), anything else falls back to pickle.
+CACHE_FORMATS = ('parquet', 'pkl')
+
+# Names of the entries written by cached_frame: <stage>-<source and params key>-<content hash>.<format>.
+# Only these are evicted, other files kept in the directory are left alone
+ENTRY_PATTERN = re.compile(r'^\w+-[0-9a-f]{32}-[0-9a-f]{32}\.(' + '|'.join(CACHE_FORMATS) + r')$')
+
+# Modules whose code builds cached frames: the import schema and the pre-processing stages, relative to ROOT_DIR
+CACHED_CODE = [
+    'functions/import_data.py',
+    'functions/schedule_schema.py',
+    'functions/preprocess.py',
+    'functions/explode_schedule.py',
+    'functions/data_enrich.py',
+    'functions/time_conversion.py',
+    'functions/day_mask.py',
+    'classes/timezone_table.py',
+]
+
+
+def source_hash(paths, root=ROOT_DIR):
+    """
+    Returns the BLAKE2 hex digest of the content of several source files.
+
+    Parameters:
+    paths (list): File paths, relative to root.
+    root (str): Directory the paths are relative to.
+
+    Returns:
+    str: The hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        digest.update(path.encode())
+        with open(os.path.join(root, path), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Version of the code that builds cached frames, part of every entry name. Derived from the source of
+# CACHED_CODE, so entries built by older code are never reused after any of these modules changes
+CACHE_VERSION = source_hash(CACHED_CODE)
+
+# Hits and misses of cached_frame in this process, read by the run report
+CACHE_STATS = {'hits': 0, 'misses': 0}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Returns the BLAKE2 hex digest of a file's content.
+
+    Parameters:
+    path (str): Path to the file.
+    chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+    str: The hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(*parts):
+    """
+    Builds a short, filesystem-safe key from any number of parts (paths, sheet names, parameters).
+
+    Parameters:
+    *parts: Values identifying the cached content. Their repr is hashed.
+
+    Returns:
+    str: The hex key.
+    """
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def _entry_paths(name, cache_dir):
+    return [os.path.join(cache_dir, f'{name}.{fmt}') for fmt in CACHE_FORMATS]
+
+
+def load_frame(name, cache_dir=CACHE_DIR):
+    """
+    Loads a cached DataFrame, or returns None if there is no entry for the name.
+
+    A hit refreshes the entry's modification time, which is what eviction uses as last access.
+
+    Parameters:
+    name (str): Name of the entry.
+    cache_dir (str): Directory holding the cache.
+
+    Returns:
+    pandas.DataFrame or None: The cached frame.
+    """
+    for path in _entry_paths(name, cache_dir):
+        if not os.path.exists(path):
+            continue
+        try:
+            df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+        except Exception:
+            # A truncated or unreadable entry is treated as a miss and rebuilt
+            os.remove(path)
+            continue
+        os.utime(path)
+        return df
+    return None
+
+
+def save_frame(name, df, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Stores a DataFrame in the cache, then evicts least recently used entries above max_bytes.
+
+    Parameters:
+    name (str): Name of the entry.
+    df (pandas.DataFrame): The frame to store.
+    cache_dir (str): Directory holding the cache.
+    max_bytes (int): Maximum total size of the cache directory.
+
+    Returns:
+    str: Path of the written entry.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    for path in _entry_paths(name, cache_dir):
+        tmp_path = path + '.tmp'
+        try:
+            if path.endswith('.parquet'):
+                df.to_parquet(tmp_path)
+            else:
+                df.to_pickle(tmp_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        # Write then rename, so a crash never leaves a half-written entry behind
+        os.replace(tmp_path, path)
+        evict(cache_dir, max_bytes, keep=path)
+        return path
+    raise ValueError(f"Could not write cache entry '{name}' in any of {CACHE_FORMATS}")
+
+
+def remove_entries(prefix, cache_dir=CACHE_DIR, keep=None):
+    """
+    Removes all cache entries whose name starts with prefix, except `keep`.
+
+    Parameters:
+    prefix (str): Name prefix of the entries to remove.
+    cache_dir (str): Directory holding the cache.
+    keep (str): Name of an entry to leave in place.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    for filename in os.listdir(cache_dir):
+        name = filename.rsplit('.', 1)[0]
+        if filename.startswith(prefix) and name != keep:
+            os.remove(os.path.join(cache_dir, filename))
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, keep=None):
+    """
+    Deletes least recently used entries until the entries in the cache directory fit in max_bytes.
+
+    Only entries written by cached_frame (see ENTRY_PATTERN) are counted and evicted.
+
+    Parameters:
+    cache_dir (str): Directory holding the cache.
+    max_bytes (int): Maximum total size of the cache directory.
+    keep (str): Path of an entry that must not be evicted (e.g. the one just written).
+    """
+    entries = []
+    for filename in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, filename)
+        if ENTRY_PATTERN.match(filename) and os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total -= size
+
+
+def cached_frame(stage, source_path, params, build, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Returns the frame for (stage, source file, params) from the cache, building and storing it on a miss.
+
+    Entries are named <stage>-<source and params key>-<content hash>, so editing the source file
+    changes the name and the previous versions of the same stage are removed when the new one is written.
+    The key includes CACHE_VERSION, so entries built by an older version of the code are never returned.
+
+    Parameters:
+    stage (str): Name of the pipeline stage, e.g. 'schedule' or 'preprocessed'.
+    source_path (str): File the frame is derived from.
+    params (tuple): Any other values the frame depends on (sheet name, hub, columns, ...).
+    build (callable): Called without arguments to build the frame on a miss.
+    cache_dir (str): Directory holding the cache.
+    max_bytes (int): Maximum total size of the cache directory.
+
+    Returns:
+    pandas.DataFrame: The cached or freshly built frame.
+    """
+    prefix = f'{stage}-{cache_key(CACHE_VERSION, os.path.abspath(source_path), params)}-'
+    name = prefix + file_hash(source_path)
+
+    df = load_frame(name, cache_dir)
+    if df is not None:
+        CACHE_STATS['hits'] += 1
+        return df
+
+    CACHE_STATS['misses'] += 1
+    df = build()
+    remove_entries(prefix, cache_dir, keep=name)
+    save_frame(name, df, cache_dir, max_bytes)
+
+    # Hand back the stored copy, so a miss returns exactly the same dtypes as later hits
+    return load_frame(name, cache_dir)
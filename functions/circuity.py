@@ -1,21 +1,73 @@
 
 from functools import lru_cache
 from collections import OrderedDict
-from .distance import great_circle_distance
-from .import_data import import_airport_data
+import numpy as np
+import pandas as pd
+from .distance import great_circle_distance, distance_matrix, airport_coordinates
+from classes.airport import get_airport_registry
 
 @lru_cache(maxsize=None)  # Infinite cache size. Adjust as needed.
-def circuity(airport1, airport2, hub, airport_data = import_airport_data()):
+def circuity(airport1, airport2, hub, airport_data = None):
+    if airport_data is None:
+        airport_data = get_airport_registry()
     direct_distance = great_circle_distance(airport1, airport2, airport_data)
     total_distance = great_circle_distance(airport1, hub, airport_data) + great_circle_distance(hub, airport2, airport_data)
     return total_distance/direct_distance
 
 @lru_cache(maxsize=None)  # Infinite cache size. Adjust as needed.
-def absolute_circuity(airport1, airport2, hub,  airport_data = import_airport_data()):
+def absolute_circuity(airport1, airport2, hub,  airport_data = None):
+    if airport_data is None:
+        airport_data = get_airport_registry()
     direct_distance = great_circle_distance(airport1, airport2, airport_data)
     total_distance = great_circle_distance(airport1, hub, airport_data) + great_circle_distance(hub, airport2, airport_data)
     return total_distance - direct_distance
 
+def circuity_arrays(airports1, airports2, hubs, airport_data = None, dtype = np.float64):
+    """
+    Computes circuity and absolute circuity for whole columns of O&D/hub triples at once.
+
+    Airport codes are mapped to integer ids, the great circle distance matrix between the
+    airports involved is built with one vectorized haversine call, and the three legs of
+    every triple are then read from the matrix by array indexing.
+
+    Parameters:
+    airports1 (array-like): Origin airport codes.
+    airports2 (array-like): Destination airport codes.
+    hubs (array-like): Connecting airport codes.
+    airport_data (dict or AirportRegistry): Airport data keyed by code. The shared registry if None.
+        A registry with distances (AirportRegistry.with_distances) is read instead of building the matrix.
+    dtype (numpy.dtype): Dtype of the distance matrix (np.float32 halves its memory).
+
+    Returns:
+    tuple: Two numpy arrays, circuity (multiple of direct distance) and absolute circuity (km).
+    """
+    airports1 = np.asarray(airports1, dtype=object)
+    airports2 = np.asarray(airports2, dtype=object)
+    hubs = np.asarray(hubs, dtype=object)
+    n = len(airports1)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    if airport_data is None:
+        airport_data = get_airport_registry()
+
+    if getattr(airport_data, 'distances', None) is not None:
+        # Distances computed once for the registry, indexed by airport id
+        ids, matrix = airport_data.ids(np.concatenate([airports1, airports2, hubs])), airport_data.distances
+    else:
+        # Map every code to an integer id, only over the airports actually used
+        ids, codes = pd.factorize(np.concatenate([airports1, airports2, hubs]))
+        lats, lons = airport_coordinates(list(codes), airport_data)
+        matrix = distance_matrix(lats, lons, dtype=dtype)
+
+    id1, id2, id_hub = ids[:n], ids[n:2 * n], ids[2 * n:]
+    direct_distance = matrix[id1, id2].astype(np.float64)
+    total_distance = matrix[id1, id_hub].astype(np.float64) + matrix[id_hub, id2]
+
+    # Same-airport pairs have no direct distance, like the scalar version they give inf/nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        circuity_values = total_distance / direct_distance
+    return circuity_values, total_distance - direct_distance
+
 # if __name__ == '__main__':
         
 #     # Test circuity functions
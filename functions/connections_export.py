@@ -0,0 +1,179 @@
+import json
+import os
+import pandas as pd
+from functions.connections_to_excel import export_connections_to_excel, connection_statistics
+from utils.config import MAX_CIRCUITY, MAX_ABS_CIRCUITY, MAX_MISSED_CONNECT_TIME, MIN_CONNECT_TIME, MAX_CONNECT_TIME
+
+# Output file suffix of each connection set for the file-per-frame backends
+FRAME_NAMES = ('valid', 'missed', 'illogical')
+
+
+def _write_parquet(df, path):
+    df.to_parquet(path, index=False)
+
+
+def _write_feather(df, path):
+    df.reset_index(drop=True).to_feather(path)
+
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False)
+
+
+# Backends writing one file per connection set: format name -> (file extension, writer)
+FRAME_WRITERS = {
+    'parquet': ('parquet', _write_parquet),
+    'feather': ('feather', _write_feather),
+    'csv': ('csv', _write_csv),
+}
+
+OUTPUT_FORMATS = ('xlsx', 'xlsx-streaming') + tuple(FRAME_WRITERS)
+
+# Formats a file can be written to chunk by chunk
+STREAMING_FORMATS = ('parquet', 'csv')
+
+
+class FrameAppender:
+    """
+    Writes DataFrames with the same columns to one file as they come, for results produced in
+    chunks that should not be held in memory together.
+    """
+
+    def __init__(self, path, output_format = 'parquet'):
+        """
+        Parameters:
+        path (str): File to write.
+        output_format (str): One of STREAMING_FORMATS. Parquet needs pyarrow.
+        """
+        if output_format not in STREAMING_FORMATS:
+            raise ValueError(f"Invalid output format '{output_format}'. Supported formats: {', '.join(STREAMING_FORMATS)}.")
+        output_dir = os.path.dirname(path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.path = path
+        self.output_format = output_format
+        self.rows = 0
+        self._file = open(path, 'w', newline='') if output_format == 'csv' else None
+        self._writer = None
+        self._columns = None
+
+    def append(self, df):
+        """
+        Appends a chunk.
+
+        Parameters:
+        df (pandas.DataFrame): The chunk, with the columns of the first one.
+        """
+        if self.output_format == 'csv':
+            df.to_csv(self._file, index=False, header=self.rows == 0)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                # Columns that are empty in the first chunk are typed as strings
+                schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema])
+                self._writer = pq.ParquetWriter(self.path, schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        if self._columns is None:
+            self._columns = list(df.columns)
+        self.rows += len(df)
+
+    def close(self, empty = None):
+        """
+        Closes the file. A parquet file that received no chunk is written from empty.
+
+        Parameters:
+        empty (pandas.DataFrame): Frame written when nothing was appended, an empty frame without columns if None.
+        """
+        if self._file is not None:
+            if self.rows == 0 and empty is not None:
+                empty.to_csv(self._file, index=False)
+            self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+        else:
+            (pd.DataFrame() if empty is None else empty).to_parquet(self.path, index=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_connections(
+    df_connections,
+    df_missed_connections,
+    df_illogical_connections,
+    output_format = 'xlsx',
+    output_path = 'Output/Connections_builder_output',
+    min_connect_time = MIN_CONNECT_TIME,
+    max_connect_time = MAX_CONNECT_TIME,
+    max_missed_time = MAX_MISSED_CONNECT_TIME,
+    max_circuity = MAX_CIRCUITY,
+    max_abs_circuity = MAX_ABS_CIRCUITY,
+    extra_sheets = None
+    ):
+    """
+    Exports the connection sets with the selected output backend.
+
+    'xlsx' and 'xlsx-streaming' write a single workbook (regular or write-only) with a cover page.
+    'parquet', 'feather' and 'csv' write one file per connection set (<output_path>_valid.<ext>, ...)
+    plus the cover page statistics and parameters as <output_path>_statistics.json, skipping the
+    cost of building an xlsx entirely.
+
+    Parameters:
+    df_connections (pandas.DataFrame): Valid (logical) connections.
+    df_missed_connections (pandas.DataFrame): Missed connections.
+    df_illogical_connections (pandas.DataFrame): Illogical connections.
+    output_format (str): One of OUTPUT_FORMATS.
+    output_path (str): Output path without extension.
+    min_connect_time (float): Minimum connection time for a feasible connection.
+    max_connect_time (float): Maximum connection time for a feasible connection.
+    max_missed_time (float): Maximum time for a connection to be considered missed.
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity.
+    extra_sheets (list): (sheet name, DataFrame) pairs added to the workbook formats, e.g. a run report.
+        The file backends ignore them.
+
+    Returns:
+    list: Paths of the files written.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Invalid output format '{output_format}'. Supported formats: {', '.join(OUTPUT_FORMATS)}.")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if output_format in ('xlsx', 'xlsx-streaming'):
+        filename = f'{output_path}.xlsx'
+        export_connections_to_excel(df_connections, df_missed_connections, df_illogical_connections,
+                                    min_connect_time, max_connect_time, max_missed_time,
+                                    max_circuity, max_abs_circuity, filename=filename,
+                                    streaming=output_format == 'xlsx-streaming', extra_sheets=extra_sheets)
+        return [filename]
+
+    extension, writer = FRAME_WRITERS[output_format]
+    paths = []
+    for name, df in zip(FRAME_NAMES, [df_connections, df_missed_connections, df_illogical_connections]):
+        path = f'{output_path}_{name}.{extension}'
+        writer(df, path)
+        paths.append(path)
+
+    stats = connection_statistics(df_connections, df_missed_connections)
+    stats['Parameters'] = {
+        'Min CT (min)': min_connect_time * 1440,
+        'Max CT (min)': max_connect_time * 1440,
+        'Max missed CT (min)': max_missed_time * 1440,
+        'Max circuity': max_circuity,
+        'Max abs circuity (km)': max_abs_circuity,
+    }
+    path = f'{output_path}_statistics.json'
+    with open(path, 'w') as f:
+        # NaN medians (no connections) are written as null
+        json.dump({key: (None if value != value else value) for key, value in stats.items()}, f, indent=2, default=float)
+    paths.append(path)
+    return paths
@@ -1,9 +1,18 @@
+import numpy as np
 import pandas as pd
 import os
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+from functions.day_mask import days_to_mask, mask_day_count
 from utils.config import HUB, MAX_CIRCUITY, MAX_ABS_CIRCUITY, MAX_MISSED_CONNECT_TIME, MIN_CONNECT_TIME, MAX_CONNECT_TIME
 
+CENTER_ALIGNED = Alignment(horizontal='center', vertical='center')
+BOLD_FONT = Font(bold=True, size=14)
+ITALIC_FONT = Font(italic=True)
+HEADER_FONT = Font(bold=True)
+
 def export_connections_to_excel(
     df_connections, 
     df_missed_connections, 
@@ -13,8 +22,28 @@ def export_connections_to_excel(
     max_missed_time = MAX_MISSED_CONNECT_TIME, 
     max_circuity = MAX_CIRCUITY, 
     max_abs_circuity = MAX_ABS_CIRCUITY, 
-    filename='Output/Connections_builder_output.xlsx'):
-    
+    filename='Output/Connections_builder_output.xlsx',
+    streaming=False,
+    chunk_size=10000,
+    extra_sheets=None):
+    """
+    Exports valid, missed and illogical connections to an Excel workbook with a cover page of statistics.
+
+    Parameters:
+    df_connections (pandas.DataFrame): Valid (logical) connections.
+    df_missed_connections (pandas.DataFrame): Missed connections.
+    df_illogical_connections (pandas.DataFrame): Illogical connections.
+    min_connect_time (float): Minimum connection time for a feasible connection.
+    max_connect_time (float): Maximum connection time for a feasible connection.
+    max_missed_time (float): Maximum time for a connection to be considered missed.
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity.
+    filename (str): Path of the workbook.
+    streaming (bool): Write rows incrementally with a write-only workbook instead of building the
+        whole workbook in memory. Recommended for large connection sets.
+    chunk_size (int): Rows converted at a time in streaming mode.
+    extra_sheets (list): (sheet name, DataFrame) pairs written after the connection sheets, e.g. a run report.
+    """
     
     # Create Output directory if it doesn't exist
     output_dir = os.path.dirname(filename)
@@ -22,57 +51,170 @@ def export_connections_to_excel(
         os.makedirs(output_dir)
     
     # Calculate statistics
-    tot_connections = len(df_connections)
-    median_connect_time = df_connections['Connection Time (min)'].median()
-    median_abs_circuity = df_connections['Circuity (abs)'].median()
-    median_circuity = df_connections['Circuity x'].median()
-    missed_connections = len(df_missed_connections)
+    stats = connection_statistics(df_connections, df_missed_connections)
+    cells = cover_page_cells(stats, min_connect_time, max_connect_time, max_missed_time, max_circuity, max_abs_circuity)
+
+    if streaming:
+        write_workbook_streaming(filename, cells, [
+            ('Valid connections', df_connections),
+            ('Missed connections', df_missed_connections),
+            ('Illogical connections', df_illogical_connections),
+        ] + list(extra_sheets or []), chunk_size)
+        return
 
     # Write to Excel
     with pd.ExcelWriter(filename, engine='openpyxl') as writer:
         df_connections.to_excel(writer, sheet_name='Valid connections', index=False)
         df_missed_connections.to_excel(writer, sheet_name='Missed connections', index=False)
         df_illogical_connections.to_excel(writer, sheet_name='Illogical connections', index=False)
+        for sheet_name, df in extra_sheets or []:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
 
         # Create and format the cover page
         writer.book.create_sheet('Cover Page', 0)
         cover = writer.book['Cover Page']
         cover.sheet_view.showGridLines = False
 
-        center_aligned = Alignment(horizontal='center', vertical='center')
-        bold_font = Font(bold=True, size=14)
-        italic_font = Font(italic=True)
-
-        cover['A1'] = "Schedule Connectivity Statistics"
-        cover['A1'].font = bold_font
-        cover['A1'].alignment = center_aligned
+        for address, value, font in cells:
+            cover[address] = value
+            if font is not None:
+                cover[address].font = font
+        cover['A1'].alignment = CENTER_ALIGNED
         cover.merge_cells('A1:D1')
 
-        cover['A3'] = "Valid Connections"
-        cover['A3'].font = bold_font
-        cover['B3'] = tot_connections
-
-        cover['A4'] = "Median CT (Mins)"
-        cover['A4'].font = bold_font
-        cover['B4'] = round(median_connect_time, 0)
-
-        cover['A5'] = "Median Circuity %"
-        cover['A5'].font = bold_font
-        cover['B5'] = f"{median_circuity-1:.0%}"
-
-        cover['A6'] = "Median Circuity (km)"
-        cover['A6'].font = bold_font
-        cover['B6'] = round(median_abs_circuity, 0)
-
-        cover['A7'] = "Missed Connections"
-        cover['A7'].font = bold_font
-        cover['B7'] = missed_connections
-
-        cover['A11'] = "Parameters"
-        cover['A11'].font = bold_font
-        cover['A12'] = f"CTs are considered valid between {min_connect_time*1440:.0f} and {max_connect_time*1440:.0f} minutes"
-        cover['A12'].font = italic_font
-        cover['A13'] = f"CTs are considered missed between {max_missed_time*1440:.0f} and {min_connect_time*1440-1:.0f} minutes"
-        cover['A13'].font = italic_font
-        cover['A14'] = f"Circuity considered valid if not exceeding {max_circuity}x & {max_abs_circuity}km vs. direct GC distance"
-        cover['A14'].font = italic_font
+
+def connection_statistics(df_connections, df_missed_connections, by_connection_days = False):
+    """
+    Computes the summary statistics shown on the cover page.
+
+    Counts and medians are taken over the output rows, connection times are given in minutes. With
+    by_connection_days, both are taken over connection-days instead: every connection counts, and
+    weighs in the medians, as many times as it has inbound operating days (like sweep_thresholds).
+
+    Parameters:
+    df_connections (pandas.DataFrame): Valid (logical) connections.
+    df_missed_connections (pandas.DataFrame): Missed connections.
+    by_connection_days (bool): Count and take medians over connection-days rather than rows.
+
+    Returns:
+    dict: Statistic name -> value.
+    """
+    if by_connection_days:
+        days = mask_day_count(days_to_mask(df_connections['Inbound Dep Day (UTC)']))
+        missed_days = mask_day_count(days_to_mask(df_missed_connections['Inbound Dep Day (UTC)']))
+    else:
+        days = np.ones(len(df_connections), dtype=np.int64)
+        missed_days = np.ones(len(df_missed_connections), dtype=np.int64)
+    return {
+        'Valid Connections': int(days.sum()),
+        'Median CT (Mins)': weighted_median(df_connections['Connection Time (min)'].to_numpy(dtype=float) * 1440, days),
+        'Median Circuity x': weighted_median(df_connections['Circuity x'].to_numpy(dtype=float), days),
+        'Median Circuity (km)': weighted_median(df_connections['Circuity (abs)'].to_numpy(dtype=float), days),
+        'Missed Connections': int(missed_days.sum()),
+    }
+
+
+def weighted_median(values, weights):
+    """
+    Returns the median of values, each repeated by its integer weight, without repeating them.
+
+    Parameters:
+    values (numpy.ndarray): The values, NaN values are ignored.
+    weights (numpy.ndarray): Non-negative integer weight of each value.
+
+    Returns:
+    float: The median, NaN if there is no weight.
+    """
+    present = ~np.isnan(values)
+    order = np.argsort(values[present], kind='stable')
+    values = values[present][order]
+    cum_weights = np.cumsum(np.asarray(weights)[present][order])
+    n = cum_weights[-1] if len(cum_weights) else 0
+    if n == 0:
+        return np.nan
+    # The k-th repeated value (0-based) is the first value whose cumulative weight exceeds k
+    low = values[np.searchsorted(cum_weights, (n - 1) // 2, side='right')]
+    high = values[np.searchsorted(cum_weights, n // 2, side='right')]
+    return float((low + high) / 2)
+
+
+def cover_page_cells(stats, min_connect_time, max_connect_time, max_missed_time, max_circuity, max_abs_circuity):
+    """
+    Lays out the cover page as (address, value, font) entries, shared by the regular and streaming writers.
+
+    Parameters:
+    stats (dict): Output of connection_statistics.
+    min_connect_time (float): Minimum connection time for a feasible connection.
+    max_connect_time (float): Maximum connection time for a feasible connection.
+    max_missed_time (float): Maximum time for a connection to be considered missed.
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity.
+
+    Returns:
+    list: (cell address, value, font or None) tuples, in row order.
+    """
+    return [
+        ('A1', "Schedule Connectivity Statistics", BOLD_FONT),
+        ('A3', "Valid Connections", BOLD_FONT),
+        ('B3', stats['Valid Connections'], None),
+        ('A4', "Median CT (Mins)", BOLD_FONT),
+        ('B4', round(stats['Median CT (Mins)'], 0), None),
+        ('A5', "Median Circuity %", BOLD_FONT),
+        ('B5', f"{stats['Median Circuity x']-1:.0%}", None),
+        ('A6', "Median Circuity (km)", BOLD_FONT),
+        ('B6', round(stats['Median Circuity (km)'], 0), None),
+        ('A7', "Missed Connections", BOLD_FONT),
+        ('B7', stats['Missed Connections'], None),
+        ('A11', "Parameters", BOLD_FONT),
+        ('A12', f"CTs are considered valid between {min_connect_time*1440:.0f} and {max_connect_time*1440:.0f} minutes", ITALIC_FONT),
+        ('A13', f"CTs are considered missed between {max_missed_time*1440:.0f} and {min_connect_time*1440-1:.0f} minutes", ITALIC_FONT),
+        ('A14', f"Circuity considered valid if not exceeding {max_circuity}x & {max_abs_circuity}km vs. direct GC distance", ITALIC_FONT),
+    ]
+
+
+def write_workbook_streaming(filename, cover_cells, sheets, chunk_size = 10000):
+    """
+    Writes the cover page and connection sheets with a write-only workbook, appending rows in chunks
+    so memory stays bounded regardless of the number of connections.
+
+    Parameters:
+    filename (str): Path of the workbook.
+    cover_cells (list): Output of cover_page_cells.
+    sheets (list): (sheet name, DataFrame) pairs, written in order after the cover page.
+    chunk_size (int): Number of DataFrame rows converted to Python values at a time.
+    """
+    wb = Workbook(write_only=True)
+
+    # Write-only sheets are filled top to bottom, so the cover cells are laid out row by row
+    cover = wb.create_sheet('Cover Page')
+    cover.sheet_view.showGridLines = False
+    rows = {}
+    for address, value, font in cover_cells:
+        cell = WriteOnlyCell(cover, value=value)
+        if font is not None:
+            cell.font = font
+        if address == 'A1':
+            cell.alignment = CENTER_ALIGNED
+        column, row = coordinate_from_string(address)
+        rows.setdefault(row, {})[column_index_from_string(column)] = cell
+    for row in range(1, max(rows) + 1):
+        cells = rows.get(row, {})
+        cover.append([cells.get(column) for column in range(1, max(cells, default=0) + 1)])
+    cover.merged_cells.add('A1:D1')
+
+    for sheet_name, df in sheets:
+        ws = wb.create_sheet(sheet_name)
+        header = []
+        for column in df.columns:
+            cell = WriteOnlyCell(ws, value=str(column))
+            cell.font = HEADER_FONT
+            header.append(cell)
+        ws.append(header)
+
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size].astype(object)
+            chunk = chunk.where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                ws.append(row)
+
+    wb.save(filename)
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd 
 from functools import lru_cache
 from utils.config import HUB
@@ -21,19 +22,20 @@ def add_day_eight(df, day_column='Dep Day'):
     return pd.concat([df, df_temp], ignore_index=True)
 
 
-def add_movement_flag(df, orig_column = 'Orig'):
+def add_movement_flag(df, orig_column = 'Orig', hub = HUB):
     """
     Adds a movement flag to the DataFrame based on the origin column.
-    If the origin is not equal to the global HUB, it's an arrival; otherwise, it's a departure.
+    If the origin is not equal to the hub, it's an arrival; otherwise, it's a departure.
 
     Parameters:
     df (pandas.DataFrame): The DataFrame to which the flag will be added.
     orig_column (str): The name of the column indicating the origin.
+    hub (str): The hub the movements are classified against, the global HUB by default.
 
     Returns:
     pandas.DataFrame: The DataFrame with the movement flag added.
     """
-    df['movement_flag'] = df.apply(lambda x: 'Arr' if x[orig_column] != HUB else 'Dep', axis=1)
+    df['movement_flag'] = np.where(df[orig_column] != hub, 'Arr', 'Dep')
     return df
 
 
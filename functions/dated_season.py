@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+from functions.build_connections import build_and_filter_connections
+from functions.connections_export import FrameAppender, FRAME_NAMES
+from classes.timezone_table import TimezoneTable
+from functions.day_mask import days_to_mask
+from functions.schedule_schema import DAY_DTYPE
+from functions.time_conversion import local_day_fractions
+from utils import config
+
+DAY = np.timedelta64(1, 'D')
+
+# Days of the core of each window: its arrivals, and the connections they make. The exploded
+# engine groups connections by weekday, so a window holds each weekday exactly once, and each
+# weekday of a window's arrivals stands for a single date
+WINDOW_DAYS = 7
+
+# Date columns of the dated connections, inserted in front of the connection columns
+DATE_COLUMNS = ['Inbound Dep Date (UTC)', 'Outbound Dep Date (UTC)']
+
+
+class SeasonLines:
+    """
+    The lines of a dated schedule, prepared once to be expanded to their operating dates window by window.
+    """
+
+    __slots__ = ('df', 'mask', 'effective', 'discontinue', 'start', 'end', 'timezones')
+
+    def __init__(self, df, season_start, season_end, eff_col = 'Eff', dis_col = 'Dis', day_column = 'Dep Day',
+                 airport_data = None):
+        """
+        Parameters:
+        df (pandas.DataFrame): The schedule, one row per line, with times as fractions of day and the movement flag.
+        season_start (date-like): First day of the season.
+        season_end (date-like): Last day of the season.
+        eff_col (str): Column holding the first date of each line, the season start where missing or if absent.
+        dis_col (str): Column holding the last date of each line, the season end where missing or if absent.
+        day_column (str): Column holding the operating weekdays of each line (1 = Monday).
+        airport_data (dict or AirportRegistry): Airport data with timezones, for the local times of
+            each flight-date. The shared airport registry if None.
+        """
+        self.start = pd.Timestamp(season_start).to_datetime64().astype('datetime64[D]')
+        self.end = pd.Timestamp(season_end).to_datetime64().astype('datetime64[D]')
+        if self.end < self.start:
+            raise ValueError(f"The season must end on or after its start, got {season_start} to {season_end}.")
+        self.df = df.reset_index(drop=True)
+        self.mask = days_to_mask(df[day_column])
+        self.effective = self._dates(eff_col, self.start)
+        self.discontinue = self._dates(dis_col, self.end)
+        # UTC offsets of the season's airports, DST changes included, found once for the season
+        airports = np.concatenate([self.df['Orig'].to_numpy(dtype=object), self.df['Dest'].to_numpy(dtype=object)])
+        self.timezones = TimezoneTable.build(airports, self.start, self.end, airport_data)
+
+    def _dates(self, col, default):
+        # Line dates clipped to the season, the season bound where missing
+        if col not in self.df.columns:
+            return np.full(len(self.df), default)
+        dates = pd.to_datetime(self.df[col]).to_numpy().astype('datetime64[D]')
+        dates = np.where(np.isnat(dates), default, dates)
+        return np.clip(dates, self.start, self.end)
+
+    def days(self):
+        """
+        Returns the number of days of the season.
+
+        Returns:
+        int: Days from the first to the last day, both included.
+        """
+        return int((self.end - self.start) / DAY) + 1
+
+    def expand(self, first_date, last_date, origin, rows = None):
+        """
+        Expands lines to their operating dates between two dates.
+
+        Parameters:
+        first_date (numpy.datetime64): First date.
+        last_date (numpy.datetime64): Last date (included).
+        origin (numpy.datetime64): Date of day 1 of the UTC floats.
+        rows (numpy.ndarray): Boolean mask of the lines to expand, all if None.
+
+        Returns:
+        pandas.DataFrame: One row per flight-date with 'Date', 'Dep Day' (weekday, 1 = Monday),
+        'UTC Dep Float' and 'UTC Arr Float' (days from origin, day 1 starting at origin), and the
+        local times 'DLcl' and 'ALcl' with the UTC offsets in effect on that date.
+        """
+        lines, dates = [], []
+        for date in np.arange(max(first_date, self.start), min(last_date, self.end) + DAY, DAY):
+            weekday = (date.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+            operating = (self.mask >> weekday & 1).astype(bool) & (self.effective <= date) & (date <= self.discontinue)
+            if rows is not None:
+                operating &= rows
+            lines.append(np.flatnonzero(operating))
+            dates.append(np.full(len(lines[-1]), date))
+        lines = np.concatenate(lines) if lines else np.zeros(0, dtype=np.int64)
+        dates = np.concatenate(dates) if dates else np.zeros(0, dtype='datetime64[D]')
+
+        df = self.df.take(lines).reset_index(drop=True)
+        df['Date'] = dates
+        df['Dep Day'] = ((dates.astype(np.int64) + 3) % 7 + 1).astype(DAY_DTYPE)
+        day = (dates - origin) / DAY + 1
+        df['UTC Dep Float'] = day + df['STD'].to_numpy(dtype=float)
+        df['UTC Arr Float'] = df['UTC Dep Float'] + df['Blk Hrs'].to_numpy(dtype=float)
+        df['DLcl'] = local_day_fractions(self.timezones, df['Orig'], origin, df['UTC Dep Float'].to_numpy() - 1)
+        df['ALcl'] = local_day_fractions(self.timezones, df['Dest'], origin, df['UTC Arr Float'].to_numpy() - 1)
+        return df
+
+
+def iter_season_windows(
+    lines,
+    max_missed_time = config.MAX_MISSED_CONNECT_TIME,
+    max_connect_time = config.MAX_CONNECT_TIME
+    ):
+    """
+    Cuts a dated season into windows of WINDOW_DAYS (one week), for the connection engine.
+
+    A window holds the arrivals departing on its own days, and the departures they can connect
+    to: those from the day before (missed connections) to the day the last of its arrivals plus
+    the maximum connection time reaches. Consecutive windows overlap on these departures only,
+    so every connection belongs to exactly one window, the one of its arriving flight's date.
+
+    Parameters:
+    lines (SeasonLines): The season's lines.
+    max_missed_time (float): Maximum time for a connection to be considered missed (fraction of day).
+    max_connect_time (float): Maximum connection time (fraction of day).
+
+    Yields:
+    tuple: (first date of the window, DataFrame of its flight-dates, see SeasonLines.expand).
+    """
+    lookback = int(np.ceil(max(-min(max_missed_time, 0), 0)))
+    block = lines.df['Blk Hrs'].to_numpy(dtype=float)
+    longest = np.nanmax(block) if len(block) and not np.isnan(block).all() else 0
+    lookahead = int(np.ceil(longest + max(max_connect_time, 0)))
+    arriving = (lines.df['movement_flag'] == 'Arr').to_numpy()
+
+    for first in np.arange(lines.start, lines.end + DAY, WINDOW_DAYS * DAY):
+        last = first + (WINDOW_DAYS - 1) * DAY
+        arrivals = lines.expand(first, last, first, arriving)
+        departures = lines.expand(first - lookback * DAY, last + lookahead * DAY, first, ~arriving)
+        yield first, pd.concat([arrivals, departures], ignore_index=True)
+
+
+def connection_dates(df, window_start):
+    """
+    Splits a window's connection rows into one row per connection-date, with the dates of both flights.
+
+    Within a window, each weekday of the arriving flights stands for one date, and the departing
+    flight leaves at most a day before (missed connections) or a few days after it. Character i of
+    the inbound day string and character i of the outbound day string are the same connection.
+
+    Parameters:
+    df (pandas.DataFrame): Connections of one window, from build_and_filter_connections.
+    window_start (numpy.datetime64): First date of the window.
+
+    Returns:
+    pandas.DataFrame: One row per connection-date, with DATE_COLUMNS in front and single weekdays
+    in the day columns.
+    """
+    inbound = df['Inbound Dep Day (UTC)'].to_numpy(dtype=str)
+    outbound = df['Outbound Dep Day (UTC)'].to_numpy(dtype=str)
+    counts = np.char.str_len(inbound)
+    rows = np.repeat(np.arange(len(df)), counts)
+    in_day = np.array(list(''.join(inbound)), dtype=np.int64)
+    out_day = np.array(list(''.join(outbound)), dtype=np.int64)
+
+    # Weekday of the window's first date (1 = Monday), 1970-01-01 was a Thursday
+    first_weekday = (window_start.astype('datetime64[D]').astype(np.int64) + 3) % 7 + 1
+    in_date = window_start.astype('datetime64[D]') + (in_day - first_weekday) % 7 * DAY
+    out_date = in_date + ((out_day - in_day + 1) % 7 - 1) * DAY
+
+    dated = df.take(rows).reset_index(drop=True)
+    dated['Inbound Dep Day (UTC)'] = in_day.astype(str)
+    dated['Outbound Dep Day (UTC)'] = out_day.astype(str)
+    dated.insert(0, DATE_COLUMNS[0], in_date.astype('datetime64[ns]'))
+    dated.insert(1, DATE_COLUMNS[1], out_date.astype('datetime64[ns]'))
+    return dated
+
+
+def build_connections_dated(
+    df,
+    season_start,
+    season_end,
+    output_path = None,
+    output_format = 'parquet',
+    on_window = None,
+    max_circuity = config.MAX_CIRCUITY,
+    max_abs_circuity = config.MAX_ABS_CIRCUITY,
+    max_missed_time = config.MAX_MISSED_CONNECT_TIME,
+    min_connect_time = config.MIN_CONNECT_TIME,
+    max_connect_time = config.MAX_CONNECT_TIME,
+    airport_data = None,
+    eff_col = 'Eff',
+    dis_col = 'Dis'
+    ):
+    """
+    Builds the connections of a dated season window by window.
+
+    Lines are expanded to their actual dates between their effective and discontinue dates, and
+    the season is streamed through the connection engine in overlapping windows (see
+    iter_season_windows), so peak memory is about one window's whatever the length of the
+    season. Each window's connections are written to the output files, and/or handed to on_window,
+    as soon as they are built, one row per connection-date with the dates of the inbound and
+    outbound flights (see connection_dates). Local times are recomputed for every flight-date,
+    so they follow DST changes within the season. Connection times are compared in whole seconds,
+    so the results do not depend on where the windows start.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, one row per line, with the movement flag and times as fractions of day.
+    season_start (date-like): First day of the season.
+    season_end (date-like): Last day of the season.
+    output_path (str): Output path without extension, files <output_path>_valid.<ext>, ... are written if given.
+    output_format (str): 'parquet' or 'csv'.
+    on_window (callable): Called as on_window(window_start, logical, missed, illogical) after each window.
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity.
+    max_missed_time (float): Maximum time for a connection to be considered missed.
+    min_connect_time (float): Minimum connection time for a feasible connection.
+    max_connect_time (float): Maximum connection time for a feasible connection.
+    airport_data (dict or AirportRegistry): Airport data keyed by code, used for circuity and timezones. The shared airport registry if None.
+    eff_col (str): Column holding the first date of each line.
+    dis_col (str): Column holding the last date of each line.
+
+    Returns:
+    pandas.DataFrame: One row per window with 'Window start', 'Flights' and the number of logical,
+    missed and illogical connection-dates.
+    """
+    lines = SeasonLines(df, season_start, season_end, eff_col, dis_col, airport_data=airport_data)
+    appenders = [FrameAppender(f'{output_path}_{name}.{output_format}', output_format) for name in FRAME_NAMES] if output_path else []
+
+    summary = []
+    try:
+        for window_start, df_window in iter_season_windows(lines, max_missed_time, max_connect_time):
+            results = build_and_filter_connections(df_window, max_circuity, max_abs_circuity, max_missed_time,
+                                                   min_connect_time, max_connect_time, airport_data, snap_seconds=True)
+            results = [connection_dates(frame, window_start) for frame in results]
+            for appender, frame in zip(appenders, results):
+                appender.append(frame)
+            if on_window is not None:
+                on_window(pd.Timestamp(window_start), *results)
+            summary.append((pd.Timestamp(window_start), len(df_window), *map(len, results)))
+            del df_window, results
+    finally:
+        for appender in appenders:
+            appender.close()
+
+    return pd.DataFrame(summary, columns=['Window start', 'Flights', 'Logical', 'Missed', 'Illogical'])
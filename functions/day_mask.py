@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+# Bit (d - 1) is set when the flight operates on day d, e.g. '1.3.5.7' -> 0b1010101
+ALL_DAYS = 0b1111111
+
+# Day string for every possible mask, e.g. MASK_TO_DAYS[0b0000101] == '13'
+MASK_TO_DAYS = np.array(
+    [''.join(str(day) for day in range(1, 8) if mask >> (day - 1) & 1) for mask in range(ALL_DAYS + 1)],
+    dtype=object
+)
+
+# Number of operating days for every possible mask
+MASK_DAY_COUNT = np.array([bin(mask).count('1') for mask in range(ALL_DAYS + 1)], dtype=np.int64)
+
+
+def days_to_mask(column):
+    """
+    Converts a frequency column (e.g. '12.456.', '…4…' or 1234567) into 7-bit operating-day masks.
+
+    Parameters:
+    column (pandas.Series): The Series of frequency strings or numbers.
+
+    Returns:
+    numpy.ndarray: An integer mask per row, bit (d - 1) set when day d operates.
+    """
+    column = column.astype(str)
+    mask = np.zeros(len(column), dtype=np.int64)
+    for day in range(1, 8):
+        mask |= column.str.contains(str(day), regex=False).to_numpy(dtype=bool).astype(np.int64) << (day - 1)
+    return mask
+
+
+def mask_to_days(mask):
+    """
+    Formats 7-bit operating-day masks as day strings ('1357').
+
+    Parameters:
+    mask (array-like): Integer masks.
+
+    Returns:
+    numpy.ndarray: The day string for each mask.
+    """
+    return MASK_TO_DAYS[np.asarray(mask, dtype=np.int64) & ALL_DAYS]
+
+
+def mask_day_count(mask):
+    """
+    Counts the operating days in 7-bit masks.
+
+    Parameters:
+    mask (array-like): Integer masks.
+
+    Returns:
+    numpy.ndarray: Number of days set in each mask.
+    """
+    return MASK_DAY_COUNT[np.asarray(mask, dtype=np.int64) & ALL_DAYS]
+
+
+def rotate_mask(mask, shift):
+    """
+    Moves every operating day of a mask forward by `shift` days, wrapping around the week.
+
+    Parameters:
+    mask (array-like): Integer masks.
+    shift (int or array-like): Number of days to move forward (negative moves back).
+
+    Returns:
+    numpy.ndarray: The rotated masks.
+    """
+    mask = np.asarray(mask, dtype=np.int64)
+    shift = np.mod(shift, 7)
+    return ((mask << shift) | (mask >> (7 - shift))) & ALL_DAYS
+
+
+def mask_to_columns(mask, prefix):
+    """
+    Expands masks into one 0/1 column per day, so they can be OR-ed by a vectorized groupby max.
+
+    Parameters:
+    mask (array-like): Integer masks.
+    prefix (str): Prefix of the generated column names.
+
+    Returns:
+    pandas.DataFrame: Seven uint8 columns named prefix + day.
+    """
+    mask = np.asarray(mask, dtype=np.int64)
+    return pd.DataFrame({f'{prefix}{day}': ((mask >> (day - 1)) & 1).astype(np.uint8) for day in range(1, 8)})
+
+
+def columns_to_mask(df, prefix):
+    """
+    Rebuilds integer masks from the per-day columns created by mask_to_columns.
+
+    Parameters:
+    df (pandas.DataFrame): DataFrame holding the per-day columns.
+    prefix (str): Prefix of the per-day column names.
+
+    Returns:
+    numpy.ndarray: The integer masks.
+    """
+    mask = np.zeros(len(df), dtype=np.int64)
+    for day in range(1, 8):
+        mask |= df[f'{prefix}{day}'].to_numpy(dtype=np.int64) << (day - 1)
+    return mask
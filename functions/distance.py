@@ -16,6 +16,30 @@ def great_circle_distance(airport1, airport2, airport_data):
     
     '''Returns the great circle distance between two airports in km'''
     
+    if hasattr(airport_data, 'coordinates'):
+        (lat1, lat2), (lon1, lon2) = airport_data.coordinates([airport1, airport2])
+        return haversine(lat1, lon1, lat2, lon2)
     lat1, lon1 = airport_data[airport1]['Latitude'], airport_data[airport1]['Longitude']
     lat2, lon2 = airport_data[airport2]['Latitude'], airport_data[airport2]['Longitude']
     return haversine(lat1, lon1, lat2, lon2)
+
+def distance_matrix(lats, lons, dtype = np.float64):
+    
+    '''Returns the N x N great circle distance matrix in km between the given coordinates, built with a single haversine call'''
+    
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    return haversine(lats[:, None], lons[:, None], lats[None, :], lons[None, :]).astype(dtype, copy=False)
+
+def airport_coordinates(airports, airport_data):
+    
+    '''Returns latitude and longitude arrays for a sequence of airport codes, from a dict or an AirportRegistry'''
+    
+    if hasattr(airport_data, 'coordinates'):
+        return airport_data.coordinates(airports)
+    missing = [airport for airport in airports if airport not in airport_data]
+    if missing:
+        raise KeyError(f"Airports not found in airport data: {missing}")
+    lats = np.array([airport_data[airport]['Latitude'] for airport in airports], dtype=np.float64)
+    lons = np.array([airport_data[airport]['Longitude'] for airport in airports], dtype=np.float64)
+    return lats, lons
@@ -1,4 +1,5 @@
 import pandas as pd
+from functions.schedule_schema import downcast_integers, DAY_DTYPE
 
 def explode_schedule(df, col_name = 'Dep Day'):
     """
@@ -20,6 +21,9 @@ def explode_schedule(df, col_name = 'Dep Day'):
     # Explode the DataFrame on 'Dep Day' to create separate rows for each day
     df_exploded = df.explode(col_name)
 
+    # Small integer days, unless a line without any operating day left a missing value
+    df_exploded[col_name] = downcast_integers(df_exploded[col_name], DAY_DTYPE)
+
     return df_exploded
 
 # if __name__ == '__main__': 
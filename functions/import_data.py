@@ -1,16 +1,24 @@
 
 import pandas as pd
+from .cache import cached_frame
+from .schedule_schema import apply_schedule_schema, SCHEDULE_SCHEMA
+from utils.config import AIRPORT_DATA_PATH
 
 def import_airport_data (): 
     
     """Imports airport data from pkl file and returns a dictionary dataframe"""
-    airport_data = pd.read_pickle("data/airport_data.pkl")
+    airport_data = pd.read_pickle(AIRPORT_DATA_PATH)
     return airport_data
 
 
-def import_schedule(path_to_schedule, sheet_name=None):
+def import_schedule(path_to_schedule, sheet_name=None, use_cache=False):
     
-    """Imports schedule data from excel file or csv file and returns a dataframe"""
+    """Imports schedule data from excel file or csv file and returns a dataframe with the compact
+    dtypes of SCHEDULE_SCHEMA. With use_cache, the parsed frame is reused until the file content changes"""
+    
+    if use_cache:
+        return cached_frame('schedule', path_to_schedule, (sheet_name, SCHEDULE_SCHEMA),
+                            lambda: import_schedule(path_to_schedule, sheet_name=sheet_name))
     
     if path_to_schedule.endswith('.csv'):
         schedule_data = pd.read_csv(path_to_schedule)
@@ -21,5 +29,5 @@ def import_schedule(path_to_schedule, sheet_name=None):
             raise ValueError(f"Sheet '{sheet_name}' does not exist in the Excel file.")
     else:
         raise ValueError("Invalid file format. Only CSV and Excel files are supported.")
-    return schedule_data
+    return apply_schedule_schema(schedule_data)
 
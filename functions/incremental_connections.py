@@ -0,0 +1,185 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from functions.bitmask_connections import (build_bitmask_candidates, classify_and_group_connections,
+                                           GROUP_COLUMNS, CANDIDATE_GROUP_COLUMNS)
+from functions.cache import cache_key
+from utils import config
+
+# Columns of the flight key, a schedule must have them to be diffed line by line
+LINE_KEY_COLUMNS = ['Aln', 'Flt', 'Orig', 'Dest', 'Dep Day']
+
+
+def add_line_ids(df, key_columns = LINE_KEY_COLUMNS):
+    """
+    Adds a 'Line id' column identifying each schedule line by its content.
+
+    The id hashes every column of the line (so any edit to a line changes its id) plus the
+    occurrence number among identical lines, so exact duplicates stay distinct.
+
+    Parameters:
+    df (pandas.DataFrame): The pre-processed schedule, one row per schedule line.
+    key_columns (list): Columns of the flight key, which must be present.
+
+    Returns:
+    pandas.DataFrame: A copy of the DataFrame with the 'Line id' column.
+    """
+    missing = [col for col in key_columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"Schedule is missing flight key columns: {missing}")
+
+    df = df.drop(columns='Line id', errors='ignore').reset_index(drop=True)
+    content = pd.util.hash_pandas_object(df.astype(str), index=False)
+    occurrence = content.groupby(content).cumcount()
+    df['Line id'] = pd.util.hash_pandas_object(pd.DataFrame({'content': content, 'occurrence': occurrence}), index=False).to_numpy()
+    return df
+
+
+def _group_hash(df, columns):
+    # One hash per row over the columns that identify an output row, independent of column names
+    return pd.util.hash_pandas_object(df[columns].set_axis(GROUP_COLUMNS, axis=1).astype(str), index=False).to_numpy()
+
+
+def _sort_like_groupby(df):
+    # groupby(GROUP_COLUMNS) returns its groups sorted by key, patched results are put back in that order
+    return df.sort_values(GROUP_COLUMNS, kind='stable').reset_index(drop=True)
+
+
+def build_connections_incremental(
+    df,
+    state = None,
+    max_circuity = config.MAX_CIRCUITY,
+    max_abs_circuity = config.MAX_ABS_CIRCUITY,
+    max_missed_time = config.MAX_MISSED_CONNECT_TIME,
+    min_connect_time = config.MIN_CONNECT_TIME,
+    max_connect_time = config.MAX_CONNECT_TIME,
+    airport_data = None,
+    day_column = 'Dep Day'
+    ):
+    """
+    Builds connections like build_and_filter_connections_bitmask, reusing the state of a previous run.
+
+    The schedule is diffed against the previous run line by line. Candidate connections involving
+    removed or changed lines are dropped, candidates involving added or changed lines are built, and
+    only the output rows those candidates belong to are regrouped. Everything else is carried over
+    from the previous result sets, which gives the same frames as a full rebuild.
+
+    A full build is done when there is no state or the thresholds differ from the previous run.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, one row per schedule line, with the movement flag and time
+        columns converted to fractions of day.
+    state (dict): State returned by the previous call, or None.
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity.
+    max_missed_time (float): Maximum time for a connection to be considered missed.
+    min_connect_time (float): Minimum connection time for a feasible connection.
+    max_connect_time (float): Maximum connection time for a feasible connection.
+    airport_data (dict or AirportRegistry): Airport data keyed by code, used for circuity. The shared airport registry if None.
+    day_column (str): Column holding the operating days of each line.
+
+    Returns:
+    tuple: ((logical, missed, illogical) DataFrames, new state).
+    """
+    thresholds = (max_circuity, max_abs_circuity, max_missed_time, min_connect_time, max_connect_time)
+    window_lower = min(max_missed_time, min_connect_time)
+    window_upper = max(max_connect_time, min_connect_time)
+
+    df = add_line_ids(df)
+    params = (thresholds, day_column)
+
+    if state is None or state['params'] != params:
+        candidates = build_bitmask_candidates(df, window_lower, window_upper, airport_data, day_column)
+        candidates['Group hash'] = _group_hash(candidates, CANDIDATE_GROUP_COLUMNS)
+        results = classify_and_group_connections(candidates, *thresholds)
+        print (f'Full build: {len(df)} schedule lines')
+        return results, {'params': params, 'line_ids': df['Line id'].to_numpy(), 'candidates': candidates, 'results': results}
+
+    # Diff the schedule lines against the previous run
+    old_ids = state['line_ids']
+    new_ids = df['Line id'].to_numpy()
+    removed_ids = np.setdiff1d(old_ids, new_ids)
+    added = np.isin(new_ids, old_ids, invert=True)
+    print (f'Schedule lines added or changed: {added.sum()}, removed or changed: {len(removed_ids)}')
+
+    # Drop candidates built on removed (or previous versions of changed) lines
+    candidates = state['candidates']
+    stale = candidates['Line id_arr'].isin(removed_ids).to_numpy() | candidates['Line id_dep'].isin(removed_ids).to_numpy()
+    affected_groups = candidates.loc[stale, 'Group hash'].to_numpy()
+    candidates = candidates[~stale]
+
+    # Candidates involving added lines: added arrivals x all departures, unchanged arrivals x added departures
+    is_arr = (df['movement_flag'] == 'Arr').to_numpy()
+    new_candidates = []
+    for rows in [(is_arr & added) | ~is_arr, (is_arr & ~added) | (~is_arr & added)]:
+        subset = df[rows]
+        if (subset['movement_flag'] == 'Arr').any() and (subset['movement_flag'] == 'Dep').any():
+            new_candidates.append(build_bitmask_candidates(subset, window_lower, window_upper, airport_data, day_column))
+    if new_candidates:
+        new_candidates = pd.concat(new_candidates, ignore_index=True)
+        new_candidates['Group hash'] = _group_hash(new_candidates, CANDIDATE_GROUP_COLUMNS)
+        affected_groups = np.concatenate([affected_groups, new_candidates['Group hash'].to_numpy()])
+        candidates = pd.concat([candidates, new_candidates], ignore_index=True)
+    affected_groups = np.unique(affected_groups)
+
+    # Regroup only the output rows touched by the change, keep all other rows as they were
+    regrouped = classify_and_group_connections(candidates[candidates['Group hash'].isin(affected_groups)], *thresholds)
+    results = []
+    for previous, patch in zip(state['results'], regrouped):
+        kept = previous[~np.isin(_group_hash(previous, GROUP_COLUMNS), affected_groups)]
+        # Empty frames are left out so they cannot change the dtypes of the non-empty one
+        parts = [part for part in (kept, patch) if len(part)] or [previous.iloc[:0]]
+        results.append(_sort_like_groupby(pd.concat(parts, ignore_index=True)))
+    results = tuple(results)
+
+    return results, {'params': params, 'line_ids': new_ids, 'candidates': candidates.reset_index(drop=True), 'results': results}
+
+
+def incremental_state_path(source_path, sheet_name, state_dir = config.STATE_DIR):
+    """
+    Returns where the incremental state of a schedule file and sheet is kept.
+
+    Parameters:
+    source_path (str): Path of the schedule file.
+    sheet_name (str): Sheet of the schedule.
+    state_dir (str): Directory holding the incremental states.
+
+    Returns:
+    str: Path of the state file.
+    """
+    return os.path.join(state_dir, f'incremental-{cache_key(os.path.abspath(source_path), sheet_name)}.pkl')
+
+
+def load_incremental_state(path):
+    """
+    Loads the state saved by save_incremental_state, or returns None if there is none or it is unreadable.
+
+    Parameters:
+    path (str): Path of the state file.
+
+    Returns:
+    dict or None: The state.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def save_incremental_state(path, state):
+    """
+    Saves the state of an incremental build for the next run.
+
+    Parameters:
+    path (str): Path of the state file.
+    state (dict): State returned by build_connections_incremental.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+from classes.airport import get_airport_registry
+from functions.connections_export import FrameAppender
+from functions.distance import airport_coordinates, distance_matrix
+from functions.rotation_builder import dated_legs, WEEK_MINUTES
+from utils import config
+
+# Output rows per chunk, memory stays bounded by this whatever the total number of itineraries
+CHUNK_ROWS = 500000
+
+
+class DepartureIndex:
+    """
+    Departures sorted by (station, time), answering "departures from station s between t + lower
+    and t + upper" with two binary searches per query.
+
+    The week is cyclic: departures early in the week are also indexed one week later, so windows
+    running past the end of the week find them.
+    """
+
+    __slots__ = ('keys', 'legs', 'times', 'span')
+
+    def __init__(self, station, time, horizon):
+        """
+        Parameters:
+        station (numpy.ndarray): Integer station code of each departure.
+        time (numpy.ndarray): Departure time in whole minutes from the start of the week, in [0, WEEK_MINUTES).
+        horizon (int): Largest upper bound that will be queried, in minutes.
+        """
+        wrap = np.flatnonzero(time < horizon)
+        legs = np.concatenate([np.arange(len(time)), wrap])
+        times = np.concatenate([time, time[wrap] + WEEK_MINUTES]).astype(np.int64)
+        stations = np.concatenate([station, station[wrap]]).astype(np.int64)
+
+        # Each station gets its own segment of the number line, wider than any time
+        self.span = 2 * WEEK_MINUTES + horizon + 1
+        keys = stations * self.span + times
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.legs, self.times = keys[order], legs[order], times[order]
+
+    def ranges(self, station, time, lower, upper):
+        """
+        Returns the [start, stop) positions of the matching departures of every query.
+
+        Parameters:
+        station (numpy.ndarray): Station code of each query.
+        time (numpy.ndarray): Arrival time of each query in minutes, reduced modulo the week.
+        lower (int): Lower bound of departure - arrival, in minutes (not negative).
+        upper (int): Upper bound of departure - arrival, in minutes.
+
+        Returns:
+        tuple: Two integer arrays, start and stop positions.
+        """
+        key = station.astype(np.int64) * self.span + time
+        return np.searchsorted(self.keys, key + lower, side='left'), np.searchsorted(self.keys, key + upper, side='right')
+
+
+def _expand(start, stop):
+    # Flat (query, position) pairs of [start, stop) ranges
+    counts = stop - start
+    query = np.repeat(np.arange(len(start)), counts)
+    position = np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    return query, position
+
+
+def _batches(start, stop, max_rows):
+    # Slices of consecutive queries whose total number of matches stays around max_rows
+    total = np.cumsum(stop - start)
+    first = 0
+    while first < len(start):
+        done = total[first - 1] if first else 0
+        last = max(int(np.searchsorted(total, done + max_rows, side='right')), first + 1)
+        yield slice(first, last)
+        first = last
+
+
+def iter_two_stop_itineraries(
+    df,
+    airport_data = None,
+    min_connect_time = config.MIN_CONNECT_TIME,
+    max_connect_time = config.MAX_CONNECT_TIME,
+    max_circuity = config.MAX_CIRCUITY,
+    max_abs_circuity = config.MAX_ABS_CIRCUITY,
+    max_elapsed_time = None,
+    chunk_rows = CHUNK_ROWS,
+    day_column = 'Dep Day'
+    ):
+    """
+    Enumerates two-stop itineraries A -> H1 -> H2 -> B over the whole schedule, in chunks.
+
+    Both connections must have a connection time inside [min_connect_time, max_connect_time] and
+    the itinerary must be logical by the circuity rules of single connections (circuity within
+    max_circuity, or the extra distance within max_abs_circuity). Itineraries visiting an airport
+    twice are left out.
+
+    Departures are indexed by station and time once, every connection is a binary search in that
+    index. After the second leg, partial itineraries that cannot become logical are dropped: the
+    extra distance can only grow with the third leg, and the circuity is bounded using the longest
+    leg leaving H2. Work is done in batches sized by the number of matches, so memory stays bounded
+    by chunk_rows however many itineraries there are.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, one row per schedule line (see rotation_builder.dated_legs).
+    airport_data (dict or AirportRegistry): Airport data keyed by code. The shared airport registry if None.
+    min_connect_time (float): Minimum connection time (fraction of day).
+    max_connect_time (float): Maximum connection time (fraction of day).
+    max_circuity (float): Maximum allowed circuity.
+    max_abs_circuity (float): Maximum allowed absolute circuity (km).
+    max_elapsed_time (float): Maximum time from first departure to last arrival (fraction of day), None for no limit.
+    chunk_rows (int): Target number of candidate rows handled, and at most yielded, at a time.
+    day_column (str): Column holding the operating days of each line.
+
+    Yields:
+    pandas.DataFrame: Itineraries, with the airports, flight numbers (when the schedule has them),
+    the first leg's day, departure and arrival in minutes from the start of that week, both
+    connection times, elapsed time, circuity and the positions of the three legs in the dated legs.
+    """
+    if airport_data is None:
+        airport_data = get_airport_registry()
+    min_ct = int(round(min_connect_time * 1440))
+    max_ct = int(round(max_connect_time * 1440))
+    if min_ct < 0:
+        raise ValueError("min_connect_time must not be negative for itineraries.")
+    max_elapsed = np.inf if max_elapsed_time is None else max_elapsed_time * 1440
+
+    legs = dated_legs(df, day_column=day_column)
+    codes, stations = pd.factorize(np.concatenate([legs['Orig'].to_numpy(dtype=object), legs['Dest'].to_numpy(dtype=object)]))
+    orig, dest = codes[:len(legs)], codes[len(legs):]
+    dep = legs['Dep (min)'].to_numpy(dtype=np.int64)
+    arr = legs['Arr (min)'].to_numpy(dtype=np.int64)
+    flights = legs['Flt'].to_numpy(dtype=object) if 'Flt' in legs.columns else None
+
+    lats, lons = airport_coordinates(list(stations), airport_data)
+    distances = distance_matrix(lats, lons)
+    leg_distance = distances[orig, dest]
+
+    # Longest leg leaving each station, bounds how much a third leg can lower the circuity
+    longest_from = np.zeros(len(stations))
+    np.maximum.at(longest_from, orig, leg_distance)
+
+    index = DepartureIndex(orig, dep, max_ct)
+
+    def connect(station, time, rows):
+        # Departures within the connection window of arrivals at (station, time), batched by number of matches
+        start, stop = index.ranges(station, np.mod(time, WEEK_MINUTES), min_ct, max_ct)
+        for batch in _batches(start, stop, rows):
+            query, position = _expand(start[batch], stop[batch])
+            query += batch.start
+            # Departure time on the arrival's timeline
+            dep_time = index.times[position] + (time[query] - np.mod(time[query], WEEK_MINUTES))
+            yield query, index.legs[position], dep_time
+
+    first_legs = np.arange(len(legs))
+    for first_query, second, dep2 in connect(dest, arr, chunk_rows):
+        first = first_legs[first_query]
+        a, h1, h2 = orig[first], dest[first], dest[second]
+
+        # No airport visited twice, elapsed time so far within the limit
+        arr2 = dep2 + (arr[second] - dep[second])
+        keep = (h2 != a) & (arr2 - dep[first] + min_ct <= max_elapsed)
+
+        # Extra distance is at least the detour to H2 whatever B is, and the circuity is at
+        # least what it would be with the longest leg leaving H2
+        partial = leg_distance[first] + leg_distance[second]
+        detour = partial - distances[a, h2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            best_circuity = (partial + longest_from[h2]) / (distances[a, h2] + longest_from[h2])
+        keep &= (detour <= max_abs_circuity) | (best_circuity <= max_circuity)
+
+        first, second, dep2, arr2, partial = first[keep], second[keep], dep2[keep], arr2[keep], partial[keep]
+        a, h1, h2 = a[keep], h1[keep], h2[keep]
+
+        for pair, third, dep3 in connect(h2, arr2, chunk_rows):
+            b = dest[third]
+            arr3 = dep3 + (arr[third] - dep[third])
+            elapsed = arr3 - dep[first[pair]]
+            total = partial[pair] + leg_distance[third]
+            direct = distances[a[pair], b]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                circuity = total / direct
+            abs_circuity = total - direct
+
+            valid = ((b != a[pair]) & (b != h1[pair]) & (elapsed <= max_elapsed) &
+                     ((circuity <= max_circuity) | (abs_circuity <= max_abs_circuity)))
+            if not valid.any():
+                continue
+            pair, third, dep3, arr3 = pair[valid], third[valid], dep3[valid], arr3[valid]
+            leg1, leg2 = first[pair], second[pair]
+
+            chunk = {
+                'Orig': stations[a[pair]],
+                'Via 1': stations[h1[pair]],
+                'Via 2': stations[h2[pair]],
+                'Dest': stations[dest[third]],
+            }
+            if flights is not None:
+                chunk.update({'Flt 1': flights[leg1], 'Flt 2': flights[leg2], 'Flt 3': flights[third]})
+            chunk.update({
+                'Day': legs['Day'].to_numpy()[leg1],
+                'Dep (min)': dep[leg1],
+                'Arr (min)': arr3,
+                'CT 1 (min)': dep2[pair] - arr[leg1],
+                'CT 2 (min)': dep3 - arr2[pair],
+                'Elapsed (min)': elapsed[valid],
+                'Circuity x': circuity[valid],
+                'Circuity (abs)': abs_circuity[valid],
+                'Leg 1': leg1,
+                'Leg 2': leg2,
+                'Leg 3': third,
+            })
+            yield pd.DataFrame(chunk)
+
+
+def write_itineraries(chunks, output_path, output_format = 'parquet'):
+    """
+    Writes itinerary chunks to one file as they come, without holding them all in memory.
+
+    Parameters:
+    chunks (iterable): DataFrames with the same columns, e.g. from iter_two_stop_itineraries.
+    output_path (str): Output path without extension.
+    output_format (str): 'parquet' (needs pyarrow) or 'csv'.
+
+    Returns:
+    tuple: (path written, number of itineraries).
+    """
+    with FrameAppender(f'{output_path}.{output_format}', output_format) as appender:
+        for chunk in chunks:
+            appender.append(chunk)
+    return appender.path, appender.rows
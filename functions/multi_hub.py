@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from functions.build_connections import build_and_filter_connections
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.data_enrich import add_movement_flag
+from classes.airport import get_airport_registry
+
+# Per-process copy of the data shared by every hub task, set once by _init_worker
+_shared = {}
+
+
+def _init_worker(df, airport_data, engine, kwargs):
+    # Runs once per worker process: the schedule and airport data are sent (or inherited on fork)
+    # a single time, and each task only carries a hub code and its row positions
+    _shared['df'] = df
+    _shared['airport_data'] = airport_data
+    _shared['engine'] = engine
+    _shared['kwargs'] = kwargs
+
+
+def _build_hub(task):
+    hub, positions = task
+    df_hub = _shared['df'].iloc[positions].copy()
+    df_hub = add_movement_flag(df_hub, hub=hub)
+
+    build = build_and_filter_connections_bitmask if _shared['engine'] == 'bitmask' else build_and_filter_connections
+    return hub, build(df_hub, airport_data=_shared['airport_data'], **_shared['kwargs'])
+
+
+def partition_by_station(df, hubs, orig_column = 'Orig', dest_column = 'Dest'):
+    """
+    Finds, for each hub, the rows of the schedule that depart from or arrive at it.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule.
+    hubs (list): Hub codes.
+    orig_column (str): The name of the column indicating the origin.
+    dest_column (str): The name of the column indicating the destination.
+
+    Returns:
+    dict: Hub code -> numpy array of row positions.
+    """
+    orig = df[orig_column].to_numpy()
+    dest = df[dest_column].to_numpy()
+    return {hub: np.flatnonzero((orig == hub) | (dest == hub)) for hub in hubs}
+
+
+def build_and_filter_connections_multi_hub(df, hubs, engine = 'exploded', processes = None, airport_data = None, **kwargs):
+    """
+    Builds and filters connections at several hubs, one worker process per hub.
+
+    The schedule is partitioned by station, every hub's flights are classified as arrivals or
+    departures against that hub, and the connections are built by the selected engine in a process
+    pool. The schedule and airport data are shared with each worker once, not pickled per task.
+
+    Parameters:
+    df (pandas.DataFrame): The pre-processed schedule the engine expects (see preprocess.preprocess_schedule).
+    hubs (list): Hub codes to build connections at.
+    engine (str): 'exploded' for build_and_filter_connections, 'bitmask' for build_and_filter_connections_bitmask.
+    processes (int): Number of worker processes. Defaults to one per hub, capped at the CPU count.
+        With 1, everything runs in the current process.
+    airport_data (dict or AirportRegistry): Airport data keyed by code. The shared airport registry if None.
+    **kwargs: Thresholds passed on to the engine (max_circuity, min_connect_time, ...).
+
+    Returns:
+    tuple: A tuple containing DataFrames for logical connections, missed connections, and illogical connections,
+    for all hubs, with a leading 'Hub' column.
+    """
+    hubs = list(dict.fromkeys(hubs))
+    if airport_data is None:
+        airport_data = get_airport_registry()
+    if processes is None:
+        processes = min(len(hubs), os.cpu_count() or 1)
+
+    tasks = list(partition_by_station(df, hubs).items())
+
+    if processes <= 1 or len(tasks) <= 1:
+        _init_worker(df, airport_data, engine, kwargs)
+        results = [_build_hub(task) for task in tasks]
+        _shared.clear()
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker,
+                                  initargs=(df, airport_data, engine, kwargs)) as pool:
+            results = pool.map(_build_hub, tasks, chunksize=1)
+
+    dfs = [[], [], []]
+    for hub, frames in results:
+        for i, frame in enumerate(frames):
+            frame = frame.copy()
+            frame.insert(0, 'Hub', hub)
+            dfs[i].append(frame)
+
+    return tuple(pd.concat(frames, ignore_index=True) for frames in dfs)
@@ -0,0 +1,33 @@
+from functions.explode_schedule import explode_schedule
+from functions.data_enrich import add_movement_flag, add_day_eight
+from functions.time_conversion import convert_time_columns_to_fraction, create_utc_floats, add_local_times, schedule_reference_week
+from utils.config import REF_DATE, time_columns
+
+def _run_stage(report, name, function, *args, **kwargs):
+    # Runs a stage through the run report when there is one
+    if report is None:
+        return function(*args, **kwargs)
+    return report.stage(name, function, *args, **kwargs)
+
+def preprocess_schedule(df, engine='exploded', report=None, ref_date=REF_DATE):
+    
+    """Runs the pre-processing stages the selected connection engine expects on an imported schedule,
+    recording each one in the run report if given. With a reference week (ref_date), local times are
+    recomputed from UTC with that week's offsets. Without one, dated schedules ('Eff' column) use the
+    week of their earliest line date and undated ones keep the local times of the file"""
+    
+    if ref_date is None:
+        ref_date = schedule_reference_week(df)
+    if engine == 'bitmask':
+        # Keep one row per schedule line, operating days are handled as bitmasks
+        df = _run_stage(report, 'add_movement_flag', add_movement_flag, df)
+        df = _run_stage(report, 'convert_time_columns_to_fraction', convert_time_columns_to_fraction, df, time_columns)
+    else:
+        df = _run_stage(report, 'explode_schedule', explode_schedule, df)
+        df = _run_stage(report, 'add_movement_flag', add_movement_flag, df)
+        df = _run_stage(report, 'add_day_eight', add_day_eight, df)
+        df = _run_stage(report, 'convert_time_columns_to_fraction', convert_time_columns_to_fraction, df, time_columns)
+        df = _run_stage(report, 'create_utc_floats', create_utc_floats, df)
+    if ref_date is not None:
+        df = _run_stage(report, 'add_local_times', add_local_times, df, ref_date)
+    return df
@@ -0,0 +1,278 @@
+import datetime
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from classes.airport import get_airport_registry
+from classes.connection_index import ConnectionIndex
+from functions.build_connections import build_and_filter_connections
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.cache import file_hash
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+
+# Seconds between two checks of the schedule file
+POLL_SECONDS = 5
+
+# Largest number of connections returned by one query unless asked otherwise
+DEFAULT_LIMIT = 500
+
+
+def _minutes(value, default):
+    # 'HH:MM' or a number of minutes from a query string, the default if missing
+    if value is None:
+        return default
+    if ':' in value:
+        hours, minutes = value.split(':', 1)
+        if not (0 <= int(hours) <= 23 and 0 <= int(minutes) <= 59):
+            raise ValueError(f"Invalid time '{value}', expected HH:MM from 00:00 to 23:59.")
+        return int(hours) * 60 + int(minutes)
+    if not 0 <= int(value) <= 1439:
+        raise ValueError(f"Invalid time '{value}', expected minutes from 0 to 1439.")
+    return int(value)
+
+
+class ConnectionService:
+    """
+    Keeps the connections of a schedule file built and indexed, and rebuilds them in the
+    background when the file changes.
+
+    Queries always run on a complete index: a rebuild builds a new index next to the current one
+    and replaces it in one assignment.
+    """
+
+    def __init__(self, schedule_path, sheet_name, engine = 'bitmask', airport_data = None, poll_seconds = POLL_SECONDS):
+        """
+        Parameters:
+        schedule_path (str): Schedule workbook.
+        sheet_name (str): Sheet of the schedule.
+        engine (str): 'exploded' for build_and_filter_connections, 'bitmask' for build_and_filter_connections_bitmask.
+        airport_data (dict or AirportRegistry): Airport data keyed by code. The shared airport registry if None.
+        poll_seconds (float): Seconds between two checks of the schedule file.
+        """
+        self.schedule_path = schedule_path
+        self.sheet_name = sheet_name
+        self.engine = engine
+        self.airport_data = get_airport_registry() if airport_data is None else airport_data
+        self.poll_seconds = poll_seconds
+        self.index = None
+        self.schedule_hash = None
+        self.built_at = None
+        self.build_seconds = None
+        self.last_error = None
+        self._mtime = None
+        self._rebuild_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def rebuild(self):
+        """
+        Builds and indexes the logical connections of the schedule file as it is now.
+
+        Returns:
+        ConnectionIndex: The new index, also made the current one.
+        """
+        with self._rebuild_lock:
+            started = time.perf_counter()
+            try:
+                mtime = os.path.getmtime(self.schedule_path)
+                schedule_hash = file_hash(self.schedule_path)
+                df = preprocess_schedule(import_schedule(self.schedule_path, sheet_name=self.sheet_name, use_cache=True), self.engine)
+                build = build_and_filter_connections_bitmask if self.engine == 'bitmask' else build_and_filter_connections
+                df_logical_connections = build(df, airport_data=self.airport_data)[0]
+                index = ConnectionIndex(df_logical_connections)
+            except Exception as error:
+                # The previous index, if any, keeps answering queries
+                self.last_error = f'{type(error).__name__}: {error}'
+                raise
+
+            self.index = index
+            self.schedule_hash = schedule_hash
+            self._mtime = mtime
+            self.built_at = datetime.datetime.now(datetime.timezone.utc)
+            self.build_seconds = time.perf_counter() - started
+            self.last_error = None
+            return index
+
+    def _watch(self):
+        # Rebuilds when the schedule's content changes. A failed rebuild keeps the previous index.
+        # Changes are found against the file as it was built, also those made before the thread runs
+        last_mtime = self._mtime
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                mtime = os.path.getmtime(self.schedule_path)
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    if file_hash(self.schedule_path) != self.schedule_hash:
+                        self.rebuild()
+            except Exception as error:  # The file may be half written, the next change retries
+                self.last_error = f'{type(error).__name__}: {error}'
+
+    def start(self):
+        """Builds the index if needed and starts watching the schedule file."""
+        if self.index is None:
+            self.rebuild()
+        if self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name='schedule-watcher', daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        """Stops watching the schedule file."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def status(self):
+        """
+        Returns the state of the service.
+
+        Returns:
+        dict: Schedule, connections indexed, last build time and duration, last error.
+        """
+        index = self.index
+        return {
+            'schedule': f'{self.schedule_path}:{self.sheet_name}',
+            'engine': self.engine,
+            'schedule_hash': self.schedule_hash,
+            'connections': len(index.connections) if index is not None else 0,
+            'connection_days': len(index) if index is not None else 0,
+            'built_at': self.built_at.isoformat(timespec='seconds') if self.built_at else None,
+            'build_seconds': self.build_seconds,
+            'last_error': self.last_error,
+        }
+
+    def query(self, params):
+        """
+        Answers a connection query.
+
+        Parameters:
+        params (dict): 'orig', 'dest', 'via', 'day' (e.g. '2' or '135'), 'from' and 'to' (inbound
+            departure window, 'HH:MM' UTC or minutes, running into the next day if 'to' is before
+            'from') and 'limit', as strings.
+
+        Returns:
+        dict: 'count' (all matches), 'connections' (up to limit records) and 'milliseconds'.
+        """
+        started = time.perf_counter()
+        index = self.index
+        if index is None:
+            raise RuntimeError(f"No connections built yet: {self.last_error or 'the first build is running'}")
+        days = None
+        if params.get('day'):
+            days = [int(day) for day in params['day'] if day.isdigit() and 1 <= int(day) <= 7]
+            if len(days) != len(params['day']):
+                raise ValueError(f"Invalid day '{params['day']}', expected digits from 1 (Monday) to 7.")
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+        if limit < 0:
+            raise ValueError(f"Invalid limit {limit}, expected 0 or more.")
+        positions = index.query(params.get('orig'), params.get('dest'), params.get('via'), days,
+                                _minutes(params.get('from'), 0), _minutes(params.get('to'), 1439))
+        return {
+            'count': len(positions),
+            'connections': index.records(positions, limit),
+            'milliseconds': round((time.perf_counter() - started) * 1000, 3),
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == '/connections':
+            self._respond(lambda: self.service.query({key: value.upper() if key in ('orig', 'dest', 'via') else value
+                                                      for key, value in params.items()}))
+        elif url.path == '/status':
+            self._respond(self.service.status)
+        elif url.path == '/rebuild':
+            self._send({'error': 'Use POST /rebuild'}, 405, {'Allow': 'POST'})
+        else:
+            self._send({'error': f'Unknown path {url.path}, use GET /connections, GET /status or POST /rebuild'}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == '/rebuild':
+            self._respond(self._rebuild)
+        elif url.path in ('/connections', '/status'):
+            self._send({'error': f'Use GET {url.path}'}, 405, {'Allow': 'GET'})
+        else:
+            self._send({'error': f'Unknown path {url.path}, use GET /connections, GET /status or POST /rebuild'}, 404)
+
+    def _rebuild(self):
+        self.service.rebuild()
+        return self.service.status()
+
+    def _respond(self, answer):
+        try:
+            body, status = answer(), 200
+        except ValueError as error:
+            body, status = {'error': str(error)}, 400
+        except Exception as error:
+            # A failed rebuild, or no index yet: the service keeps running and says why
+            body, status = {'error': f'{type(error).__name__}: {error}', **self.service.status()}, 503
+        self._send(body, status)
+
+    def _send(self, body, status, headers = None):
+        payload = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(service, host = '127.0.0.1', port = 8765):
+    """
+    Creates the HTTP server of a connection service, without starting it.
+
+    GET /connections?orig=LHR&dest=SYD&day=2&from=06:00&to=12:00[&via=NUM&limit=100] answers a query,
+    GET /status describes the index and POST /rebuild rebuilds it now.
+
+    Parameters:
+    service (ConnectionService): The service.
+    host (str): Address to listen on, local only by default.
+    port (int): Port to listen on, 0 for any free port.
+
+    Returns:
+    http.server.ThreadingHTTPServer: The server.
+    """
+    handler = type('ConnectionHandler', (_Handler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(schedule_path, sheet_name, host = '127.0.0.1', port = 8765, engine = 'bitmask', airport_data = None,
+          poll_seconds = POLL_SECONDS):
+    """
+    Builds the connections once, then answers queries over HTTP until interrupted, rebuilding in the
+    background whenever the schedule file changes.
+
+    Parameters:
+    schedule_path (str): Schedule workbook.
+    sheet_name (str): Sheet of the schedule.
+    host (str): Address to listen on.
+    port (int): Port to listen on.
+    engine (str): Connection engine, see ConnectionService.
+    airport_data (dict or AirportRegistry): Airport data keyed by code. The shared airport registry if None.
+    poll_seconds (float): Seconds between two checks of the schedule file.
+    """
+    service = ConnectionService(schedule_path, sheet_name, engine, airport_data, poll_seconds)
+    service.start()
+    server = make_server(service, host, port)
+    print(f'Serving {len(service.index)} connection-days of {schedule_path}:{sheet_name} on http://{host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from classes.ground_time import GroundTime
+from classes.rotation import RotationPlan
+from functions.day_mask import days_to_mask
+from functions.time_conversion import column_to_day_fraction
+
+WEEK_MINUTES = 7 * 24 * 60
+
+# Columns copied from the schedule to the dated legs when present
+LEG_COLUMNS = ['Aln', 'Flt']
+
+
+def dated_legs(df, subfleet_column = 'Subfl', day_column = 'Dep Day'):
+    """
+    Expands a schedule into one row per flight-day, with times in minutes from the start of the week (UTC).
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, one row per schedule line. STD and Blk Hrs may be times
+        of day or fractions of day.
+    subfleet_column (str): Column holding the subfleet.
+    day_column (str): Column holding the operating days of each line.
+
+    Returns:
+    pandas.DataFrame: The legs, with 'Schedule row' (position in df), 'Day', the subfleet, 'Orig',
+    'Dest', 'Dep (min)' and 'Arr (min)'. Lines without a departure time or block time are left out.
+    """
+    std = np.round(column_to_day_fraction(df['STD']).to_numpy() * 1440)
+    block = np.round(column_to_day_fraction(df['Blk Hrs'], duration=True).to_numpy() * 1440)
+    mask = days_to_mask(df[day_column])
+    mask[np.isnan(std) | np.isnan(block)] = 0
+
+    rows, days = [], []
+    for day in range(1, 8):
+        operating = np.flatnonzero(mask >> (day - 1) & 1)
+        rows.append(operating)
+        days.append(np.full(len(operating), day, dtype=np.int8))
+    rows, days = np.concatenate(rows), np.concatenate(days)
+    rows_order = np.argsort(rows, kind='stable')
+    rows, days = rows[rows_order], days[rows_order]
+
+    dep = (days.astype(np.int64) - 1) * 1440 + std[rows].astype(np.int64)
+    legs = pd.DataFrame({'Schedule row': rows, 'Day': days})
+    for col in LEG_COLUMNS:
+        if col in df.columns:
+            legs[col] = df[col].to_numpy()[rows]
+    legs[subfleet_column] = df[subfleet_column].to_numpy()[rows]
+    legs['Orig'] = df['Orig'].to_numpy()[rows]
+    legs['Dest'] = df['Dest'].to_numpy()[rows]
+    legs['Dep (min)'] = dep
+    legs['Arr (min)'] = dep + block[rows].astype(np.int64)
+    return legs
+
+
+def _group_rank(group, flags):
+    # Running count of flagged events within each group, for events sorted by group
+    counts = np.cumsum(flags)
+    starts = np.flatnonzero(np.diff(group, prepend=-1))
+    before_group = np.repeat(counts[starts] - flags[starts], np.diff(np.append(starts, len(group))))
+    return counts - before_group
+
+
+def build_rotations(df, ground_times = None, subfleet_column = 'Subfl', day_column = 'Dep Day'):
+    """
+    Chains a weekly schedule's flights into aircraft lines of flying, per subfleet.
+
+    At every (subfleet, station), aircraft become available at arrival + minimum ground time and
+    departures take the aircraft that has been available longest (first in, first out). All
+    events are sorted once; the k-th departure of a station takes its k-th available aircraft, so
+    the assignment is vectorized and runs in O(n log n).
+
+    The week is cyclic: an aircraft that is ready only after the end of the week is ready at the
+    corresponding time of the next week. The aircraft needed are those on the ground at the start
+    of the week (the largest shortfall of available aircraft at each station) plus those still in
+    the air, or within their ground time, from the previous week.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, one row per schedule line, with the subfleet, 'Orig',
+        'Dest', 'STD' (UTC), 'Blk Hrs' and the operating days.
+    ground_times (GroundTime): Minimum ground times. GroundTime() (the configured default everywhere) if None.
+    subfleet_column (str): Column holding the subfleet.
+    day_column (str): Column holding the operating days of each line.
+
+    Returns:
+    RotationPlan: The aircraft and the legs each one flies.
+    """
+    if ground_times is None:
+        ground_times = GroundTime()
+
+    legs = dated_legs(df, subfleet_column, day_column)
+    n = len(legs)
+    subfleet = legs[subfleet_column].to_numpy(dtype=object)
+    dep = legs['Dep (min)'].to_numpy()
+    ready = legs['Arr (min)'].to_numpy() + ground_times.minutes_array(subfleet, legs['Dest'])
+    legs['Ready (min)'] = ready
+    spanning = ready >= WEEK_MINUTES
+
+    # Events: every leg departs from (subfleet, Orig) and makes its aircraft ready at (subfleet, Dest)
+    pairs = pd.MultiIndex.from_arrays([np.concatenate([subfleet, subfleet]),
+                                       np.concatenate([legs['Orig'].to_numpy(dtype=object), legs['Dest'].to_numpy(dtype=object)])])
+    group_codes, groups = pd.factorize(pairs)
+    event_group = group_codes.astype(np.int64)
+    event_time = np.concatenate([dep, np.mod(ready, WEEK_MINUTES)])
+    is_dep = np.concatenate([np.ones(n, dtype=np.int64), np.zeros(n, dtype=np.int64)])
+    event_leg = np.concatenate([np.arange(n), np.arange(n)])
+
+    # Sort by group, then time, with aircraft becoming ready before departures at the same minute
+    order = np.lexsort((is_dep, event_time, event_group))
+    event_group, is_dep, event_leg = event_group[order], is_dep[order], event_leg[order]
+    dep_rank = _group_rank(event_group, is_dep) - 1
+    ready_count = _group_rank(event_group, 1 - is_dep)
+
+    # Aircraft on the ground at the start of the week: the largest shortfall of ready aircraft
+    departures = is_dep == 1
+    stock = np.zeros(len(groups), dtype=np.int64)
+    np.maximum.at(stock, event_group[departures], dep_rank[departures] + 1 - ready_count[departures])
+
+    # The k-th departure takes the k-th aircraft of the queue: the ground stock, then the ready aircraft in order
+    dep_group = event_group[departures]
+    dep_leg = event_leg[departures]
+    slot = dep_rank[departures] - stock[dep_group]
+    ready_legs = event_leg[~departures]
+    ready_offsets = np.searchsorted(event_group[~departures], np.arange(len(groups)))
+
+    stock_offsets = np.concatenate([[0], np.cumsum(stock)])
+    n_stock = stock_offsets[-1]
+    transit_number = np.full(n, -1, dtype=np.int64)
+    transit_number[spanning] = n_stock + np.arange(spanning.sum())
+
+    # Each leg is flown by a ground-stock aircraft, an aircraft coming from the previous week, or
+    # the aircraft of the leg it follows
+    aircraft_of_leg = np.full(n, -1, dtype=np.int64)
+    parent = np.full(n, -1, dtype=np.int64)
+    from_stock = slot < 0
+    aircraft_of_leg[dep_leg[from_stock]] = stock_offsets[dep_group[from_stock]] + dep_rank[departures][from_stock]
+    previous = ready_legs[ready_offsets[dep_group[~from_stock]] + slot[~from_stock]]
+    follows = dep_leg[~from_stock]
+    from_previous_week = spanning[previous]
+    aircraft_of_leg[follows[from_previous_week]] = transit_number[previous[from_previous_week]]
+    parent[follows[~from_previous_week]] = previous[~from_previous_week]
+
+    # Resolve the chains by pointer jumping, halving the remaining chain length at every step
+    pending = np.flatnonzero(parent >= 0)
+    while len(pending):
+        known = aircraft_of_leg[parent[pending]] >= 0
+        aircraft_of_leg[pending[known]] = aircraft_of_leg[parent[pending[known]]]
+        pending = pending[~known]
+        parent[pending] = parent[parent[pending]]
+
+    # Ground stock aircraft start at their station, the others at the destination of the leg they are flying
+    group_subfleet = np.asarray(groups.get_level_values(0), dtype=object)
+    group_station = np.asarray(groups.get_level_values(1), dtype=object)
+    stock_group = np.repeat(np.arange(len(groups)), stock)
+    aircraft_subfleet = np.concatenate([group_subfleet[stock_group], subfleet[spanning]])
+    aircraft_start_station = np.concatenate([group_station[stock_group], legs['Dest'].to_numpy(dtype=object)[spanning]])
+
+    return RotationPlan(legs, aircraft_of_leg, aircraft_subfleet, aircraft_start_station)
@@ -0,0 +1,193 @@
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from classes.airport import get_airport_registry
+from functions.build_connections import build_and_filter_connections, CONNECTION_KEY_COLUMNS
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.day_mask import days_to_mask
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+
+# Connections are compared day by day, CONNECTION_KEY_COLUMNS with the inbound flight's day
+DAY_COLUMN = 'Inbound Dep Day (UTC)'
+
+# Columns compared to find retimed connections
+TIME_COLUMNS = ['Inbound STA (UTC)', 'Outbound STD (UTC)', 'Connection Time (min)']
+
+MARKET_COLUMNS = ['Inbound Orig Airp', 'Outbound Dest Airp']
+
+# Per-process copy of the data shared by every scenario task, set once by _init_worker
+_shared = {}
+
+
+def _init_worker(airport_data, engine, kwargs):
+    _shared['airport_data'] = airport_data
+    _shared['engine'] = engine
+    _shared['kwargs'] = kwargs
+
+
+def _load(source):
+    # A schedule given as a DataFrame, or as (path, sheet name) to import
+    if isinstance(source, pd.DataFrame):
+        return source.copy()
+    path, sheet_name = source
+    return import_schedule(path, sheet_name=sheet_name, use_cache=True)
+
+
+def _build_scenario(task):
+    name, df = task
+    df = preprocess_schedule(df, _shared['engine'])
+    build = build_and_filter_connections_bitmask if _shared['engine'] == 'bitmask' else build_and_filter_connections
+    return name, build(df, airport_data=_shared['airport_data'], **_shared['kwargs'])
+
+
+def build_scenarios(schedules, engine = 'bitmask', processes = None, airport_data = None, **kwargs):
+    """
+    Builds the connections of several schedules, one worker process per schedule.
+
+    The schedules are imported (through the schedule cache) in this process, and the airport data
+    of the airports they use, with the distance matrix between them, is computed once and sent to
+    each worker once.
+
+    Parameters:
+    schedules (dict): Scenario name -> DataFrame as returned by import_schedule, or (path, sheet name).
+    engine (str): 'exploded' for build_and_filter_connections, 'bitmask' for build_and_filter_connections_bitmask.
+    processes (int): Number of worker processes. Defaults to one per schedule, capped at the CPU count.
+        With 1, everything runs in the current process.
+    airport_data (dict or AirportRegistry): Airport data keyed by code. The shared airport registry if None.
+    **kwargs: Thresholds passed on to the engine (max_circuity, min_connect_time, ...).
+
+    Returns:
+    dict: Scenario name -> (logical, missed, illogical) connections, in the order of schedules.
+    """
+    if airport_data is None:
+        airport_data = get_airport_registry()
+    tasks = [(name, _load(source)) for name, source in schedules.items()]
+    if processes is None:
+        processes = min(len(tasks), os.cpu_count() or 1)
+
+    if hasattr(airport_data, 'subset'):
+        airports = pd.unique(np.concatenate([df[col].to_numpy(dtype=object) for _, df in tasks for col in ['Orig', 'Dest']]))
+        airport_data = airport_data.subset(airports).with_distances()
+
+    if processes <= 1 or len(tasks) <= 1:
+        _init_worker(airport_data, engine, kwargs)
+        results = [_build_scenario(task) for task in tasks]
+        _shared.clear()
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(airport_data, engine, kwargs)) as pool:
+            results = pool.map(_build_scenario, tasks, chunksize=1)
+    return dict(results)
+
+
+def connection_days(df_connections):
+    """
+    Expands grouped connections to one row per inbound day, with a hashed connection key.
+
+    Parameters:
+    df_connections (pandas.DataFrame): Connections as built by the engines (see rename_connection_columns).
+
+    Returns:
+    pandas.DataFrame: CONNECTION_KEY_COLUMNS, 'Day', MARKET_COLUMNS, TIME_COLUMNS (in minutes) and 'Key' (uint64
+    hash of the key columns and the day). Only the first row of a key is kept.
+    """
+    mask = days_to_mask(df_connections[DAY_COLUMN])
+    rows, days = [], []
+    for day in range(1, 8):
+        operating = np.flatnonzero(mask >> (day - 1) & 1)
+        rows.append(operating)
+        days.append(np.full(len(operating), day, dtype=np.int8))
+    rows, days = np.concatenate(rows), np.concatenate(days)
+
+    df = df_connections[CONNECTION_KEY_COLUMNS + MARKET_COLUMNS].take(rows).reset_index(drop=True).astype(object)
+    df.insert(len(CONNECTION_KEY_COLUMNS), 'Day', days)
+    for col in TIME_COLUMNS:
+        # Fractions of day in the engines' output, compared in whole minutes
+        df[col] = np.round(df_connections[col].to_numpy(dtype=float)[rows] * 1440)
+    df['Key'] = pd.util.hash_pandas_object(df[CONNECTION_KEY_COLUMNS + ['Day']], index=False).to_numpy()
+    return df.drop_duplicates('Key').reset_index(drop=True)
+
+
+def diff_connections(df_base, df_other):
+    """
+    Compares the connections of two schedules flight-day by flight-day.
+
+    Parameters:
+    df_base (pandas.DataFrame): Connections of the reference schedule.
+    df_other (pandas.DataFrame): Connections of the compared schedule.
+
+    Returns:
+    tuple: Gained, lost and retimed connections (one row per inbound day, retimed ones with the
+    times of both schedules), and the per-market deltas.
+    """
+    base, other = connection_days(df_base), connection_days(df_other)
+    in_base = np.isin(other['Key'].to_numpy(), base['Key'].to_numpy())
+    in_other = np.isin(base['Key'].to_numpy(), other['Key'].to_numpy())
+    gained = other[~in_base].drop(columns='Key').reset_index(drop=True)
+    lost = base[~in_other].drop(columns='Key').reset_index(drop=True)
+
+    both = base[in_other].merge(other[in_base][['Key'] + TIME_COLUMNS], on='Key', suffixes=(' (base)', ''))
+    changed = np.zeros(len(both), dtype=bool)
+    for col in TIME_COLUMNS:
+        changed |= both[f'{col} (base)'].to_numpy() != both[col].to_numpy()
+    retimed = both[changed].drop(columns='Key').reset_index(drop=True)
+
+    counts = [frame.groupby(MARKET_COLUMNS).size().rename(name)
+              for frame, name in [(base, 'Base'), (other, 'Compared'), (gained, 'Gained'), (lost, 'Lost'), (retimed, 'Retimed')]]
+    markets = pd.concat(counts, axis=1).fillna(0).astype(np.int64)
+    markets.insert(2, 'Delta', markets['Compared'] - markets['Base'])
+    markets = markets[(markets[['Delta', 'Gained', 'Lost', 'Retimed']] != 0).any(axis=1)]
+    markets = markets.sort_values('Delta', key=np.abs, ascending=False, kind='stable').reset_index()
+    return gained, lost, retimed, markets
+
+
+def compare_schedules(schedules, baseline = None, engine = 'bitmask', processes = None, airport_data = None, **kwargs):
+    """
+    Builds several schedules in parallel and compares each one's logical connections to a baseline.
+
+    Parameters:
+    schedules (dict): Scenario name -> DataFrame as returned by import_schedule, or (path, sheet name).
+    baseline (str): Name of the reference scenario, the first one if None.
+    engine (str): Connection engine, see build_scenarios.
+    processes (int): Number of worker processes, see build_scenarios.
+    airport_data (dict or AirportRegistry): Airport data keyed by code. The shared airport registry if None.
+    **kwargs: Thresholds passed on to the engine.
+
+    Returns:
+    dict: Compared scenario name -> (gained, lost, retimed, markets), see diff_connections.
+    """
+    baseline = next(iter(schedules)) if baseline is None else baseline
+    if baseline not in schedules:
+        raise KeyError(f"Baseline '{baseline}' is not one of the schedules: {list(schedules)}")
+    results = build_scenarios(schedules, engine, processes, airport_data, **kwargs)
+    return {name: diff_connections(results[baseline][0], frames[0]) for name, frames in results.items() if name != baseline}
+
+
+def export_schedule_diff(diffs, output_path = 'Output/Schedule_compare'):
+    """
+    Writes schedule comparisons to a workbook: a summary sheet, then the gained, lost, retimed
+    connections and market deltas of each compared scenario.
+
+    Parameters:
+    diffs (dict): Output of compare_schedules.
+    output_path (str): Output path without extension.
+
+    Returns:
+    str: Path of the workbook.
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    filename = f'{output_path}.xlsx'
+
+    summary = pd.DataFrame([(name, len(gained), len(lost), len(retimed), len(markets))
+                            for name, (gained, lost, retimed, markets) in diffs.items()],
+                           columns=['Scenario', 'Gained', 'Lost', 'Retimed', 'Markets changed'])
+    with pd.ExcelWriter(filename) as writer:
+        summary.to_excel(writer, sheet_name='Summary', index=False)
+        for name, frames in diffs.items():
+            for label, frame in zip(['Gained', 'Lost', 'Retimed', 'Markets'], frames):
+                # Sheet names are limited to 31 characters
+                frame.to_excel(writer, sheet_name=f'{name} {label}'[:31], index=False)
+    return filename
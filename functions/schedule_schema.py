@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+from functions.time_conversion import column_to_day_fraction
+
+# Compact dtypes of the imported schedule. Codes repeat across thousands of lines and become
+# categoricals, counts become small integers. Times, read from Excel as a mix of datetime.time and
+# datetime cells, become float64 day fractions, and frequencies (a mix of strings and numbers)
+# become strings, so that every column has a single type and the schedule can be cached as Parquet.
+SCHEDULE_SCHEMA = {
+    'Aln': 'category',
+    'Flt': 'category',
+    'Orig': 'airport',
+    'Dest': 'airport',
+    'STD': 'time',
+    'DLcl': 'time',
+    'STA': 'time',
+    'ALcl': 'time',
+    'Blk Hrs': 'duration',
+    'Dep Day': 'days',
+    'Subfl': 'category',
+    'Codeshare': 'airport',
+    'Traffic Restrictions (if any)': 'category',
+    'Seats': 'int16',
+}
+
+# Day numbers after explode_schedule (1-8)
+DAY_DTYPE = 'int8'
+
+
+def apply_schedule_schema(df, schema = SCHEDULE_SCHEMA):
+    """
+    Converts the schedule columns to the compact dtypes of the schema.
+
+    'airport' columns share one categorical dtype over all airport codes of the schedule, so
+    origins and destinations stay comparable with each other. Integer columns are only
+    downcast when they have no missing values and fit the target type.
+
+    Parameters:
+    df (pandas.DataFrame): The imported schedule.
+    schema (dict): Column name -> 'category', 'airport', 'time' or 'duration' (day fractions, see
+        column_to_day_fraction), 'days' (frequency strings) or a numpy integer dtype name.
+
+    Returns:
+    pandas.DataFrame: The schedule with converted columns. Columns not in the schema are unchanged.
+    """
+    airport_columns = [col for col, dtype in schema.items() if dtype == 'airport' and col in df.columns]
+    if airport_columns:
+        codes = pd.concat([df[col].dropna().astype(str) for col in airport_columns], ignore_index=True)
+        airport_dtype = pd.CategoricalDtype(np.sort(codes.unique()))
+
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'airport':
+            df[col] = df[col].astype(str).where(df[col].notna()).astype(airport_dtype)
+        elif dtype == 'category':
+            df[col] = df[col].astype('category')
+        elif dtype in ('time', 'duration'):
+            df[col] = column_to_day_fraction(df[col], duration=dtype == 'duration')
+        elif dtype == 'days':
+            df[col] = df[col].astype(str).where(df[col].notna())
+        else:
+            df[col] = downcast_integers(df[col], dtype)
+    return df
+
+
+def downcast_integers(column, dtype):
+    """
+    Casts a column to a small integer dtype when that loses nothing, otherwise returns it unchanged.
+
+    Parameters:
+    column (pandas.Series): The column.
+    dtype (str): Numpy integer dtype name, e.g. 'int8' or 'int16'.
+
+    Returns:
+    pandas.Series: The converted or original column.
+    """
+    values = pd.to_numeric(column, errors='coerce')
+    if values.isna().any() or column.isna().any():
+        return column
+    info = np.iinfo(dtype)
+    if (values % 1 != 0).any() or values.min() < info.min or values.max() > info.max:
+        return column
+    return values.astype(dtype)
+
+
+def materialize_categoricals(df):
+    """
+    Converts categorical columns back to the dtype of their values, for output frames.
+
+    The input frame is left unchanged, so it can be a slice of another frame.
+
+    Parameters:
+    df (pandas.DataFrame): The DataFrame.
+
+    Returns:
+    pandas.DataFrame: The DataFrame without categorical columns.
+    """
+    converted = {col: df[col].astype(df[col].cat.categories.dtype) for col in df.columns
+                 if isinstance(df[col].dtype, pd.CategoricalDtype)}
+    return df.assign(**converted) if converted else df
@@ -0,0 +1,169 @@
+import datetime
+import itertools
+import string
+import numpy as np
+import pandas as pd
+from functions.distance import distance_matrix
+from utils.config import HUB
+
+# Operating day patterns and their share of schedule lines, in the schedule's 'Dep Day' format
+FREQUENCY_PATTERNS = {
+    '1234567': 0.45,
+    '12345..': 0.15,
+    '1.3.5.7': 0.15,
+    '.2.4.6.': 0.10,
+    '1...5..': 0.10,
+    '......7': 0.05,
+}
+
+# datetime.time for every minute of the day, indexed by minute, like the times read from the schedule workbook
+MINUTE_TIMES = np.array([datetime.time(hours, minutes) for hours in range(24) for minutes in range(60)], dtype=object)
+
+CRUISE_SPEED_KMH = 800
+TAXI_MINUTES = 30
+MAX_BLOCK_MINUTES = 18 * 60
+
+
+def _airport_codes(count, exclude):
+    # 'AAA', 'AAB', ... skipping codes taken by the hubs
+    codes = (''.join(letters) for letters in itertools.product(string.ascii_uppercase, repeat=3))
+    return list(itertools.islice((code for code in codes if code not in exclude), count))
+
+
+def generate_airport_data(n_airports = 100, hubs = (HUB,), seed = 0):
+    """
+    Generates a deterministic airport table in the format of data/airport_data.pkl.
+
+    Airports are spread over the inhabited latitudes, and each gets a whole-hour UTC offset from
+    its longitude, stored as an 'Etc/GMT' timezone.
+
+    Parameters:
+    n_airports (int): Total number of airports, hubs included.
+    hubs (list): Hub codes, always part of the table.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    dict: Airport data keyed by code, with 'Latitude', 'Longitude', 'Timezone' and 'Airport name'.
+    """
+    hubs = list(dict.fromkeys(hubs))
+    if n_airports <= len(hubs):
+        raise ValueError(f"n_airports must be larger than the number of hubs ({len(hubs)}).")
+
+    rng = np.random.default_rng(seed)
+    codes = hubs + _airport_codes(n_airports - len(hubs), set(hubs))
+    latitudes = np.round(rng.uniform(-45, 65, n_airports), 4)
+    longitudes = np.round(rng.uniform(-150, 150, n_airports), 4)
+    offsets = np.round(longitudes / 15).astype(int)
+
+    airport_data = {}
+    for code, latitude, longitude, offset in zip(codes, latitudes.tolist(), longitudes.tolist(), offsets.tolist()):
+        # Etc/GMT signs are inverted: Etc/GMT-3 is UTC+3
+        timezone = 'Etc/GMT' if offset == 0 else f'Etc/GMT{-offset:+d}'
+        airport_data[code] = {'Airport name': f'Synthetic {code}', 'Latitude': latitude,
+                              'Longitude': longitude, 'Timezone': timezone, 'UTC offset (h)': offset}
+    return airport_data
+
+
+def lines_for_flight_days(flight_days, frequency_patterns = None):
+    """
+    Returns the number of schedule lines expected to give a number of flight-days per week.
+
+    Parameters:
+    flight_days (int): Target number of flight-days (a line operating on 3 days counts 3).
+    frequency_patterns (dict): Day pattern -> share of lines. Defaults to FREQUENCY_PATTERNS.
+
+    Returns:
+    int: Number of schedule lines.
+    """
+    frequency_patterns = FREQUENCY_PATTERNS if frequency_patterns is None else frequency_patterns
+    weights = np.array(list(frequency_patterns.values()), dtype=float)
+    days = np.array([sum(char.isdigit() for char in pattern) for pattern in frequency_patterns])
+    return max(1, int(round(flight_days / (days @ weights / weights.sum()))))
+
+
+def generate_schedule(
+    airport_data,
+    n_flights,
+    hubs = (HUB,),
+    n_banks = 6,
+    bank_width = 60,
+    frequency_patterns = None,
+    seed = 0
+    ):
+    """
+    Generates a deterministic hub-and-spoke schedule in the format of data/schedule_v8.xlsx.
+
+    Every line flies between a hub and a spoke, in either direction. Hub departures leave within
+    `bank_width` minutes after a bank time, hub arrivals land within the hour before one, so
+    connections form in banks like at a real hub. Banks are spread evenly over the day and
+    staggered between hubs. Block times follow the great circle distance.
+
+    Parameters:
+    airport_data (dict): Airport data keyed by code, e.g. from generate_airport_data. Every hub must be in it.
+    n_flights (int): Number of schedule lines (see lines_for_flight_days).
+    hubs (list): Hub codes.
+    n_banks (int): Number of connection banks per day at each hub.
+    bank_width (int): Length of a departure bank in minutes.
+    frequency_patterns (dict): Day pattern -> share of lines. Defaults to FREQUENCY_PATTERNS.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    pandas.DataFrame: The schedule, with times as datetime.time (UTC for STD/STA, local for DLcl/ALcl).
+    """
+    hubs = list(dict.fromkeys(hubs))
+    missing = [hub for hub in hubs if hub not in airport_data]
+    if missing:
+        raise ValueError(f"Hubs missing from the airport data: {missing}")
+    frequency_patterns = FREQUENCY_PATTERNS if frequency_patterns is None else frequency_patterns
+
+    rng = np.random.default_rng(seed)
+    codes = np.array(list(airport_data), dtype=object)
+    hub_ids = np.array([codes.tolist().index(hub) for hub in hubs])
+    spoke_ids = np.setdiff1d(np.arange(len(codes)), hub_ids)
+
+    latitudes = np.array([airport_data[code]['Latitude'] for code in codes], dtype=float)
+    longitudes = np.array([airport_data[code]['Longitude'] for code in codes], dtype=float)
+    offsets = np.array([airport_data[code].get('UTC offset (h)', 0) for code in codes], dtype=int) * 60
+
+    # Route of every line
+    hub_index = rng.integers(len(hubs), size=n_flights)
+    hub = hub_ids[hub_index]
+    spoke = spoke_ids[rng.integers(len(spoke_ids), size=n_flights)]
+    outbound = rng.random(n_flights) < 0.5
+    orig = np.where(outbound, hub, spoke)
+    dest = np.where(outbound, spoke, hub)
+
+    # Block time from the distance, on a 5 minute grid
+    distances = distance_matrix(latitudes, longitudes)[orig, dest]
+    block = np.round((distances / CRUISE_SPEED_KMH * 60 + TAXI_MINUTES) / 5) * 5
+    block = np.clip(block, 5 * 12, MAX_BLOCK_MINUTES).astype(np.int64)
+
+    # Bank times of the line's hub, staggered between hubs
+    bank_spacing = 1440 / n_banks
+    bank = (rng.integers(n_banks, size=n_flights) * bank_spacing + hub_index * bank_spacing / len(hubs)).astype(np.int64)
+    hub_offset = rng.integers(0, bank_width // 5 + 1, size=n_flights) * 5
+    std = np.where(outbound, bank + hub_offset, bank - (hub_offset + 15) - block)
+    std = (np.round(std / 5) * 5).astype(np.int64) % 1440
+    sta = (std + block) % 1440
+
+    patterns = np.array(list(frequency_patterns), dtype=object)
+    weights = np.array(list(frequency_patterns.values()), dtype=float)
+    dep_days = patterns[rng.choice(len(patterns), size=n_flights, p=weights / weights.sum())]
+
+    widebody = block > 6 * 60
+    return pd.DataFrame({
+        'Aln': 'SYN',
+        'Flt': [f'SY{i:06d}' for i in range(1, n_flights + 1)],
+        'Orig': codes[orig],
+        'STD': MINUTE_TIMES[std],
+        'DLcl': MINUTE_TIMES[(std + offsets[orig]) % 1440],
+        'Dest': codes[dest],
+        'STA': MINUTE_TIMES[sta],
+        'ALcl': MINUTE_TIMES[(sta + offsets[dest]) % 1440],
+        'Blk Hrs': MINUTE_TIMES[block],
+        'Dep Day': dep_days,
+        'Subfl': np.where(widebody, 'B789', 'A320'),
+        'Seats': np.where(widebody, 290, 174),
+        'Codeshare': codes[dest],
+        'Traffic Restrictions (if any)': 'G (default)',
+    })
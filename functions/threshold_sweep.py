@@ -0,0 +1,124 @@
+import itertools
+import numpy as np
+import pandas as pd
+from functions.bitmask_connections import build_bitmask_candidates
+from functions.day_mask import mask_day_count
+from utils import config
+
+
+class _SortedConnectionTimes:
+    """Connection times sorted once, with cumulative day weights, answering range counts and medians by binary search."""
+
+    __slots__ = ('times', 'cum_weights')
+
+    def __init__(self, times, weights):
+        order = np.argsort(times, kind='stable')
+        self.times = times[order]
+        self.cum_weights = np.concatenate([[0], np.cumsum(weights[order])])
+
+    def _bounds(self, lower, upper, upper_inclusive):
+        start = np.searchsorted(self.times, lower, side='left')
+        stop = np.searchsorted(self.times, upper, side='right' if upper_inclusive else 'left')
+        return start, np.maximum(stop, start)
+
+    def count(self, lower, upper, upper_inclusive = True):
+        # Weighted number of times in [lower, upper] (or [lower, upper) if not upper_inclusive)
+        start, stop = self._bounds(lower, upper, upper_inclusive)
+        return self.cum_weights[stop] - self.cum_weights[start]
+
+    def median(self, lower, upper, upper_inclusive = True):
+        # Median of the times in the range, each repeated by its weight, NaN for an empty range
+        start, stop = self._bounds(lower, upper, upper_inclusive)
+        first = self.cum_weights[start]
+        n = self.cum_weights[stop] - first
+        if len(self.times) == 0:
+            return np.full(np.shape(n), np.nan)
+
+        # The k-th expanded value (0-based) is the first sorted time whose cumulative weight exceeds k
+        cum = self.cum_weights[1:]
+        low = self.times[np.minimum(np.searchsorted(cum, first + np.maximum(n - 1, 0) // 2, side='right'), len(cum) - 1)]
+        high = self.times[np.minimum(np.searchsorted(cum, first + n // 2, side='right'), len(cum) - 1)]
+        return np.where(n > 0, (low + high) / 2, np.nan)
+
+
+def sweep_thresholds(
+    df,
+    min_connect_times = None,
+    max_connect_times = None,
+    max_missed_times = None,
+    max_circuities = None,
+    max_abs_circuities = None,
+    airport_data = None,
+    day_column = 'Dep Day'
+    ):
+    """
+    Evaluates connection statistics over a grid of connection time and circuity thresholds in one pass.
+
+    Candidate connections, their connection time and circuity are computed once at the loosest bounds
+    of the grid (with the bitmask engine). For every circuity setting the connection times of the
+    logical, missed and illogical candidates are sorted once, and all connection time thresholds are
+    then answered with binary searches over cumulative day counts instead of rebuilding connections.
+
+    Counts are connection-days per week: a connection operating on 3 days counts 3, where the
+    workbook of a normal run has one row for it. They do not depend on how the engines group
+    connections into rows, so the columns are named '... connection-days'. The median CT is taken
+    over the same connection-days, each connection weighted by its number of operating days.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, one row per schedule line, with the movement flag and time
+        columns converted to fractions of day (as for build_and_filter_connections_bitmask).
+    min_connect_times (list): Minimum connection times to evaluate (fractions of day). Defaults to config.
+    max_connect_times (list): Maximum connection times to evaluate (fractions of day). Defaults to config.
+    max_missed_times (list): Lower bounds of missed connection times (fractions of day). Defaults to config.
+    max_circuities (list): Maximum circuities to evaluate. Defaults to config.
+    max_abs_circuities (list): Maximum absolute circuities to evaluate (km). Defaults to config.
+    airport_data (dict or AirportRegistry): Airport data keyed by code, used for circuity. The shared airport registry if None.
+    day_column (str): Column holding the operating days of each line.
+
+    Returns:
+    pandas.DataFrame: One row per parameter combination, with the thresholds (CTs in minutes), the number of
+    logical, missed and illogical connection-days and the median CT of logical connection-days in minutes.
+    """
+    min_connect_times = np.atleast_1d(config.MIN_CONNECT_TIME if min_connect_times is None else min_connect_times).astype(float)
+    max_connect_times = np.atleast_1d(config.MAX_CONNECT_TIME if max_connect_times is None else max_connect_times).astype(float)
+    max_missed_times = np.atleast_1d(config.MAX_MISSED_CONNECT_TIME if max_missed_times is None else max_missed_times).astype(float)
+    max_circuities = np.atleast_1d(config.MAX_CIRCUITY if max_circuities is None else max_circuities).astype(float)
+    max_abs_circuities = np.atleast_1d(config.MAX_ABS_CIRCUITY if max_abs_circuities is None else max_abs_circuities).astype(float)
+
+    # Loosest window covering every combination
+    window_lower = min(max_missed_times.min(), min_connect_times.min())
+    window_upper = max(max_connect_times.max(), min_connect_times.max())
+    df_connections = build_bitmask_candidates(df, window_lower, window_upper, airport_data, day_column)
+
+    # Remove connections that depart and arrive at the same station
+    df_connections = df_connections[df_connections['Orig_arr'] != df_connections['Dest_dep']]
+
+    connection_time = df_connections['Connection_time'].to_numpy(dtype=float)
+    circuity = df_connections['Circuity'].to_numpy(dtype=float)
+    abs_circuity = df_connections['Circuity (abs)'].to_numpy(dtype=float)
+    weights = mask_day_count(df_connections['Inbound Days Mask'].to_numpy())
+
+    results = []
+    for max_circuity, max_abs_circuity in itertools.product(max_circuities, max_abs_circuities):
+        # Same circuity rules as classify_connections
+        within_x = circuity <= max_circuity
+        within_abs = abs_circuity <= max_abs_circuity
+        logical = _SortedConnectionTimes(connection_time[within_x | within_abs], weights[within_x | within_abs])
+        missed = _SortedConnectionTimes(connection_time[within_x & within_abs], weights[within_x & within_abs])
+        illogical = _SortedConnectionTimes(connection_time[~within_x | ~within_abs], weights[~within_x | ~within_abs])
+
+        for max_connect_time, max_missed_time in itertools.product(max_connect_times, max_missed_times):
+            # All minimum connection times at once
+            results.append(pd.DataFrame({
+                'Min CT (min)': min_connect_times * 1440,
+                'Max CT (min)': max_connect_time * 1440,
+                'Max missed CT (min)': max_missed_time * 1440,
+                'Max circuity': max_circuity,
+                'Max abs circuity (km)': max_abs_circuity,
+                'Logical connection-days': logical.count(min_connect_times, max_connect_time),
+                'Missed connection-days': missed.count(max_missed_time, min_connect_times, upper_inclusive=False),
+                'Illogical connection-days': illogical.count(min_connect_times, max_connect_time),
+                'Median CT (min)': logical.median(min_connect_times, max_connect_time) * 1440,
+            }))
+
+    return pd.concat(results, ignore_index=True)
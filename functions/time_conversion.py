@@ -1,6 +1,22 @@
+import datetime
+import re
 from functools import lru_cache
+import numpy as np
+import pandas as pd
+from classes.timezone_table import TimezoneTable
+from functions.day_mask import days_to_mask
 
-@lru_cache(maxsize=None)  # Infinite cache size. Adjust as needed.
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# 'HH:MM' for every minute of the day, indexed by minute
+MINUTE_STRINGS = np.array([f"{hours:02d}:{minutes:02d}" for hours in range(24) for minutes in range(60)], dtype=object)
+
+# Columns holding durations rather than times of day, a block of 24 hours or more stays that long
+DURATION_COLUMNS = ['Blk Hrs']
+
+TIME_STRING_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})(?::(\d{2}))?')
+
+@lru_cache(maxsize=4096)  # Bounded, the inputs are arbitrary floats. Use day_fractions_to_time_strings for columns
 def convert_decimal_to_time(decimal_time):
     sign = "-" if decimal_time < 0 else ""
     total_minutes = round(abs(decimal_time) * 24 * 60)
@@ -16,20 +32,105 @@ def datetime_to_day_fraction(dt):
     total_seconds_in_day = 24 * 60 * 60
     return total_seconds / total_seconds_in_day
 
-def convert_time_columns_to_fraction(df, columns):
+def day_fractions_to_time_strings(values):
+    """
+    Formats a whole column of day fractions as "HH:MM" strings rounded to 5 minutes,
+    with the same rules as convert_decimal_to_time.
+
+    Parameters:
+    values (array-like): Day fractions (may be negative or above 1).
+
+    Returns:
+    numpy.ndarray: Object array of strings, None where the input is missing.
+    """
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    safe = np.where(missing, 0.0, values)
+
+    total_minutes = np.round(np.abs(safe) * 24 * 60)
+    # Rounding to the nearest 5 minutes, modulo 24 hours
+    total_minutes = (np.round(total_minutes / 5) * 5).astype(np.int64) % (24 * 60)
+
+    strings = MINUTE_STRINGS[total_minutes]
+    negative = safe < 0
+    if negative.any():
+        strings = strings.copy()
+        strings[negative] = '-' + strings[negative]
+    strings[missing] = None
+    return strings
+
+def _seconds_of_day(value, duration = False):
+    # Seconds since midnight for one cell: time/datetime/Timestamp, timedelta, 'HH:MM[:SS]' string or
+    # Excel day fraction. Durations keep whole days, times of day wrap at midnight
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+        return np.nan
+    if hasattr(value, 'hour'):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    if isinstance(value, (datetime.timedelta, np.timedelta64)):
+        seconds = np.floor(pd.Timedelta(value).total_seconds())
+        return seconds if duration else seconds % SECONDS_PER_DAY
+    if isinstance(value, (int, float, np.number)):
+        seconds = round(float(value) * SECONDS_PER_DAY)
+        return seconds if duration else seconds % SECONDS_PER_DAY
+    if isinstance(value, str):
+        match = TIME_STRING_PATTERN.match(value)
+        if match:
+            hours, minutes, seconds = match.groups()
+            seconds = int(hours) * 3600 + int(minutes) * 60 + int(seconds or 0)
+            return seconds if duration else seconds % SECONDS_PER_DAY
+        return _seconds_of_day(pd.Timestamp(value))
+    raise TypeError(f"Cannot convert {value!r} to a time of day")
+
+def column_to_day_fraction(column, duration = False):
+    """
+    Converts a whole column of times of day, or of durations, to fractions of day.
+
+    Accepts datetime.time, datetime/Timestamp (date part ignored), timedelta, "HH:MM[:SS]" strings
+    and Excel day fractions, also mixed in one column. Datetime, timedelta and numeric columns are
+    converted with array arithmetic. Object columns are factorized first, so only the distinct
+    values (a few hundred for a schedule on a 5-minute grid) are parsed one by one.
+
+    Parameters:
+    column (pandas.Series): The column to convert.
+    duration (bool): The column holds durations (e.g. block hours), kept whole when they reach a
+        day or more. Times of day wrap at midnight.
+
+    Returns:
+    pandas.Series: Fractions of day, as float64.
+    """
+    if pd.api.types.is_datetime64_any_dtype(column):
+        seconds = (column - column.dt.floor('D')).dt.total_seconds().to_numpy()
+        seconds = np.floor(seconds)
+    elif pd.api.types.is_timedelta64_dtype(column):
+        seconds = np.floor(column.dt.total_seconds().to_numpy())
+        if not duration:
+            seconds = seconds % SECONDS_PER_DAY
+    elif pd.api.types.is_numeric_dtype(column):
+        seconds = np.round(column.to_numpy(dtype=float) * SECONDS_PER_DAY)
+        if not duration:
+            seconds = seconds % SECONDS_PER_DAY
+    else:
+        codes, uniques = pd.factorize(column, use_na_sentinel=True)
+        unique_seconds = np.array([_seconds_of_day(value, duration) for value in uniques], dtype=float)
+        seconds = np.append(unique_seconds, np.nan)[codes]
+
+    return pd.Series(seconds / SECONDS_PER_DAY, index=column.index, name=column.name)
+
+def convert_time_columns_to_fraction(df, columns, durations = DURATION_COLUMNS):
     """
     Converts specified time columns of a DataFrame from datetime to fraction of day.
 
     Parameters:
     df (pandas.DataFrame): The DataFrame to process.
     columns (list): List of column names to convert.
+    durations (list): Columns among them holding durations, which do not wrap at midnight.
 
     Returns:
     pandas.DataFrame: The DataFrame with time columns converted.
     """
     for col in columns:
         if col in df.columns:
-            df[col] = df[col].apply(datetime_to_day_fraction)
+            df[col] = column_to_day_fraction(df[col], duration=col in durations)
             # print(f'{col} complete')  
     return df
 
@@ -53,3 +154,86 @@ def create_utc_floats(df, dep_day_col = 'Dep Day', std_col = 'STD', blk_hrs_col
         df['UTC Arr Float'] = df['UTC Dep Float'] + df[blk_hrs_col]
 
     return df
+
+def add_local_times(df, week_start, table = None, airport_data = None, dep_day_col = 'Dep Day', std_col = 'STD',
+                    blk_hrs_col = 'Blk Hrs', dep_local_col = 'DLcl', arr_local_col = 'ALcl'):
+    """
+    Recomputes the local departure and arrival times from UTC for a given week, with the UTC
+    offsets (DST included) in effect on each flight's date.
+
+    Day 1 is week_start. Exploded schedules use 'UTC Dep Float'/'UTC Arr Float' when present;
+    schedules with one row per line use the line's first operating day.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule, with times as fractions of day.
+    week_start (date-like): Date of day 1 (Monday) of the week.
+    table (TimezoneTable): Offsets covering the week, built for the schedule's airports if None.
+    airport_data (dict or AirportRegistry): Airport data used to build the table. The shared airport registry if None.
+    dep_day_col (str): Column name for Departure Day.
+    std_col (str): Column name for Scheduled Time of Departure (UTC).
+    blk_hrs_col (str): Column name for Block Hours.
+    dep_local_col (str): Column receiving the local departure time.
+    arr_local_col (str): Column receiving the local arrival time.
+
+    Returns:
+    pandas.DataFrame: The DataFrame with the local time columns replaced, as fractions of day.
+    """
+    week_start = pd.Timestamp(week_start).normalize()
+    if table is None:
+        airports = pd.unique(np.concatenate([df['Orig'].to_numpy(dtype=object), df['Dest'].to_numpy(dtype=object)]))
+        table = TimezoneTable.build(airports, week_start, week_start + pd.Timedelta(days=7), airport_data)
+
+    if 'UTC Dep Float' in df.columns and 'UTC Arr Float' in df.columns:
+        dep_float = df['UTC Dep Float'].to_numpy(dtype=float)
+        arr_float = df['UTC Arr Float'].to_numpy(dtype=float)
+    else:
+        mask = days_to_mask(df[dep_day_col])
+        first_day = np.where(mask > 0, np.log2(mask & -mask) + 1, np.nan)
+        dep_float = first_day + df[std_col].to_numpy(dtype=float)
+        arr_float = dep_float + df[blk_hrs_col].to_numpy(dtype=float)
+
+    start = week_start.to_datetime64().astype('datetime64[m]')
+    df[dep_local_col] = local_day_fractions(table, df['Orig'], start, dep_float - 1)
+    df[arr_local_col] = local_day_fractions(table, df['Dest'], start, arr_float - 1)
+    return df
+
+def local_day_fractions(table, airports, origin, days):
+    """
+    Converts UTC times, given as days from an origin date, to local times of day.
+
+    Parameters:
+    table (TimezoneTable): Offsets covering the times.
+    airports (array-like): Airport code of every time.
+    origin (numpy.datetime64): UTC date the times count from.
+    days (array-like): Days (with fractions) from origin, NaN where there is no time.
+
+    Returns:
+    numpy.ndarray: Local times as fractions of day, rounded to the minute, NaN where days is NaN.
+    """
+    days = np.asarray(days, dtype=float)
+    valid = ~np.isnan(days)
+    utc = np.asarray(origin, dtype='datetime64[m]') + np.round(days[valid] * 1440).astype(np.int64).astype('timedelta64[m]')
+    local = table.to_local(np.asarray(airports, dtype=object)[valid], utc)
+    values = np.full(len(days), np.nan)
+    values[valid] = (local - local.astype('datetime64[D]')) / np.timedelta64(1, 'm') / 1440
+    return values
+
+
+def schedule_reference_week(df, eff_col = 'Eff'):
+    """
+    Finds the reference week of a dated schedule: the Monday of the week of its earliest line date.
+
+    Parameters:
+    df (pandas.DataFrame): The schedule.
+    eff_col (str): Column holding the first date of each line.
+
+    Returns:
+    pandas.Timestamp: Date of day 1 (Monday) of the week, None if the schedule has no line dates.
+    """
+    if eff_col not in df.columns:
+        return None
+    first = pd.to_datetime(df[eff_col]).min()
+    if pd.isna(first):
+        return None
+    first = first.normalize()
+    return first - pd.Timedelta(days=first.dayofweek)
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+# Slack added to the search window so that float rounding in (dep - arr) never drops a
+# pair that the exact Connection_time filters would keep. About 0.1 seconds in day fractions.
+WINDOW_TOLERANCE = 1e-6
+
+
+def window_join_indices(
+    arr_station,
+    arr_time,
+    dep_station,
+    dep_time,
+    lower,
+    upper,
+    tolerance = WINDOW_TOLERANCE
+    ):
+    """
+    Finds, for every arrival, the departures from the same station whose time falls
+    inside [arr_time + lower, arr_time + upper].
+
+    Departures are sorted once by (station, time) and each arrival is resolved with two
+    binary searches, so the work grows with the number of matching pairs rather than
+    with arrivals x departures.
+
+    Parameters:
+    arr_station (array-like): Station of each arrival (where it lands).
+    arr_time (array-like): Arrival time of each arrival, as a float.
+    dep_station (array-like): Station of each departure (where it leaves from).
+    dep_time (array-like): Departure time of each departure, as a float.
+    lower (float): Lower bound of (dep_time - arr_time).
+    upper (float): Upper bound of (dep_time - arr_time).
+    tolerance (float): Slack added on both sides of the window.
+
+    Returns:
+    tuple: Two integer arrays (arrival positions, departure positions), ordered by arrival
+    position and then by departure position, i.e. the order a merge would produce.
+    """
+    arr_time = np.asarray(arr_time, dtype=float)
+    dep_time = np.asarray(dep_time, dtype=float)
+    empty = np.empty(0, dtype=np.intp)
+    if len(arr_time) == 0 or len(dep_time) == 0:
+        return empty, empty
+
+    # Encode stations on a shared integer scale so both sides are comparable
+    codes, _ = pd.factorize(np.concatenate([np.asarray(arr_station, dtype=object),
+                                            np.asarray(dep_station, dtype=object)]))
+    arr_code = codes[:len(arr_time)].astype(float)
+    dep_code = codes[len(arr_time):].astype(float)
+
+    # Place each station on its own segment of the number line: code * span + (time - origin).
+    # The span is wider than any time offset plus the window, so searches never cross stations.
+    finite = np.concatenate([arr_time[np.isfinite(arr_time)], dep_time[np.isfinite(dep_time)]])
+    if len(finite) == 0:
+        return empty, empty
+    origin = finite.min() - abs(lower) - abs(upper) - 1
+    span = 2 ** np.ceil(np.log2(finite.max() - origin + abs(lower) + abs(upper) + 2))
+
+    dep_key = dep_code * span + (dep_time - origin)
+    arr_key = arr_code * span + (arr_time - origin)
+
+    dep_order = np.argsort(dep_key, kind='stable')
+    dep_key_sorted = dep_key[dep_order]
+
+    # Missing times or stations (NaN keys / code -1) never match anything
+    valid = np.isfinite(arr_key) & (arr_code >= 0)
+    start = np.zeros(len(arr_key), dtype=np.intp)
+    stop = np.zeros(len(arr_key), dtype=np.intp)
+    start[valid] = np.searchsorted(dep_key_sorted, arr_key[valid] + lower - tolerance, side='left')
+    stop[valid] = np.searchsorted(dep_key_sorted, arr_key[valid] + upper + tolerance, side='right')
+    counts = np.maximum(stop - start, 0)
+
+    total = counts.sum()
+    if total == 0:
+        return empty, empty
+
+    # Expand the [start, stop) ranges into flat (arrival, departure) pairs
+    arr_idx = np.repeat(np.arange(len(arr_key)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    dep_idx = dep_order[np.repeat(start, counts) + offsets]
+
+    # Restore merge order: arrival first, then departure in its original position
+    order = np.lexsort((dep_idx, arr_idx))
+    return arr_idx[order], dep_idx[order]
+
+
+def take_pairs(df_arr, df_dep, arr_idx, dep_idx, suffixes = ('_arr', '_dep')):
+    """
+    Materialises arrival/departure position pairs into a merged-style DataFrame.
+
+    Parameters:
+    df_arr (pandas.DataFrame): DataFrame of arrivals.
+    df_dep (pandas.DataFrame): DataFrame of departures.
+    arr_idx (numpy.ndarray): Positions into df_arr.
+    dep_idx (numpy.ndarray): Positions into df_dep.
+    suffixes (tuple): Suffixes applied to overlapping column names.
+
+    Returns:
+    pandas.DataFrame: Arrival columns followed by departure columns, with a fresh RangeIndex.
+    """
+    overlap = set(df_arr.columns) & set(df_dep.columns)
+    left = df_arr.iloc[arr_idx].reset_index(drop=True)
+    right = df_dep.iloc[dep_idx].reset_index(drop=True)
+    left.columns = [f'{col}{suffixes[0]}' if col in overlap else col for col in left.columns]
+    right.columns = [f'{col}{suffixes[1]}' if col in overlap else col for col in right.columns]
+    return pd.concat([left, right], axis=1)
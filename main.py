@@ -1,30 +1,231 @@
-from functions.import_data import import_airport_data, import_schedule
-from functions.explode_schedule import explode_schedule
-from functions.data_enrich import add_movement_flag, add_day_eight
-from functions.time_conversion import convert_time_columns_to_fraction, create_utc_floats
+from functions.import_data import import_schedule
 from functions.build_connections import build_and_filter_connections
-from functions.connections_to_excel import export_connections_to_excel
-from utils.config import HUB, time_columns
-import time
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.incremental_connections import build_connections_incremental, incremental_state_path, load_incremental_state, save_incremental_state
+from functions.multi_hub import build_and_filter_connections_multi_hub
+from functions.connections_export import export_connections, OUTPUT_FORMATS, STREAMING_FORMATS
+from functions.dated_season import build_connections_dated
+from functions.preprocess import preprocess_schedule
+from functions.schedule_compare import compare_schedules, export_schedule_diff
+from functions.query_service import serve as serve_connections
+from functions.cache import cached_frame, CACHE_STATS
+from functions.schedule_schema import SCHEDULE_SCHEMA
+from classes.airport import get_airport_registry
+from utils.config import HUB, REF_DATE, ROOT_DIR, time_columns
+from utils.instrumentation import RunReport
+import argparse
+import os
+
+SCHEDULE_PATH, SHEET_NAME = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx'), '2030'
+ENGINES = ['exploded', 'bitmask']
+
+
+def _run_report(report_path, profile_stage, trace_memory):
+    # Every stage is timed, with its rows, memory and cache hits. profile_stage runs one stage under cProfile.
+    # Leaving the with block stops memory tracing, also when a stage fails
+    return RunReport(
+        name=f'{SCHEDULE_PATH}:{SHEET_NAME}',
+        caches={'schedule cache': CACHE_STATS},
+        trace_memory=trace_memory,
+        profile_stage=profile_stage,
+        profile_path=f'{os.path.splitext(report_path)[0]}_{profile_stage}.prof' if profile_stage else None,
+    )
+
+
+def _preprocessed_schedule(report, engine, use_cache):
+    # With the cache, repeat runs on an unchanged file skip both the Excel parsing and the pre-processing
+    stage = report.stage
+    if use_cache:
+        return stage('preprocessed_schedule', cached_frame, 'preprocessed', SCHEDULE_PATH, (SHEET_NAME, engine, HUB, time_columns, SCHEDULE_SCHEMA, REF_DATE),
+                     lambda: preprocess_schedule(stage('import_schedule', import_schedule, SCHEDULE_PATH, sheet_name=SHEET_NAME, use_cache=True), engine, report))
+    df = stage('import_schedule', import_schedule, SCHEDULE_PATH, sheet_name=SHEET_NAME)
+    return preprocess_schedule(df, engine, report)
+
 
 #Main function
 
-def main(): 
-    
-    # Import data
-    airport_data = import_airport_data()
-    df = import_schedule('data/schedule_v8.xlsx', sheet_name='2030')
-    
-    # Pre-process connections
-    df = explode_schedule(df)
-    df = add_movement_flag(df)
-    df = add_day_eight(df)
-    df = convert_time_columns_to_fraction(df, time_columns)
-    df = create_utc_floats(df)
-    
-    df_logical_connections, df_missed_connections, df_illogical_connections = build_and_filter_connections(df)
-    
-    export_connections_to_excel (df_logical_connections, df_missed_connections, df_illogical_connections) 
-            
+def main(engine=None, use_cache=True, hubs=None, output_format='xlsx', incremental=False,
+         report_path='Output/run_report.json', report_sheet=False, profile_stage=None, trace_memory=False):
+    """
+    Builds the weekly connections of the schedule and exports them.
+
+    Parameters:
+    engine (str): 'exploded' or 'bitmask', 'bitmask' for incremental builds and 'exploded' otherwise if None.
+    use_cache (bool): Reuse the pre-processed schedule while the schedule file is unchanged.
+    hubs (list): Build the connections of several hubs, one worker process per hub.
+    output_format (str): One of OUTPUT_FORMATS.
+    incremental (bool): Only recompute what changed since the previous run (single hub, bitmask engine).
+    report_path (str): Path of the JSON run report.
+    report_sheet (bool): Add the run report as a sheet of the Excel output.
+    profile_stage (str): Stage to run under cProfile.
+    trace_memory (bool): Record the peak memory of every stage.
+
+    Returns:
+    RunReport: The run report.
+    """
+    if incremental and hubs:
+        # The incremental state covers a single-hub build, there is no incremental multi-hub build
+        raise ValueError("incremental=True cannot be combined with hubs, incremental builds cover a single hub.")
+    if incremental and engine not in (None, 'bitmask'):
+        # Incremental builds diff the schedule line by line, which needs the line-based pre-processing
+        raise ValueError(f"incremental=True needs the 'bitmask' engine, got '{engine}'.")
+    if engine is None:
+        engine = 'bitmask' if incremental else 'exploded'
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {OUTPUT_FORMATS}.")
+
+    with _run_report(report_path, profile_stage, trace_memory) as report:
+        stage = report.stage
+
+        # Import data
+        airport_data = stage('get_airport_registry', get_airport_registry)
+        df = _preprocessed_schedule(report, engine, use_cache)
+
+        if hubs:
+            # One worker process per hub, results carry a 'Hub' column
+            df_logical_connections, df_missed_connections, df_illogical_connections = stage(
+                'build_and_filter_connections_multi_hub', build_and_filter_connections_multi_hub, df, hubs, engine=engine, airport_data=airport_data)
+        elif incremental:
+            # Line-based (bitmask) build that only recomputes what changed since the previous run
+            state_path = incremental_state_path(SCHEDULE_PATH, SHEET_NAME)
+            state = stage('load_incremental_state', load_incremental_state, state_path)
+            (df_logical_connections, df_missed_connections, df_illogical_connections), state = stage(
+                'build_connections_incremental', build_connections_incremental, df, state, airport_data=airport_data)
+            stage('save_incremental_state', save_incremental_state, state_path, state)
+        elif engine == 'bitmask':
+            df_logical_connections, df_missed_connections, df_illogical_connections = stage(
+                'build_and_filter_connections_bitmask', build_and_filter_connections_bitmask, df, airport_data=airport_data)
+        else:
+            df_logical_connections, df_missed_connections, df_illogical_connections = stage(
+                'build_and_filter_connections', build_and_filter_connections, df, airport_data=airport_data)
+
+        # Excel (regular or streaming), or Parquet/Feather/CSV files for downstream tools. The summary
+        # sheet covers the stages up to the export, the JSON report includes it
+        extra_sheets = [('Run report', report.to_frame())] if report_sheet else None
+        stage('export_connections', export_connections, df_logical_connections, df_missed_connections, df_illogical_connections,
+              output_format=output_format, extra_sheets=extra_sheets)
+
+        report.write_json(report_path)
+        report.print_summary()
+        return report
+
+
+def main_season(season_start, season_end, output_format='parquet', use_cache=True,
+                report_path='Output/run_report_dated.json', profile_stage=None, trace_memory=False):
+    """
+    Builds the connections of a dated season: lines run between their 'Eff' and 'Dis' dates, the season
+    is built week by week and streamed to files, so memory does not grow with its length.
+
+    Parameters:
+    season_start (date-like): First day of the season.
+    season_end (date-like): Last day of the season.
+    output_format (str): One of STREAMING_FORMATS.
+    use_cache (bool): Reuse the pre-processed schedule while the schedule file is unchanged.
+    report_path (str): Path of the JSON run report.
+    profile_stage (str): Stage to run under cProfile.
+    trace_memory (bool): Record the peak memory of every stage.
+
+    Returns:
+    RunReport: The run report.
+    """
+    if output_format not in STREAMING_FORMATS:
+        raise ValueError(f"Dated seasons are streamed to files, output_format must be one of {STREAMING_FORMATS}, got '{output_format}'.")
+
+    with _run_report(report_path, profile_stage, trace_memory) as report:
+        airport_data = report.stage('get_airport_registry', get_airport_registry)
+        # Dated seasons expand lines to their dates, which needs the line-based pre-processing
+        df = _preprocessed_schedule(report, 'bitmask', use_cache)
+        report.stage('build_connections_dated', build_connections_dated, df, season_start, season_end,
+                     output_path='Output/Connections_builder_output_dated', output_format=output_format, airport_data=airport_data)
+        report.write_json(report_path)
+        report.print_summary()
+        return report
+
+
+def main_compare(sheets, engine='bitmask', report_path='Output/run_report_compare.json', profile_stage=None, trace_memory=False):
+    """
+    Compares scenario sheets of the schedule workbook, built in parallel: gained, lost and retimed
+    connections and per-market deltas against the first sheet, the baseline.
+
+    Parameters:
+    sheets (list): Sheet names, the baseline first.
+    engine (str): 'exploded' or 'bitmask'.
+    report_path (str): Path of the JSON run report.
+    profile_stage (str): Stage to run under cProfile.
+    trace_memory (bool): Record the peak memory of every stage.
+
+    Returns:
+    RunReport: The run report.
+    """
+    if len(sheets) < 2:
+        raise ValueError(f"A comparison needs a baseline and at least one other sheet, got {list(sheets)}.")
+
+    with _run_report(report_path, profile_stage, trace_memory) as report:
+        airport_data = report.stage('get_airport_registry', get_airport_registry)
+        diffs = report.stage('compare_schedules', compare_schedules, {sheet: (SCHEDULE_PATH, sheet) for sheet in sheets},
+                             engine=engine, airport_data=airport_data)
+        report.stage('export_schedule_diff', export_schedule_diff, diffs)
+        report.write_json(report_path)
+        report.print_summary()
+        return report
+
+
+def main_serve(port=8765, engine='bitmask'):
+    """
+    Local query service: connections built once, indexed by O&D, day and time, and rebuilt in the
+    background when the schedule file changes. Runs until interrupted.
+
+    Parameters:
+    port (int): Port to listen on.
+    engine (str): 'exploded' or 'bitmask'.
+    """
+    serve_connections(SCHEDULE_PATH, SHEET_NAME, port=port, engine=engine, airport_data=get_airport_registry())
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description='Builds the connections of the schedule.')
+    commands = parser.add_subparsers(dest='command')
+
+    build = commands.add_parser('build', help='Weekly connections (the default).')
+    build.add_argument('--engine', choices=ENGINES)
+    build.add_argument('--no-cache', action='store_true', help='Import and pre-process the schedule again.')
+    build.add_argument('--hubs', nargs='+', help='Build several hubs, one worker process per hub.')
+    build.add_argument('--output-format', choices=OUTPUT_FORMATS, default='xlsx')
+    build.add_argument('--incremental', action='store_true', help='Only recompute what changed since the previous run.')
+    build.add_argument('--report-sheet', action='store_true', help='Add the run report to the Excel output.')
+    build.add_argument('--profile-stage', help='Stage to run under cProfile.')
+    build.add_argument('--trace-memory', action='store_true')
+
+    season = commands.add_parser('season', help='Dated season, streamed to files.')
+    season.add_argument('start', help='First day of the season, YYYY-MM-DD.')
+    season.add_argument('end', help='Last day of the season, YYYY-MM-DD.')
+    season.add_argument('--output-format', choices=STREAMING_FORMATS, default='parquet')
+    season.add_argument('--no-cache', action='store_true', help='Import and pre-process the schedule again.')
+    season.add_argument('--profile-stage', help='Stage to run under cProfile.')
+    season.add_argument('--trace-memory', action='store_true')
+
+    compare = commands.add_parser('compare', help='Scenario sheets against a baseline sheet.')
+    compare.add_argument('sheets', nargs='+', help='Sheet names, the baseline first.')
+    compare.add_argument('--engine', choices=ENGINES, default='bitmask')
+
+    serve = commands.add_parser('serve', help='Local HTTP query service.')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--engine', choices=ENGINES, default='bitmask')
+
+    args = parser.parse_args(argv)
+    if args.command == 'season':
+        return main_season(args.start, args.end, output_format=args.output_format, use_cache=not args.no_cache,
+                           profile_stage=args.profile_stage, trace_memory=args.trace_memory)
+    if args.command == 'compare':
+        return main_compare(args.sheets, engine=args.engine)
+    if args.command == 'serve':
+        return main_serve(port=args.port, engine=args.engine)
+    if args.command is None:
+        return main()
+    return main(engine=args.engine, use_cache=not args.no_cache, hubs=args.hubs, output_format=args.output_format,
+                incremental=args.incremental, report_sheet=args.report_sheet, profile_stage=args.profile_stage,
+                trace_memory=args.trace_memory)
+
+
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,80 @@
+import datetime
+import unittest
+import numpy as np
+import pandas as pd
+from classes.aircraft import Aircraft
+from classes.ground_time import GroundTime
+from functions.rotation_builder import build_rotations, dated_legs
+from functions.synthetic_schedule import generate_airport_data, generate_schedule
+
+
+def shuttle(days = '1234567'):
+    # One A320 pair: NUM 06:00 -> LHR 08:00, LHR 09:00 -> NUM 11:00
+    return pd.DataFrame({
+        'Flt': ['NX1', 'NX2'],
+        'Orig': ['NUM', 'LHR'],
+        'Dest': ['LHR', 'NUM'],
+        'STD': [datetime.time(6, 0), datetime.time(9, 0)],
+        'Blk Hrs': [datetime.time(2, 0), datetime.time(2, 0)],
+        'Dep Day': [days, days],
+        'Subfl': ['A320', 'A320'],
+    })
+
+
+class TestGroundTime(unittest.TestCase):
+
+    def test_lookup_falls_back_to_equipment_station_and_default(self):
+        ground_times = GroundTime.from_frame(pd.DataFrame({
+            'Subfl': ['A320', 'B789', None, None],
+            'Station': ['LHR', None, 'NUM', None],
+            'Min ground time': [35, 90, 50, 40],
+        }))
+        self.assertEqual(ground_times.minutes('A320', 'LHR'), 35)
+        self.assertEqual(ground_times.minutes('B789', 'LHR'), 90)
+        self.assertEqual(ground_times.minutes('A320', 'NUM'), 50)
+        self.assertEqual(ground_times.minutes('A320', 'JFK'), 40)
+        np.testing.assert_array_equal(ground_times.minutes_array(['A320', 'B789', 'A320'], ['LHR', 'NUM', 'LHR']), [35, 90, 35])
+
+
+class TestBuildRotations(unittest.TestCase):
+
+    def test_dated_legs(self):
+        legs = dated_legs(shuttle('1.3....'))
+        self.assertEqual(legs['Day'].tolist(), [1, 3, 1, 3])
+        self.assertEqual(legs['Dep (min)'].tolist(), [360, 2 * 1440 + 360, 540, 2 * 1440 + 540])
+        self.assertEqual(legs['Arr (min)'].tolist(), [480, 2 * 1440 + 480, 660, 2 * 1440 + 660])
+
+    def test_one_aircraft_flies_the_shuttle(self):
+        plan = build_rotations(shuttle())
+        self.assertEqual(len(plan), 1)
+        aircraft = plan[0]
+        self.assertIsInstance(aircraft, Aircraft)
+        self.assertEqual((aircraft.subfleet, aircraft.start_station, len(aircraft)), ('A320', 'NUM', 14))
+        df = plan.to_frame()
+        self.assertEqual(df['Flt'].tolist(), ['NX1', 'NX2'] * 7)
+        self.assertEqual(df['Ground time (min)'].iloc[:3].tolist(), [60, 19 * 60, 60])
+
+    def test_longer_ground_time_needs_a_second_aircraft(self):
+        # 90 minutes at LHR: the 08:00 arrival is only ready for the next day's 09:00 departure
+        plan = build_rotations(shuttle(), GroundTime(by_station={'LHR': 90}))
+        self.assertEqual(plan.aircraft_counts().to_dict(), {'A320': 2})
+        self.assertEqual(sorted(plan.aircraft_start_station.tolist()), ['LHR', 'NUM'])
+        with self.assertRaises(IndexError):
+            plan[2]
+
+    def test_rotations_are_feasible(self):
+        airport_data = generate_airport_data(30, seed=1)
+        schedule = generate_schedule(airport_data, 400, seed=1)
+        ground_times = GroundTime(by_equipment={'B789': 90})
+        df = build_rotations(schedule, ground_times).to_frame()
+        self.assertEqual(len(df), len(dated_legs(schedule)))
+
+        # Every aircraft flies its legs in order, from where the previous one landed, after its ground time
+        follows = (df['Aircraft'].to_numpy()[1:] == df['Aircraft'].to_numpy()[:-1])
+        np.testing.assert_array_equal(df['Orig'].to_numpy()[1:][follows], df['Dest'].to_numpy()[:-1][follows])
+        minimum = ground_times.minutes_array(df['Subfl'], df['Dest'])[:-1][follows]
+        self.assertTrue((df['Ground time (min)'].to_numpy()[:-1][follows] >= minimum).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
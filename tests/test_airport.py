@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from classes.airport import Airport, AirportRegistry, get_airport_registry
+from functions.circuity import circuity_arrays
+from functions.distance import airport_coordinates, great_circle_distance
+
+AIRPORT_DATA = {
+    'NUM': {'Latitude': 41.3, 'Longitude': 2.08, 'Timezone': 'Europe/Madrid'},
+    'LHR': {'Latitude': 51.47, 'Longitude': -0.45, 'Timezone': 'Europe/London'},
+    'JFK': {'Latitude': 40.64, 'Longitude': -73.78, 'Timezone': 'America/New_York'},
+    'XXX': {'Latitude': 0.0, 'Longitude': 0.0, 'Timezone': None},
+}
+
+
+class TestAirportRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = AirportRegistry.from_airport_data(AIRPORT_DATA)
+
+    def test_lookup(self):
+        self.assertEqual(len(self.registry), 4)
+        self.assertIn('LHR', self.registry)
+        self.assertNotIn('CDG', self.registry)
+        airport = self.registry['JFK']
+        self.assertIsInstance(airport, Airport)
+        self.assertEqual((airport.code, airport.latitude, airport.longitude, airport.timezone),
+                         ('JFK', 40.64, -73.78, 'America/New_York'))
+        self.assertEqual(self.registry['XXX'].timezone, '')
+
+    def test_ids_and_missing_codes(self):
+        np.testing.assert_array_equal(self.registry.ids(['JFK', 'NUM', 'JFK']), [2, 0, 2])
+        with self.assertRaisesRegex(KeyError, 'CDG'):
+            self.registry.ids(['NUM', 'CDG'])
+
+    def test_save_and_memory_mapped_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'registry.npy')
+            self.registry.save(path)
+            loaded = AirportRegistry.load(path)
+            self.assertIsInstance(loaded.latitudes, np.memmap)
+            np.testing.assert_array_equal(loaded.codes, self.registry.codes)
+            self.assertEqual(repr(loaded['LHR']), repr(self.registry['LHR']))
+            del loaded
+
+    def test_subset(self):
+        subset = self.registry.subset(['LHR', 'NUM'])
+        self.assertEqual(subset.codes.tolist(), ['LHR', 'NUM'])
+        self.assertEqual(subset['NUM'].longitude, 2.08)
+
+    def test_with_distances(self):
+        subset = self.registry.subset(['LHR', 'JFK', 'NUM'])
+        self.assertIsNone(subset.distances)
+        with_distances = subset.with_distances()
+        self.assertEqual(with_distances.distances.shape, (3, 3))
+        self.assertAlmostEqual(with_distances.distances[0, 1], great_circle_distance('LHR', 'JFK', AIRPORT_DATA))
+        triples = (['LHR', 'NUM', 'JFK'], ['JFK', 'LHR', 'NUM'], ['NUM', 'JFK', 'LHR'])
+        np.testing.assert_allclose(circuity_arrays(*triples, with_distances), circuity_arrays(*triples, AIRPORT_DATA))
+        with self.assertRaisesRegex(KeyError, 'XXX'):
+            circuity_arrays(['LHR'], ['XXX'], ['NUM'], with_distances)
+
+    def test_registry_and_dict_give_same_distances(self):
+        for data in (AIRPORT_DATA, self.registry):
+            lats, lons = airport_coordinates(['LHR', 'JFK'], data)
+            np.testing.assert_array_equal(lats, [51.47, 40.64])
+            np.testing.assert_array_equal(lons, [-0.45, -73.78])
+        self.assertAlmostEqual(great_circle_distance('LHR', 'JFK', self.registry),
+                               great_circle_distance('LHR', 'JFK', AIRPORT_DATA))
+        np.testing.assert_array_equal(circuity_arrays(['LHR'], ['JFK'], ['NUM'], self.registry),
+                                      circuity_arrays(['LHR'], ['JFK'], ['NUM'], AIRPORT_DATA))
+
+    def test_shared_registry_is_loaded_once(self):
+        registry = get_airport_registry()
+        self.assertIs(get_airport_registry(), registry)
+        self.assertIn('NUM', registry)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from functions.bank_structure_matplotlib import bank_profile, detect_banks, plot_bank_structure, PROFILE_COUNTS
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+from utils.config import ROOT_DIR
+
+SCHEDULE_PATH = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx')
+WEEK = 7 * 1440
+
+
+def two_bank_schedule():
+    # Every day at NUM: 4 arrivals 07:00-07:30 feeding 4 departures 08:30-09:00, and 3 arrivals at
+    # 15:00 feeding 3 departures at 16:30. Times as UTC floats, day 1 = Monday 00:00 = 1.0
+    rows = []
+    for day in range(1, 8):
+        for minute in [420, 430, 440, 450]:
+            rows.append(('LHR', 'NUM', day + (minute - 120) / 1440, day + minute / 1440))
+        for minute in [510, 520, 530, 540]:
+            rows.append(('NUM', 'JFK', day + minute / 1440, day + (minute + 480) / 1440))
+        for _ in range(3):
+            rows.append(('CDG', 'NUM', day + 780 / 1440, day + 900 / 1440))
+            rows.append(('NUM', 'FCO', day + 990 / 1440, day + 1110 / 1440))
+    df = pd.DataFrame(rows, columns=['Orig', 'Dest', 'UTC Dep Float', 'UTC Arr Float'])
+    df['Dep Day'] = np.floor(df['UTC Dep Float']).astype(int)
+    df['Seats'] = 180
+    return df
+
+
+class TestBankProfile(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.raw = import_schedule(SCHEDULE_PATH, sheet_name='2030')
+        cls.df = preprocess_schedule(cls.raw.copy(), 'exploded')
+        cls.profile = bank_profile(cls.df)
+
+    def test_layout_and_movements(self):
+        self.assertEqual(len(self.profile), 7 * 144)
+        self.assertEqual(self.profile['Bin'].iloc[:3].tolist(), [0, 10, 20])
+        week = self.df[self.df['Dep Day'] <= 7]
+        self.assertEqual(self.profile['Arrivals'].sum(), (week['Dest'] == 'NUM').sum())
+        self.assertEqual(self.profile['Departures'].sum(), (week['Orig'] == 'NUM').sum())
+
+    def test_connecting_opportunities_match_brute_force(self):
+        week = self.df[self.df['Dep Day'] <= 7]
+        arr = np.round((week.loc[week['Dest'] == 'NUM', 'UTC Arr Float'].to_numpy(dtype=float) - 1) * 1440) % WEEK
+        dep = np.round((week.loc[week['Orig'] == 'NUM', 'UTC Dep Float'].to_numpy(dtype=float) - 1) * 1440) % WEEK
+        connection_time = (dep[None, :] - arr[:, None]) % WEEK
+        expected = ((connection_time >= 60) & (connection_time <= 240)).sum()
+        self.assertEqual(self.profile['Feeding connections'].sum(), expected)
+        self.assertEqual(self.profile['Onward connections'].sum(), expected)
+
+    def test_line_based_schedule_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'exploded'):
+            bank_profile(preprocess_schedule(self.raw.copy(), 'bitmask'))
+
+    def test_bin_minutes_must_divide_a_day(self):
+        with self.assertRaises(ValueError):
+            bank_profile(self.df, bin_minutes=7)
+
+
+class TestDetectBanks(unittest.TestCase):
+
+    def test_finds_the_banks(self):
+        banks = detect_banks(bank_profile(two_bank_schedule(), bin_minutes=5))
+        self.assertEqual(len(banks), 14)
+        self.assertEqual(banks.groupby('Day')['Bank'].max().tolist(), [2] * 7)
+        first, second = banks.iloc[0], banks.iloc[1]
+        self.assertEqual((first['Arrivals'], first['Departures'], second['Arrivals'], second['Departures']), (4, 4, 3, 3))
+        self.assertTrue(first['Start'] <= 420 < first['Arr end'] <= first['Dep start'] <= 510 < first['End'])
+        self.assertEqual(first['Feeding connections'], 16)
+
+    def test_whole_day_bins_give_one_bank_per_hub(self):
+        profile = bank_profile(two_bank_schedule(), bin_minutes=1440)
+        banks = detect_banks(profile)
+        self.assertEqual(len(banks), 1)
+        for col in PROFILE_COUNTS:
+            self.assertEqual(banks[col].iloc[0], profile[col].sum())
+
+    def test_day_filtered_profile_is_rejected(self):
+        profile = bank_profile(two_bank_schedule())
+        with self.assertRaisesRegex(ValueError, 'whole week'):
+            detect_banks(profile[profile['Day'] <= 2])
+
+    def test_empty_profile(self):
+        banks = detect_banks(bank_profile(two_bank_schedule(), hubs=['FRA']))
+        self.assertEqual(len(banks), 0)
+
+
+class TestPlotBankStructure(unittest.TestCase):
+
+    def test_plots_selected_days(self):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        profile = bank_profile(two_bank_schedule(), hubs=['NUM', 'JFK'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'banks.png')
+            fig = plot_bank_structure(profile, detect_banks(profile), days=[2, 1], output_path=path)
+            self.assertTrue(os.path.getsize(path) > 0)
+        self.assertEqual([ax.get_ylabel() for ax in fig.axes], ['NUM', 'JFK'])
+        self.assertEqual(fig.axes[0].get_xticks().tolist(), [0, 24, 48])
+        plt.close(fig)
+
+
+if __name__ == '__main__':
+    unittest.main()
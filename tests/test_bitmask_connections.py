@@ -0,0 +1,62 @@
+import contextlib
+import io
+import os
+import unittest
+import pandas as pd
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.build_connections import build_and_filter_connections, CONNECTION_KEY_COLUMNS, DAY_COLUMNS
+from functions.day_mask import days_to_mask, mask_to_days
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+from utils.config import MIN_CONNECT_TIME, ROOT_DIR
+
+SCHEDULE_PATH = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx')
+SHEETS = ['2026', '2027 phased', '2029', '2030']
+KINDS = ['logical', 'missed', 'illogical']
+WRAP = ['Inbound Dep Day (UTC)', 'Outbound Dep Day (UTC)']
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def comparable(df):
+    # The bitmask engine writes day strings as sorted day sets, the exploded engine in flight order
+    df = df[[col for col in df.columns if col not in DAY_COLUMNS or col in WRAP]].copy()
+    for col in WRAP:
+        df[col] = mask_to_days(days_to_mask(df[col]))
+    df[CONNECTION_KEY_COLUMNS] = df[CONNECTION_KEY_COLUMNS].astype(str)
+    return df.sort_values(CONNECTION_KEY_COLUMNS + WRAP, ignore_index=True)
+
+
+class TestBitmaskEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results = {}
+        for sheet in SHEETS:
+            raw = import_schedule(SCHEDULE_PATH, sheet_name=sheet)
+            exploded = quiet(build_and_filter_connections, preprocess_schedule(raw.copy(), 'exploded'), snap_seconds=True)
+            bitmask = quiet(build_and_filter_connections_bitmask, preprocess_schedule(raw.copy(), 'bitmask'))
+            cls.results[sheet] = exploded, bitmask
+
+    def test_matches_the_exploded_engine(self):
+        for sheet, (exploded, bitmask) in self.results.items():
+            for kind, expected, result in zip(KINDS, exploded, bitmask):
+                with self.subTest(sheet=sheet, kind=kind):
+                    pd.testing.assert_frame_equal(comparable(result), comparable(expected), check_dtype=False,
+                                                  check_categorical=False, check_exact=True)
+
+    def test_covers_the_week_wrap_and_every_class(self):
+        # Sunday arrivals connecting to Monday departures, and missed and illogical connections
+        logical, missed, illogical = self.results['2030'][1]
+        wraps = logical['Inbound Dep Day (UTC)'].str.contains('7') & logical['Outbound Dep Day (UTC)'].str.contains('1')
+        self.assertGreater(wraps.sum(), 0)
+        self.assertGreater(len(missed), 0)
+        self.assertGreater(len(illogical), 0)
+        self.assertTrue((missed['Connection Time (min)'] < MIN_CONNECT_TIME).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
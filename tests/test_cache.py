@@ -0,0 +1,133 @@
+import ast
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from functions import cache
+from functions.cache import cached_frame, evict, load_frame, save_frame, source_hash, CACHED_CODE
+from utils.config import ROOT_DIR
+
+# Imported by the pre-processing code without changing the frames it builds: the cache itself, the
+# configuration (passed in the cache key's params) and the airport registry (data, not code)
+NOT_CACHED_CODE = {'functions/cache.py', 'utils/config.py', 'classes/airport.py'}
+
+
+def local_imports(path):
+    # Repository modules imported by a source file, as paths relative to ROOT_DIR
+    tree = ast.parse(open(os.path.join(ROOT_DIR, path)).read())
+    package = os.path.dirname(path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module:
+            module = node.module.replace('.', '/') if node.level == 0 else f'{package}/{node.module}'
+            if os.path.exists(os.path.join(ROOT_DIR, f'{module}.py')):
+                yield f'{module}.py'
+
+
+def frame(n):
+    return pd.DataFrame({'Orig': ['NUM'] * n, 'Seats': range(n)})
+
+
+class TestCachedFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        self.source = os.path.join(self.tmp_dir.name, 'schedule.csv')
+        frame(3).to_csv(self.source, index=False)
+        self.builds = 0
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def build(self):
+        self.builds += 1
+        return pd.read_csv(self.source)
+
+    def cached(self, params = ('2030',)):
+        return cached_frame('schedule', self.source, params, self.build, cache_dir=self.cache_dir)
+
+    def test_hit_returns_stored_frame(self):
+        first = self.cached()
+        second = self.cached()
+        self.assertEqual(self.builds, 1)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_key_covers_params_content_and_version(self):
+        self.cached()
+        self.cached(('2029',))
+        self.assertEqual(self.builds, 2)
+
+        frame(4).to_csv(self.source, index=False)
+        self.assertEqual(len(self.cached()), 4)
+        self.assertEqual(self.builds, 3)
+
+        with mock.patch.object(cache, 'CACHE_VERSION', 'edited code'):
+            self.cached()
+        self.assertEqual(self.builds, 4)
+
+    def test_new_content_replaces_previous_entry(self):
+        self.cached()
+        frame(4).to_csv(self.source, index=False)
+        self.cached()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+
+class TestCacheVersion(unittest.TestCase):
+
+    def test_version_is_the_hash_of_the_cached_code(self):
+        self.assertEqual(cache.CACHE_VERSION, source_hash(CACHED_CODE))
+
+    def test_source_hash_changes_with_the_code(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, 'stage.py'), 'w') as f:
+                f.write('def stage(df):\n    return df\n')
+            before = source_hash(['stage.py'], tmp_dir)
+            self.assertEqual(source_hash(['stage.py'], tmp_dir), before)
+            with open(os.path.join(tmp_dir, 'stage.py'), 'a') as f:
+                f.write('# edited\n')
+            self.assertNotEqual(source_hash(['stage.py'], tmp_dir), before)
+
+    def test_cached_code_covers_every_module_it_imports(self):
+        # A pre-processing module importing new code must list it in CACHED_CODE
+        seen, todo = set(), ['functions/import_data.py', 'functions/preprocess.py']
+        while todo:
+            path = todo.pop()
+            if path not in seen and path not in NOT_CACHED_CODE:
+                seen.add(path)
+                todo.extend(local_imports(path))
+        self.assertEqual(sorted(seen - set(CACHED_CODE)), [])
+
+
+class TestEvict(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_evicts_least_recently_used_entries_only(self):
+        names = [f'schedule-{i:032x}-{0:032x}' for i in range(3)]
+        paths = [save_frame(name, frame(1000), cache_dir=self.cache_dir) for name in names]
+        for age, path in enumerate(reversed(paths)):
+            os.utime(path, (1000 - age, 1000 - age))
+        other = os.path.join(self.cache_dir, 'notes.txt')
+        with open(other, 'w') as f:
+            f.write('x' * 100000)
+
+        # Room for two entries: the oldest one goes, the file not written by the cache stays
+        evict(self.cache_dir, max_bytes=2 * os.path.getsize(paths[0]) + 1)
+        self.assertIsNone(load_frame(names[0], self.cache_dir))
+        self.assertIsNotNone(load_frame(names[1], self.cache_dir))
+        self.assertIsNotNone(load_frame(names[2], self.cache_dir))
+        self.assertTrue(os.path.exists(other))
+
+    def test_keeps_entry_just_written(self):
+        path = save_frame(f'schedule-{0:032x}-{0:032x}', frame(1000), cache_dir=self.cache_dir, max_bytes=1)
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
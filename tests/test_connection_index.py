@@ -0,0 +1,208 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+import numpy as np
+import pandas as pd
+from classes.connection_index import ConnectionIndex
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+from functions.query_service import ConnectionService, make_server
+from utils.config import ROOT_DIR
+
+SCHEDULE_PATH = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx')
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def connection_days(df):
+    # One row per connection and inbound day, with the inbound departure minute
+    df = df.reset_index(drop=True)
+    rows = [(i, int(day)) for i, days in enumerate(df['Inbound Dep Day (UTC)']) for day in sorted(set(days)) if day.isdigit()]
+    days = df.take([i for i, _ in rows]).reset_index(drop=True)
+    days['Day'] = [day for _, day in rows]
+    days['Minute'] = np.round(days['Inbound STD (UTC)'].to_numpy(dtype=float) * 1440).astype(int) % 1440
+    return days
+
+
+def night_origin(days):
+    # The origin with the most connections leaving between 22:00 and 02:00 UTC
+    night = days[(days['Minute'] >= 1320) | (days['Minute'] <= 120)]
+    return night['Inbound Orig Airp'].astype(object).value_counts().index[0]
+
+
+class TestConnectionIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        df = preprocess_schedule(import_schedule(SCHEDULE_PATH, sheet_name='2030'), 'bitmask')
+        cls.connections = quiet(build_and_filter_connections_bitmask, df)[0]
+        cls.index = ConnectionIndex(cls.connections)
+        cls.days = connection_days(cls.connections)
+        cls.night_orig = night_origin(cls.days)
+
+    def brute_force(self, orig = None, dest = None, days = range(1, 8), dep_from = 0, dep_to = 1439):
+        df = self.days
+        selected = df['Day'].isin(days) & df['Minute'].between(dep_from, dep_to)
+        if orig is not None:
+            selected &= df['Inbound Orig Airp'] == orig
+        if dest is not None:
+            selected &= df['Outbound Dest Airp'] == dest
+        return sorted(zip(df.loc[selected, 'Inbound Flt no'], df.loc[selected, 'Outbound Flt no'], df.loc[selected, 'Day']))
+
+    def found(self, positions):
+        records = self.index.records(positions)
+        return sorted((record['Inbound Flt no'], record['Outbound Flt no'], record['Day']) for record in records)
+
+    def test_queries_match_brute_force(self):
+        orig, dest = self.connections[['Inbound Orig Airp', 'Outbound Dest Airp']].iloc[0]
+        self.assertEqual(len(self.index), len(self.days))
+        for query in [dict(orig=orig, dest=dest), dict(orig=orig), dict(dest=dest), dict(orig=orig, days=[2, 5]),
+                      dict(orig=orig, dep_from=300, dep_to=720)]:
+            with self.subTest(**query):
+                expected = self.brute_force(**query)
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(self.found(self.index.query(**query)), expected)
+
+    def test_window_past_midnight(self):
+        orig = self.night_orig
+        # Tuesday 22:00 to 02:00 is Tuesday from 22:00 and Wednesday until 02:00
+        expected = self.brute_force(orig=orig, days=[2], dep_from=1320) + self.brute_force(orig=orig, days=[3], dep_to=120)
+        self.assertEqual(self.found(self.index.query(orig=orig, days=[2], dep_from=1320, dep_to=120)), sorted(expected))
+        # Every day: the whole week outside 02:01 to 21:59
+        every_day = self.brute_force(orig=orig, dep_from=1320) + self.brute_force(orig=orig, dep_to=120)
+        self.assertGreater(len(every_day), 0)
+        self.assertEqual(self.found(self.index.query(orig=orig, dep_from=1320, dep_to=120)), sorted(every_day))
+
+    def test_records(self):
+        record = self.index.records(self.index.query(orig=self.connections['Inbound Orig Airp'].iloc[0]), limit=1)[0]
+        row = self.connections[(self.connections['Inbound Flt no'] == record['Inbound Flt no']) &
+                               (self.connections['Outbound Flt no'] == record['Outbound Flt no'])].iloc[0]
+        self.assertIsInstance(record['Connection Time (min)'], int)
+        self.assertEqual(record['Connection Time (min)'], round(row['Connection Time (min)'] * 1440))
+        self.assertRegex(record['Inbound STD (UTC)'], r'^\d\d:\d\d$')
+
+    def test_invalid_queries(self):
+        with self.assertRaises(ValueError):
+            self.index.query()
+        with self.assertRaises(ValueError):
+            self.index.query(orig='LHR', days=[8])
+        with self.assertRaises(ValueError):
+            self.index.query(orig='LHR', dep_to=1440)
+        self.assertEqual(len(self.index.query(orig='XXX')), 0)
+
+
+class TestQueryService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = ConnectionService(SCHEDULE_PATH, '2030')
+        quiet(cls.service.rebuild)
+        cls.server = make_server(cls.service, port=0)
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.orig = night_origin(connection_days(cls.service.index.connections))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def request(self, path, method = 'GET'):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.url + path, method=method)) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            return error.code, json.load(error)
+
+    def test_query(self):
+        status, body = self.request(f'/connections?orig={self.orig.lower()}&day=2&from=06:00&to=12:00&limit=3')
+        self.assertEqual(status, 200)
+        positions = self.service.index.query(self.orig, days=[2], dep_from=360, dep_to=720)
+        self.assertEqual(body['count'], len(positions))
+        self.assertEqual(body['connections'], json.loads(json.dumps(self.service.index.records(positions, 3))))
+
+    def test_window_past_midnight(self):
+        status, body = self.request(f'/connections?orig={self.orig}&from=22:00&to=02:00')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['count'], len(self.service.index.query(self.orig, dep_from=1320, dep_to=120)))
+        self.assertGreater(body['count'], 0)
+
+    def test_bad_query(self):
+        self.assertEqual(self.request(f'/connections?orig={self.orig}&from=25:00')[0], 400)
+        self.assertEqual(self.request('/connections?day=2')[0], 400)
+        self.assertEqual(self.request('/nothing')[0], 404)
+
+    def test_rebuild_is_a_post(self):
+        status, _ = self.request('/rebuild')
+        self.assertEqual(status, 405)
+        built_at = self.service.built_at
+        status, body = quiet(self.request, '/rebuild', 'POST')
+        self.assertEqual(status, 200)
+        self.assertGreater(self.service.built_at, built_at)
+        self.assertEqual(body['connection_days'], len(self.service.index))
+
+
+class TestScheduleWatcher(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, 'schedule.xlsx')
+        shutil.copyfile(SCHEDULE_PATH, self.path)
+        self.service = ConnectionService(self.path, '2030', poll_seconds=0.05)
+        quiet(self.service.start)
+        self.addCleanup(self.service.stop)
+
+    def touch(self):
+        # Moves the modification time forward, whatever the resolution of the file system
+        mtime = os.path.getmtime(self.path) + 10
+        os.utime(self.path, (mtime, mtime))
+
+    def wait_for(self, condition, timeout = 60):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail(f'Still waiting after {timeout} s, service status: {self.service.status()}')
+            time.sleep(0.05)
+
+    def test_rebuilds_when_the_schedule_changes(self):
+        before = self.service.status()
+        df = pd.read_excel(self.path, sheet_name='2030')
+        with contextlib.redirect_stdout(io.StringIO()):
+            df[df['Flt'] != 'NX200'].to_excel(self.path, sheet_name='2030', index=False)
+            self.touch()
+            self.wait_for(lambda: self.service.schedule_hash != before['schedule_hash'])
+        after = self.service.status()
+        self.assertIsNone(after['last_error'])
+        self.assertLess(after['connection_days'], before['connection_days'])
+        self.assertEqual(len(self.service.index.query(dest='NX200')), 0)
+        self.assertFalse((self.service.index.connections['Outbound Flt no'] == 'NX200').any())
+
+    def test_broken_file_keeps_the_previous_index(self):
+        index, before = self.service.index, self.service.status()
+        with open(self.path, 'wb') as f:
+            f.write(b'not a workbook')
+        self.touch()
+        self.wait_for(lambda: self.service.last_error is not None)
+        after = self.service.status()
+        self.assertIs(self.service.index, index)
+        self.assertEqual((after['schedule_hash'], after['connection_days']), (before['schedule_hash'], before['connection_days']))
+        orig = index.connections['Inbound Orig Airp'].iloc[0]
+        self.assertGreater(len(self.service.index.query(orig=orig)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import contextlib
+import io
+import os
+import unittest
+import pandas as pd
+from functions.build_connections import build_and_filter_connections
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+from utils.config import ROOT_DIR
+
+SCHEDULE_PATH = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx')
+SHEETS = ['2026', '2027 phased', '2029', '2030']
+KINDS = ['logical', 'missed', 'illogical']
+
+# Output of the original (merge-based) build_and_filter_connections on every sheet of schedule_v8
+EXPECTED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'connections')
+
+
+def expected_frames(sheet):
+    return [pd.read_parquet(os.path.join(EXPECTED_DIR, f"{sheet.replace(' ', '_')}_{kind}.parquet")) for kind in KINDS]
+
+
+class TestBuildAndFilterConnections(unittest.TestCase):
+
+    def test_matches_expected_frames(self):
+        # Same rows, in the same order, with the same values. Dtypes may be more compact than the
+        # original ones (e.g. int16 seats), values may not change
+        for sheet in SHEETS:
+            df = preprocess_schedule(import_schedule(SCHEDULE_PATH, sheet_name=sheet), 'exploded')
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = build_and_filter_connections(df)
+            for kind, result, expected in zip(KINDS, results, expected_frames(sheet)):
+                with self.subTest(sheet=sheet, kind=kind):
+                    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected, check_dtype=False,
+                                                  check_column_type=False, check_exact=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from functions.connections_export import export_connections, FrameAppender, OUTPUT_FORMATS
+from functions.connections_to_excel import connection_statistics, weighted_median
+
+
+def connections(n):
+    # Output-shaped connections: 30, 60, 90, ... minutes, the first one operating daily, the others on 2 days
+    days = (['1234567'] + ['13'] * (n - 1))[:n]
+    return pd.DataFrame({
+        'Inbound Flt no': [f'NX{i:03d}' for i in range(n)],
+        'Connection Time (min)': np.arange(1, n + 1) * 30 / 1440,
+        'Circuity x': np.linspace(1.0, 1.4, n),
+        'Circuity (abs)': np.arange(n) * 100.0,
+        'Inbound Dep Day (UTC)': days,
+        'Outbound Dep Day (UTC)': days,
+    })
+
+
+def read_csv(path):
+    return pd.read_csv(path, dtype={'Inbound Dep Day (UTC)': str, 'Outbound Dep Day (UTC)': str})
+
+
+class TestConnectionStatistics(unittest.TestCase):
+
+    def test_weighted_median(self):
+        self.assertEqual(weighted_median(np.array([3.0, 1.0, 2.0]), np.array([1, 1, 1])), 2.0)
+        self.assertEqual(weighted_median(np.array([1.0, 2.0, 10.0, np.nan]), np.array([3, 1, 2, 5])), 1.5)
+        self.assertTrue(np.isnan(weighted_median(np.array([]), np.array([], dtype=int))))
+
+    def test_medians_over_rows_with_ct_in_minutes(self):
+        # 30, 60 and 90 minutes: the median row is at 60 minutes, whatever the operating days
+        stats = connection_statistics(connections(3), connections(2))
+        self.assertEqual(stats['Valid Connections'], 3)
+        self.assertEqual(stats['Median CT (Mins)'], 60)
+        self.assertAlmostEqual(stats['Median Circuity x'], 1.2)
+        self.assertEqual(stats['Median Circuity (km)'], 100)
+        self.assertEqual(stats['Missed Connections'], 2)
+        self.assertTrue(np.isnan(connection_statistics(connections(0), connections(0))['Median CT (Mins)']))
+
+    def test_by_connection_days(self):
+        # 30 min on 7 days, 60 and 90 min on 2 days each: the median connection-day is at 30 min
+        stats = connection_statistics(connections(3), connections(2), by_connection_days=True)
+        self.assertEqual(stats['Valid Connections'], 11)
+        self.assertEqual(stats['Median CT (Mins)'], 30)
+        self.assertEqual(stats['Median Circuity (km)'], 0)
+        self.assertEqual(stats['Missed Connections'], 9)
+
+
+class TestExportConnections(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.tmp_dir.name, 'Output', 'connections')
+        self.frames = (connections(5), connections(2), connections(0))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_file_backends(self):
+        readers = {'parquet': pd.read_parquet, 'feather': pd.read_feather, 'csv': read_csv}
+        for output_format, reader in readers.items():
+            with self.subTest(output_format=output_format):
+                paths = export_connections(*self.frames, output_format=output_format, output_path=self.output_path)
+                self.assertEqual([os.path.basename(path) for path in paths],
+                                 [f'connections_{name}.{output_format}' for name in ('valid', 'missed', 'illogical')]
+                                 + ['connections_statistics.json'])
+                pd.testing.assert_frame_equal(reader(paths[0]), self.frames[0], check_dtype=False)
+                self.assertEqual(len(reader(paths[1])), 2)
+                with open(paths[-1]) as f:
+                    stats = json.load(f)
+                # 30, 60, 90, 120 and 150 min: the median row is at 90 min
+                self.assertEqual(stats['Median CT (Mins)'], 90)
+                self.assertEqual(stats['Parameters']['Min CT (min)'], 60)
+
+    def test_workbook_backends(self):
+        for output_format in ('xlsx', 'xlsx-streaming'):
+            with self.subTest(output_format=output_format):
+                paths = export_connections(*self.frames, output_format=output_format, output_path=self.output_path,
+                                           extra_sheets=[('Run report', pd.DataFrame({'stage': ['import_schedule']}))])
+                workbook = load_workbook(paths[0])
+                self.assertEqual(workbook.sheetnames, ['Cover Page', 'Valid connections', 'Missed connections',
+                                                       'Illogical connections', 'Run report'])
+                self.assertEqual(workbook['Cover Page']['B3'].value, 5)
+                self.assertEqual(workbook['Cover Page']['B4'].value, 90)
+                self.assertEqual(workbook['Valid connections'].max_row, 6)
+
+    def test_invalid_format(self):
+        self.assertNotIn('json', OUTPUT_FORMATS)
+        with self.assertRaises(ValueError):
+            export_connections(*self.frames, output_format='json', output_path=self.output_path)
+
+
+class TestFrameAppender(unittest.TestCase):
+
+    def test_appends_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for output_format, reader in [('parquet', pd.read_parquet), ('csv', read_csv)]:
+                with self.subTest(output_format=output_format):
+                    path = os.path.join(tmp_dir, f'dated.{output_format}')
+                    with FrameAppender(path, output_format) as appender:
+                        appender.append(connections(3))
+                        appender.append(connections(4))
+                    self.assertEqual(appender.rows, 7)
+                    pd.testing.assert_frame_equal(reader(path), pd.concat([connections(3), connections(4)], ignore_index=True),
+                                                  check_dtype=False)
+
+    def test_empty_file_keeps_columns(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'dated.parquet')
+            FrameAppender(path).close(empty=connections(0))
+            self.assertEqual(list(pd.read_parquet(path).columns), list(connections(0).columns))
+
+
+if __name__ == '__main__':
+    unittest.main()
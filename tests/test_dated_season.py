@@ -0,0 +1,111 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from classes.airport import get_airport_registry
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.dated_season import build_connections_dated, DATE_COLUMNS
+from functions.day_mask import days_to_mask, mask_day_count
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+from utils.config import ROOT_DIR
+
+SCHEDULE_PATH = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx')
+# Three weeks from a Monday: the middle week has the days before and after it in the season
+SEASON = ('2030-06-03', '2030-06-23')
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def build_windows(df, *args, **kwargs):
+    windows = []
+    summary = quiet(build_connections_dated, df, *args, on_window=lambda *window: windows.append(window), **kwargs)
+    return summary, windows
+
+
+class TestDatedSeason(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = preprocess_schedule(import_schedule(SCHEDULE_PATH, sheet_name='2030'), 'bitmask')
+        cls.summary, cls.windows = build_windows(cls.df, *SEASON)
+
+    def test_summary(self):
+        self.assertEqual(self.summary['Window start'].dt.strftime('%Y-%m-%d').tolist(), ['2030-06-03', '2030-06-10', '2030-06-17'])
+        for (window_start, *results), (_, row) in zip(self.windows, self.summary.iterrows()):
+            self.assertEqual(window_start, row['Window start'])
+            self.assertEqual([len(frame) for frame in results], row[['Logical', 'Missed', 'Illogical']].tolist())
+
+    def test_full_week_matches_the_weekly_engine(self):
+        # Every line runs the whole season, so the middle week holds each weekly connection-day once
+        weekly = quiet(build_and_filter_connections_bitmask, self.df)
+        for kind, dated, expected in zip(['logical', 'missed', 'illogical'], self.windows[1][1:], weekly):
+            with self.subTest(kind=kind):
+                self.assertEqual(len(dated), mask_day_count(days_to_mask(expected['Inbound Dep Day (UTC)'])).sum())
+
+    def test_date_columns(self):
+        window_start, logical, missed, _ = self.windows[1]
+        for frame in [logical, missed]:
+            inbound, outbound = frame[DATE_COLUMNS[0]], frame[DATE_COLUMNS[1]]
+            self.assertTrue(inbound.between(window_start, window_start + pd.Timedelta(days=6)).all())
+            self.assertEqual((inbound.dt.dayofweek + 1).astype(str).tolist(), frame['Inbound Dep Day (UTC)'].tolist())
+            self.assertEqual((outbound.dt.dayofweek + 1).astype(str).tolist(), frame['Outbound Dep Day (UTC)'].tolist())
+            # The departure leaves the connection time after the arrival, block times and connection times as days
+            arrival = frame['Inbound STD (UTC)'] + frame['Inbound Block Hrs']
+            days = (arrival + frame['Connection Time (min)'] - frame['Outbound STD (UTC)']).round().astype(int)
+            self.assertTrue(((outbound - inbound).dt.days == days).all())
+            self.assertTrue(days.isin([-1, 0, 1]).all())
+
+    def test_line_dates(self):
+        # One inbound flight only starts mid-season
+        flight = self.windows[0][1]['Inbound Flt no'].iloc[0]
+        df = self.df.copy()
+        df['Eff'] = pd.NaT
+        df.loc[(df['Flt'] == flight) & (df['movement_flag'] == 'Arr'), 'Eff'] = pd.Timestamp('2030-06-12')
+        _, windows = build_windows(df, *SEASON)
+        logical = pd.concat([window[1] for window in windows])
+        dates = logical.loc[logical['Inbound Flt no'] == flight, DATE_COLUMNS[0]]
+        self.assertGreater(len(dates), 0)
+        self.assertTrue((dates >= pd.Timestamp('2030-06-12')).all())
+
+    def test_streams_to_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'dated')
+            summary = quiet(build_connections_dated, self.df, *SEASON, output_path=path)
+            written = pd.read_parquet(f'{path}_valid.parquet')
+        self.assertEqual(len(written), summary['Logical'].sum())
+        self.assertEqual(written.columns[:2].tolist(), DATE_COLUMNS)
+        self.assertTrue(written[DATE_COLUMNS[0]].between(*map(pd.Timestamp, SEASON)).all())
+
+    def test_local_times_follow_dst_changes(self):
+        # Europe moves to summer time on 31 March 2030 at 01:00 UTC
+        _, windows = build_windows(self.df, '2030-03-25', '2030-04-07')
+        logical = pd.concat([window[1] for window in windows], ignore_index=True)
+        registry = get_airport_registry()
+        airports = logical['Inbound Orig Airp'].astype(object).to_numpy()
+        zones = registry.timezones[registry.ids(airports)]
+        utc = logical[DATE_COLUMNS[0]] + pd.to_timedelta(np.round(logical['Inbound STD (UTC)'] * 1440), unit='m')
+        expected = np.array([time.tz_localize('UTC').tz_convert(zone).tz_localize(None) for time, zone in zip(utc, zones)],
+                            dtype='datetime64[ns]')
+        expected = (expected - expected.astype('datetime64[D]')) / np.timedelta64(1, 'm')
+        np.testing.assert_array_equal(np.round(logical['Inbound STD (Local)'] * 1440), expected)
+
+        amsterdam = logical[logical['Inbound Orig Airp'] == 'AMS']
+        offsets = np.round((amsterdam['Inbound STD (Local)'] - amsterdam['Inbound STD (UTC)']) * 1440)
+        summer = amsterdam[DATE_COLUMNS[0]] >= pd.Timestamp('2030-03-31')
+        self.assertEqual(set(offsets[~summer]), {60})
+        self.assertEqual(set(offsets[summer]), {120})
+
+    def test_season_must_not_end_before_it_starts(self):
+        with self.assertRaises(ValueError):
+            build_connections_dated(self.df, SEASON[1], SEASON[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
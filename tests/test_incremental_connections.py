@@ -0,0 +1,73 @@
+import contextlib
+import io
+import os
+import unittest
+import pandas as pd
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.import_data import import_schedule
+from functions.incremental_connections import build_connections_incremental
+from functions.preprocess import preprocess_schedule
+from utils.config import ROOT_DIR
+
+SCHEDULE_PATH = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx')
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+class TestIncrementalConnections(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = preprocess_schedule(import_schedule(SCHEDULE_PATH, sheet_name='2030'), 'bitmask')
+        cls.results, cls.state = quiet(build_connections_incremental, cls.df)
+
+    def assert_matches_full_rebuild(self, edited):
+        incremental, _ = quiet(build_connections_incremental, edited, self.state)
+        full, _ = quiet(build_connections_incremental, edited)
+        for kind, got, expected in zip(['logical', 'missed', 'illogical'], incremental, full):
+            with self.subTest(kind=kind):
+                pd.testing.assert_frame_equal(got.reset_index(drop=True), expected.reset_index(drop=True), check_exact=True)
+        return incremental
+
+    def test_full_build_matches_bitmask_engine(self):
+        for got, expected in zip(self.results, quiet(build_and_filter_connections_bitmask, self.df)):
+            pd.testing.assert_frame_equal(got.reset_index(drop=True), expected.reset_index(drop=True), check_exact=True)
+
+    def test_unchanged_schedule(self):
+        self.assert_matches_full_rebuild(self.df.copy())
+
+    def test_retimed_line(self):
+        edited = self.df.copy()
+        line = edited.index[(edited['Dest'] == 'NUM').to_numpy()][0]
+        for col in ['STD', 'STA']:
+            edited.loc[line, col] = (edited.loc[line, col] + 45 / 1440) % 1
+        results = self.assert_matches_full_rebuild(edited)
+        self.assertFalse(all(a.equals(b) for a, b in zip(results, self.results)), 'the edit should change the connections')
+
+    def test_removed_line(self):
+        edited = self.df.drop(index=self.df.index[(self.df['Orig'] == 'NUM').to_numpy()][0])
+        self.assert_matches_full_rebuild(edited)
+
+    def test_added_line(self):
+        edited = self.df.copy()
+        edited['Flt'] = edited['Flt'].cat.add_categories(['NX999'])
+        added = edited[(edited['Dest'] == 'NUM').to_numpy()].iloc[[0]].copy()
+        added['Flt'] = 'NX999'
+        self.assert_matches_full_rebuild(pd.concat([edited, added], ignore_index=True))
+
+    def test_changed_days(self):
+        edited = self.df.copy()
+        line = edited.index[(edited['Orig'] == 'NUM').to_numpy()][1]
+        edited.loc[line, 'Dep Day'] = '1234567' if edited.loc[line, 'Dep Day'] != '1234567' else '1.3.5.7'
+        self.assert_matches_full_rebuild(edited)
+
+    def test_missing_flight_key_column(self):
+        with self.assertRaises(ValueError):
+            quiet(build_connections_incremental, self.df.drop(columns='Flt'), self.state)
+
+
+if __name__ == '__main__':
+    unittest.main()
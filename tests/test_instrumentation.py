@@ -0,0 +1,47 @@
+import tracemalloc
+import unittest
+import pandas as pd
+from utils.instrumentation import RunReport
+
+
+class TestRunReport(unittest.TestCase):
+
+    def test_records_nested_stages(self):
+        report = RunReport(caches={'schedule cache': {'hits': 0, 'misses': 0}})
+        df = report.stage('outer', lambda: report.stage('inner', pd.DataFrame, {'a': range(3)}))
+        self.assertEqual(len(df), 3)
+        inner, outer = report.stages
+        self.assertEqual((inner['stage'], inner['parent'], inner['rows_out']), ('inner', 'outer', 3))
+        self.assertEqual((outer['stage'], outer['parent']), ('outer', None))
+        self.assertEqual(report.total_seconds, outer['seconds'])
+        self.assertEqual(list(report.to_frame()['Stage']), ['inner', 'outer'])
+
+    def test_records_failing_stage(self):
+        report = RunReport()
+        with self.assertRaises(ZeroDivisionError):
+            report.stage('divide', lambda: 1 / 0)
+        self.assertIn('ZeroDivisionError', report.stages[0]['error'])
+
+    def test_stops_tracing_when_a_stage_fails(self):
+        if tracemalloc.is_tracing():
+            self.skipTest('tracemalloc already started outside the test')
+        with self.assertRaises(ZeroDivisionError):
+            with RunReport(trace_memory=True) as report:
+                report.stage('divide', lambda: 1 / 0)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIn('peak_traced_bytes', report.stages[0])
+
+    def test_leaves_outer_tracing_running(self):
+        if tracemalloc.is_tracing():
+            self.skipTest('tracemalloc already started outside the test')
+        tracemalloc.start()
+        try:
+            with RunReport(trace_memory=True) as report:
+                report.stage('list', list, range(10))
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from functions.distance import airport_coordinates, distance_matrix
+from functions.itineraries import iter_two_stop_itineraries, write_itineraries
+from functions.rotation_builder import dated_legs, WEEK_MINUTES
+from functions.synthetic_schedule import generate_airport_data, generate_schedule
+
+HUBS = ['NUM', 'H01']
+MIN_CT, MAX_CT = 45, 300
+MAX_CIRCUITY, MAX_ABS_CIRCUITY = 2.5, 3000
+
+
+def brute_force_itineraries(schedule, airport_data):
+    # Every leg triple, joined on stations and filtered with the rules of iter_two_stop_itineraries
+    legs = dated_legs(schedule).reset_index(names='Leg')[['Leg', 'Orig', 'Dest', 'Dep (min)', 'Arr (min)']]
+    pairs = legs.merge(legs, left_on='Dest', right_on='Orig', suffixes=('_1', '_2'))
+    pairs['CT 1'] = (pairs['Dep (min)_2'] - pairs['Arr (min)_1']) % WEEK_MINUTES
+    pairs = pairs[pairs['CT 1'].between(MIN_CT, MAX_CT) & (pairs['Dest_2'] != pairs['Orig_1'])]
+    pairs['Arrival 2'] = pairs['Arr (min)_1'] + pairs['CT 1'] + pairs['Arr (min)_2'] - pairs['Dep (min)_2']
+
+    triples = pairs.merge(legs.add_suffix('_3'), left_on='Dest_2', right_on='Orig_3')
+    ct2 = (triples['Dep (min)_3'] - triples['Arrival 2']) % WEEK_MINUTES
+    triples = triples[ct2.between(MIN_CT, MAX_CT) & (triples['Dest_3'] != triples['Orig_1']) &
+                      (triples['Dest_3'] != triples['Dest_1'])]
+
+    codes = list(airport_data)
+    lats, lons = airport_coordinates(codes, airport_data)
+    distances = distance_matrix(lats, lons)
+    ids = {code: i for i, code in enumerate(codes)}
+    a, h1, h2, b = (triples[col].map(ids).to_numpy() for col in ['Orig_1', 'Dest_1', 'Dest_2', 'Dest_3'])
+    total = distances[a, h1] + distances[h1, h2] + distances[h2, b]
+    direct = distances[a, b]
+    logical = (total / direct <= MAX_CIRCUITY) | (total - direct <= MAX_ABS_CIRCUITY)
+    return set(map(tuple, triples.loc[logical, ['Leg_1', 'Leg_2', 'Leg_3']].to_numpy().tolist()))
+
+
+class TestTwoStopItineraries(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.airport_data = generate_airport_data(20, hubs=HUBS, seed=3)
+        cls.schedule = generate_schedule(cls.airport_data, 150, hubs=HUBS, seed=3)
+
+    def itineraries(self, chunk_rows):
+        chunks = list(iter_two_stop_itineraries(
+            self.schedule, self.airport_data, min_connect_time=MIN_CT / 1440, max_connect_time=MAX_CT / 1440,
+            max_circuity=MAX_CIRCUITY, max_abs_circuity=MAX_ABS_CIRCUITY, chunk_rows=chunk_rows))
+        return chunks, pd.concat(chunks, ignore_index=True)
+
+    def test_matches_brute_force(self):
+        _, df = self.itineraries(100000)
+        expected = brute_force_itineraries(self.schedule, self.airport_data)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(set(map(tuple, df[['Leg 1', 'Leg 2', 'Leg 3']].to_numpy().tolist())), expected)
+        self.assertEqual(len(df), len(expected))
+        self.assertTrue(df['CT 1 (min)'].between(MIN_CT, MAX_CT).all() and df['CT 2 (min)'].between(MIN_CT, MAX_CT).all())
+        self.assertTrue((df['Elapsed (min)'] == df['Arr (min)'] - df['Dep (min)']).all())
+
+    def test_chunks_give_the_same_itineraries(self):
+        chunks, df = self.itineraries(50)
+        _, expected = self.itineraries(100000)
+        self.assertGreater(len(chunks), 1)
+        sort = ['Leg 1', 'Leg 2', 'Leg 3']
+        pd.testing.assert_frame_equal(df.sort_values(sort, ignore_index=True), expected.sort_values(sort, ignore_index=True))
+
+    def test_max_elapsed_time(self):
+        _, df = self.itineraries(100000)
+        limit = int(np.median(df['Elapsed (min)']))
+        limited = pd.concat(iter_two_stop_itineraries(
+            self.schedule, self.airport_data, min_connect_time=MIN_CT / 1440, max_connect_time=MAX_CT / 1440,
+            max_circuity=MAX_CIRCUITY, max_abs_circuity=MAX_ABS_CIRCUITY, max_elapsed_time=limit / 1440))
+        self.assertEqual(len(limited), (df['Elapsed (min)'] <= limit).sum())
+
+    def test_write_itineraries(self):
+        _, expected = self.itineraries(100000)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path, rows = write_itineraries(self.itineraries(50)[0], os.path.join(tmp_dir, 'itineraries'))
+            self.assertEqual(rows, len(expected))
+            self.assertEqual(len(pd.read_parquet(path)), len(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+import main
+
+
+class TestMainModes(unittest.TestCase):
+    # Invalid combinations are rejected before any stage runs
+
+    def test_incremental_builds_cover_a_single_hub(self):
+        with self.assertRaisesRegex(ValueError, 'hubs'):
+            main.main(incremental=True, hubs=['NUM', 'RUH'])
+
+    def test_incremental_builds_need_the_bitmask_engine(self):
+        with self.assertRaisesRegex(ValueError, 'bitmask'):
+            main.main(engine='exploded', incremental=True)
+
+    def test_unknown_output_format(self):
+        with self.assertRaisesRegex(ValueError, 'output format'):
+            main.main(output_format='xls')
+
+    def test_dated_seasons_are_streamed(self):
+        with self.assertRaisesRegex(ValueError, 'output_format'):
+            main.main_season('2030-06-01', '2030-06-30', output_format='xlsx')
+
+    def test_comparison_needs_two_sheets(self):
+        with self.assertRaisesRegex(ValueError, 'baseline'):
+            main.main_compare(['2030'])
+
+    def test_cli_rejects_a_season_to_excel(self):
+        with self.assertRaises(SystemExit):
+            main.cli(['season', '2030-06-01', '2030-06-30', '--output-format', 'xlsx'])
+
+
+if __name__ == '__main__':
+    unittest.main()
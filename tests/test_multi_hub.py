@@ -0,0 +1,63 @@
+import contextlib
+import io
+import unittest
+import numpy as np
+import pandas as pd
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.build_connections import build_and_filter_connections
+from functions.data_enrich import add_movement_flag
+from functions.multi_hub import build_and_filter_connections_multi_hub, partition_by_station
+from functions.preprocess import preprocess_schedule
+from functions.synthetic_schedule import generate_airport_data, generate_schedule
+
+HUBS = ['NUM', 'H01', 'H02']
+ENGINES = {'exploded': build_and_filter_connections, 'bitmask': build_and_filter_connections_bitmask}
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+class TestMultiHub(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.airport_data = generate_airport_data(25, hubs=HUBS, seed=5)
+        cls.schedule = generate_schedule(cls.airport_data, 300, hubs=HUBS, seed=5)
+        cls.frames = {engine: preprocess_schedule(cls.schedule.copy(), engine) for engine in ENGINES}
+
+    def single_hub(self, engine, hub):
+        # The whole schedule classified against one hub: only its departures can be connected to
+        df = add_movement_flag(self.frames[engine].copy(), hub=hub)
+        return quiet(ENGINES[engine], df, airport_data=self.airport_data)
+
+    def test_partition_by_station(self):
+        df = self.frames['bitmask']
+        partitions = partition_by_station(df, HUBS)
+        self.assertEqual(list(partitions), HUBS)
+        for hub, positions in partitions.items():
+            expected = np.flatnonzero(((df['Orig'] == hub) | (df['Dest'] == hub)).to_numpy())
+            np.testing.assert_array_equal(positions, expected)
+
+    def test_each_hub_matches_a_single_hub_build(self):
+        for engine in ENGINES:
+            for processes in [1, 2]:
+                results = quiet(build_and_filter_connections_multi_hub, self.frames[engine], HUBS, engine=engine,
+                                processes=processes, airport_data=self.airport_data)
+                for hub in HUBS:
+                    for kind, result, expected in zip(['logical', 'missed', 'illogical'], results, self.single_hub(engine, hub)):
+                        with self.subTest(engine=engine, processes=processes, hub=hub, kind=kind):
+                            got = result[result['Hub'] == hub].drop(columns='Hub').reset_index(drop=True)
+                            pd.testing.assert_frame_equal(got, expected.reset_index(drop=True), check_dtype=False,
+                                                          check_categorical=False)
+                self.assertEqual(sorted(results[0]['Hub'].unique()), sorted(HUBS))
+
+    def test_duplicate_hubs_are_built_once(self):
+        results = quiet(build_and_filter_connections_multi_hub, self.frames['bitmask'], ['NUM', 'NUM'], engine='bitmask',
+                        processes=1, airport_data=self.airport_data)
+        self.assertEqual(len(results[0]), len(self.single_hub('bitmask', 'NUM')[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
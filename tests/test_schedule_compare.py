@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+import functions.circuity
+from functions.schedule_compare import build_scenarios, compare_schedules, connection_days, export_schedule_diff
+from utils.config import ROOT_DIR
+
+SCHEDULE_PATH = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx')
+FIVE_MINUTES = 5 / 1440
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+class TestCompareSchedules(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.base = import_schedule(SCHEDULE_PATH, sheet_name='2030')
+        # One departure cancelled, one arrival five minutes later
+        cut = cls.base[cls.base['Flt'] != 'NX200'].reset_index(drop=True)
+        retimed = cls.base.copy()
+        later = retimed['Flt'] == 'NX002'
+        for col in ['STD', 'DLcl', 'STA', 'ALcl']:
+            retimed.loc[later, col] += FIVE_MINUTES
+        cls.schedules = {'base': cls.base, 'cut': cut, 'retimed': retimed}
+        cls.diffs = quiet(compare_schedules, cls.schedules, processes=1)
+        cls.base_days = connection_days(quiet(build_and_filter_connections_bitmask, preprocess_schedule(cls.base.copy(), 'bitmask'))[0])
+
+    def test_same_schedule(self):
+        gained, lost, retimed, markets = quiet(compare_schedules, {'a': self.base, 'b': self.base}, processes=1)['b']
+        self.assertEqual((len(gained), len(lost), len(retimed), len(markets)), (0, 0, 0, 0))
+
+    def test_cancelled_flight(self):
+        gained, lost, retimed, markets = self.diffs['cut']
+        self.assertEqual(len(gained), 0)
+        self.assertEqual(len(retimed), 0)
+        self.assertEqual(len(lost), (self.base_days['Outbound Flt no'] == 'NX200').sum())
+        self.assertTrue((lost['Outbound Flt no'] == 'NX200').all())
+        self.assertEqual(markets['Delta'].sum(), -len(lost))
+        self.assertEqual(markets['Lost'].sum(), len(lost))
+
+    def test_retimed_flight(self):
+        _, _, retimed, markets = self.diffs['retimed']
+        self.assertGreater(len(retimed), 0)
+        self.assertTrue((retimed['Inbound Flt no'] == 'NX002').all())
+        self.assertTrue(((retimed['Inbound STA (UTC)'] - retimed['Inbound STA (UTC) (base)']) == 5).all())
+        self.assertTrue(((retimed['Connection Time (min)'] - retimed['Connection Time (min) (base)']) == -5).all())
+        self.assertEqual(markets['Retimed'].sum(), len(retimed))
+
+    def test_worker_processes_give_the_same_diffs(self):
+        diffs = quiet(compare_schedules, self.schedules, baseline='base', processes=2)
+        self.assertEqual(list(diffs), ['cut', 'retimed'])
+        for name, frames in diffs.items():
+            for got, expected in zip(frames, self.diffs[name]):
+                pd.testing.assert_frame_equal(got, expected)
+
+    def test_distances_are_computed_once(self):
+        # The workers read the distance matrix built for all scenarios instead of building their own
+        with mock.patch.object(functions.circuity, 'distance_matrix', side_effect=AssertionError('distances recomputed')):
+            results = quiet(build_scenarios, self.schedules, processes=1)
+        self.assertEqual(list(results), list(self.schedules))
+        base_days = connection_days(results['base'][0])
+        pd.testing.assert_frame_equal(base_days, self.base_days)
+
+    def test_unknown_baseline(self):
+        with self.assertRaises(KeyError):
+            compare_schedules(self.schedules, baseline='2029')
+
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = export_schedule_diff(self.diffs, os.path.join(tmp_dir, 'compare'))
+            sheets = pd.read_excel(path, sheet_name=None)
+        self.assertEqual(list(sheets)[:3], ['Summary', 'cut Gained', 'cut Lost'])
+        self.assertEqual(sheets['Summary']['Lost'].tolist(), [len(self.diffs['cut'][1]), len(self.diffs['retimed'][1])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import datetime
+import unittest
+import warnings
+import pandas as pd
+from functions.schedule_schema import apply_schedule_schema, materialize_categoricals
+
+
+class TestScheduleSchema(unittest.TestCase):
+
+    def test_apply_schedule_schema(self):
+        df = apply_schedule_schema(pd.DataFrame({
+            'Aln': ['NX', 'NX'],
+            'Orig': ['NUM', 'LHR'],
+            'Dest': ['LHR', 'NUM'],
+            'STD': [datetime.time(6, 0), datetime.datetime(1900, 1, 1, 18, 0)],
+            'Dep Day': ['1234567', 135],
+            'Seats': [174.0, 290.0],
+        }))
+        self.assertIsInstance(df['Aln'].dtype, pd.CategoricalDtype)
+        # Origins and destinations share one categorical dtype, so they compare with each other
+        self.assertEqual(df['Orig'].dtype, df['Dest'].dtype)
+        self.assertTrue((df['Orig'] == df['Dest'].iloc[::-1].to_numpy()).all())
+        self.assertEqual(df['STD'].tolist(), [0.25, 0.75])
+        self.assertEqual(df['Dep Day'].tolist(), ['1234567', '135'])
+        self.assertEqual(df['Seats'].dtype, 'int16')
+
+    def test_materialize_categoricals_on_a_slice(self):
+        df = pd.DataFrame({'Via': pd.Categorical(['NUM', 'LHR']), 'Seats': [174, 290], 'Flt': ['NX1', 'NX2']})
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            result = materialize_categoricals(df[['Via', 'Seats']])
+        self.assertEqual(result['Via'].dtype, object)
+        self.assertEqual(result['Via'].tolist(), ['NUM', 'LHR'])
+        self.assertIsInstance(df['Via'].dtype, pd.CategoricalDtype)
+
+
+if __name__ == '__main__':
+    unittest.main()
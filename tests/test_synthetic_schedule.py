@@ -0,0 +1,33 @@
+import unittest
+import pandas as pd
+from functions.synthetic_schedule import generate_airport_data, generate_schedule, lines_for_flight_days
+
+HUBS = ['NUM', 'H01']
+
+
+class TestSyntheticSchedule(unittest.TestCase):
+
+    def test_same_seed_same_frames(self):
+        airport_data = generate_airport_data(40, hubs=HUBS, seed=7)
+        self.assertEqual(airport_data, generate_airport_data(40, hubs=HUBS, seed=7))
+        pd.testing.assert_frame_equal(generate_schedule(airport_data, 200, hubs=HUBS, seed=7),
+                                      generate_schedule(airport_data, 200, hubs=HUBS, seed=7))
+
+    def test_different_seed_different_frames(self):
+        self.assertNotEqual(generate_airport_data(40, hubs=HUBS, seed=7), generate_airport_data(40, hubs=HUBS, seed=8))
+        airport_data = generate_airport_data(40, hubs=HUBS, seed=7)
+        first = generate_schedule(airport_data, 200, hubs=HUBS, seed=7)
+        second = generate_schedule(airport_data, 200, hubs=HUBS, seed=8)
+        self.assertEqual(first.shape, second.shape)
+        self.assertFalse(first.equals(second))
+
+    def test_hub_and_spoke(self):
+        airport_data = generate_airport_data(40, hubs=HUBS, seed=7)
+        df = generate_schedule(airport_data, 200, hubs=HUBS, seed=7)
+        self.assertEqual(len(df), 200)
+        self.assertTrue((df['Orig'].isin(HUBS) ^ df['Dest'].isin(HUBS)).all())
+        self.assertGreaterEqual(lines_for_flight_days(1000), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import os
+import unittest
+import numpy as np
+from functions.bitmask_connections import build_and_filter_connections_bitmask
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+from functions.threshold_sweep import sweep_thresholds, _SortedConnectionTimes
+from utils.config import ROOT_DIR
+
+SCHEDULE_PATH = os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx')
+
+
+def connection_days(df):
+    # Operating days of every output row, from its inbound day string
+    return df['Inbound Dep Day (UTC)'].str.len().to_numpy()
+
+
+class TestSortedConnectionTimes(unittest.TestCase):
+
+    def test_weighted_count_and_median(self):
+        times = _SortedConnectionTimes(np.array([90, 30, 60, 120]) / 1440, np.array([1, 3, 1, 2]))
+        # Expanded: 30 30 30 60 90 120 120
+        self.assertEqual(times.count(0, 1), 7)
+        self.assertEqual(times.count(30 / 1440, 90 / 1440, upper_inclusive=False), 4)
+        self.assertAlmostEqual(times.median(0, 1) * 1440, 60)
+        # Even number of connection-days: 60 90 120 120
+        self.assertAlmostEqual(times.median(60 / 1440, 1) * 1440, 105)
+        self.assertTrue(np.isnan(times.median(200 / 1440, 1)))
+
+
+class TestSweepThresholds(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = preprocess_schedule(import_schedule(SCHEDULE_PATH, sheet_name='2030'), 'bitmask')
+        cls.sweep = sweep_thresholds(cls.df, min_connect_times=[45 / 1440, 60 / 1440], max_connect_times=[180 / 1440, 240 / 1440],
+                                     max_circuities=[1.2, 1.5])
+
+    def test_grid(self):
+        self.assertEqual(len(self.sweep), 8)
+        self.assertEqual(sorted(self.sweep['Min CT (min)'].unique()), [45, 60])
+
+    def test_matches_full_builds(self):
+        # Every grid point gives the connection-days and median CT of a build with those thresholds
+        for _, point in self.sweep.iloc[[0, 3, 5, 6]].iterrows():
+            with self.subTest(**point.iloc[:5].to_dict()), contextlib.redirect_stdout(io.StringIO()):
+                logical, missed, illogical = build_and_filter_connections_bitmask(
+                    self.df, min_connect_time=point['Min CT (min)'] / 1440, max_connect_time=point['Max CT (min)'] / 1440,
+                    max_circuity=point['Max circuity'])
+                self.assertEqual(point['Logical connection-days'], connection_days(logical).sum())
+                self.assertEqual(point['Missed connection-days'], connection_days(missed).sum())
+                self.assertEqual(point['Illogical connection-days'], connection_days(illogical).sum())
+                expected = np.median(np.repeat(logical['Connection Time (min)'].to_numpy() * 1440, connection_days(logical)))
+                self.assertAlmostEqual(point['Median CT (min)'], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
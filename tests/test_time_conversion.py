@@ -0,0 +1,58 @@
+import datetime
+import unittest
+import numpy as np
+import pandas as pd
+from functions.time_conversion import (column_to_day_fraction, convert_decimal_to_time, convert_time_columns_to_fraction,
+                                       datetime_to_day_fraction, day_fractions_to_time_strings)
+
+
+class TestColumnToDayFraction(unittest.TestCase):
+
+    def test_mixed_inputs_match_the_scalar_conversion(self):
+        times = [datetime.time(6, 35), datetime.time(23, 59, 30), datetime.time(0, 0)]
+        column = pd.Series([
+            times[0],                                    # datetime.time
+            pd.Timestamp('1900-01-01 23:59:30'),         # Timestamp, date part ignored
+            '00:00',                                     # string
+            datetime.time(6, 35),
+            '23:59:30',
+            0.0,                                         # Excel day fraction
+            None,
+        ], dtype=object)
+        expected = [datetime_to_day_fraction(times[i]) for i in [0, 1, 2, 0, 1, 2]] + [np.nan]
+        np.testing.assert_array_equal(column_to_day_fraction(column).to_numpy(), expected)
+
+    def test_typed_columns(self):
+        self.assertEqual(column_to_day_fraction(pd.Series([0.25, 1.5])).tolist(), [0.25, 0.5])
+        self.assertEqual(column_to_day_fraction(pd.Series(pd.to_datetime(['2030-04-01 18:00']))).tolist(), [0.75])
+        self.assertEqual(column_to_day_fraction(pd.Series(pd.to_timedelta(['06:00:00']))).tolist(), [0.25])
+
+    def test_durations_of_a_day_or_more_are_kept(self):
+        for column in [pd.Series([1.25, 0.5]), pd.Series(pd.to_timedelta(['30:00:00', '12:00:00'])),
+                       pd.Series(['30:00', 0.5], dtype=object), pd.Series([datetime.timedelta(hours=30), 0.5], dtype=object)]:
+            with self.subTest(column=column.tolist()):
+                self.assertEqual(column_to_day_fraction(column, duration=True).tolist(), [1.25, 0.5])
+                self.assertEqual(column_to_day_fraction(column).tolist(), [0.25, 0.5])
+
+    def test_block_hours_are_durations(self):
+        df = convert_time_columns_to_fraction(pd.DataFrame({'STD': [1.25], 'Blk Hrs': [1.25]}), ['STD', 'Blk Hrs'])
+        self.assertEqual(df.iloc[0].tolist(), [0.25, 1.25])
+
+    def test_unknown_value(self):
+        with self.assertRaises(TypeError):
+            column_to_day_fraction(pd.Series([object()], dtype=object))
+
+
+class TestDayFractionsToTimeStrings(unittest.TestCase):
+
+    def test_matches_convert_decimal_to_time(self):
+        values = np.concatenate([np.linspace(-1.2, 2.4, 2001), [0.0, 0.5, 1.0, -0.5, 2.5 / 1440, 7.5 / 1440]])
+        expected = [convert_decimal_to_time(value) for value in values]
+        self.assertEqual(day_fractions_to_time_strings(values).tolist(), expected)
+
+    def test_missing_values(self):
+        self.assertEqual(day_fractions_to_time_strings([np.nan, 0.25]).tolist(), [None, '06:00'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import unittest
+import numpy as np
+import pandas as pd
+from classes.airport import AirportRegistry
+from classes.timezone_table import TimezoneTable
+from functions.import_data import import_schedule
+from functions.preprocess import preprocess_schedule
+from functions.time_conversion import add_local_times, schedule_reference_week
+from utils.config import ROOT_DIR
+
+AIRPORT_DATA = {
+    'LHR': {'Latitude': 51.47, 'Longitude': -0.45, 'Timezone': 'Europe/London'},
+    'JFK': {'Latitude': 40.64, 'Longitude': -73.78, 'Timezone': 'America/New_York'},
+    'SYD': {'Latitude': -33.95, 'Longitude': 151.18, 'Timezone': 'Australia/Sydney'},
+    'KTM': {'Latitude': 27.7, 'Longitude': 85.36, 'Timezone': 'Asia/Kathmandu'},
+    'NUL': {'Latitude': 0.0, 'Longitude': 0.0, 'Timezone': None},
+}
+
+
+def naive(values):
+    return np.array(values, dtype='datetime64[ns]')
+
+
+class TestTimezoneTable(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.table = TimezoneTable.build(['LHR', 'JFK', 'SYD', 'KTM', 'LHR'], '2030-03-01', '2030-11-30', AIRPORT_DATA)
+
+    def test_matches_pandas_conversion(self):
+        utc = pd.date_range('2030-03-01', '2030-11-30', freq='37min')
+        for code in ['LHR', 'JFK', 'SYD', 'KTM']:
+            with self.subTest(code=code):
+                expected = utc.tz_localize('UTC').tz_convert(AIRPORT_DATA[code]['Timezone']).tz_localize(None)
+                local = self.table.to_local(np.full(len(utc), code, dtype=object), utc.to_numpy())
+                np.testing.assert_array_equal(local, expected.to_numpy())
+                # Back to UTC, repeated local times taking the offset before the change (DST)
+                expected_utc = expected.tz_localize(AIRPORT_DATA[code]['Timezone'], ambiguous=np.ones(len(utc), dtype=bool))
+                np.testing.assert_array_equal(self.table.to_utc(np.full(len(utc), code, dtype=object), local),
+                                              expected_utc.tz_convert('UTC').tz_localize(None).to_numpy())
+
+    def test_transitions(self):
+        self.assertEqual(len(self.table), 4)
+        # Clocks go forward at 01:00 UTC in London and at 07:00 UTC in New York
+        offsets = self.table.utc_offsets(['LHR', 'LHR', 'JFK', 'JFK'], naive(['2030-03-31T00:59', '2030-03-31T01:00',
+                                                                             '2030-03-10T06:59', '2030-03-10T07:00']))
+        self.assertEqual(offsets.tolist(), [0, 60, -300, -240])
+        self.assertEqual(self.table.utc_offsets(['KTM'], naive(['2030-06-01']))[0], 345)
+
+    def test_gap_and_fold_take_the_offset_before_the_change(self):
+        # 01:30 does not exist in London on 31 March and happens twice on 27 October
+        utc = self.table.to_utc(['LHR', 'LHR'], naive(['2030-03-31T01:30', '2030-10-27T01:30']))
+        np.testing.assert_array_equal(utc, naive(['2030-03-31T01:30', '2030-10-27T00:30']))
+
+    def test_registry_and_errors(self):
+        registry = AirportRegistry.from_airport_data({code: data for code, data in AIRPORT_DATA.items() if code != 'NUL'})
+        table = TimezoneTable.build(['LHR'], '2030-03-30', '2030-04-01', registry)
+        self.assertEqual(table.utc_offsets(['LHR'], naive(['2030-04-01']))[0], 60)
+        with self.assertRaises(KeyError):
+            self.table.to_local(['CDG'], naive(['2030-04-01']))
+        with self.assertRaises(ValueError):
+            self.table.to_local(['LHR'], naive(['2031-04-01']))
+        with self.assertRaises(ValueError):
+            TimezoneTable.build(['NUL'], '2030-04-01', '2030-04-07', AIRPORT_DATA)
+        with self.assertRaises(ValueError):
+            TimezoneTable.build(['LHR'], '2030-04-07', '2030-04-01', AIRPORT_DATA)
+
+
+class TestAddLocalTimes(unittest.TestCase):
+
+    def test_local_times_of_the_reference_week(self):
+        # Monday 10:00 UTC LHR -> JFK, 8 hours: 11:00 in London (BST), 14:00 in New York (EDT)
+        df = pd.DataFrame({'Orig': ['LHR'], 'Dest': ['JFK'], 'Dep Day': ['1......'], 'STD': [10 / 24], 'Blk Hrs': [8 / 24]})
+        summer = add_local_times(df.copy(), '2030-04-01', airport_data=AIRPORT_DATA)
+        self.assertAlmostEqual(summer['DLcl'].iloc[0] * 24, 11)
+        self.assertAlmostEqual(summer['ALcl'].iloc[0] * 24, 14)
+        winter = add_local_times(df.copy(), '2030-01-07', airport_data=AIRPORT_DATA)
+        self.assertAlmostEqual(winter['DLcl'].iloc[0] * 24, 10)
+        self.assertAlmostEqual(winter['ALcl'].iloc[0] * 24, 13)
+
+
+class TestScheduleReferenceWeek(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = import_schedule(os.path.join(ROOT_DIR, 'data', 'schedule_v8.xlsx'), sheet_name='2030')
+
+    def test_week_of_the_earliest_line_date(self):
+        df = pd.DataFrame({'Eff': [pd.NaT, pd.Timestamp('2030-04-03 12:00'), pd.Timestamp('2030-05-01')]})
+        self.assertEqual(schedule_reference_week(df), pd.Timestamp('2030-04-01'))
+        self.assertIsNone(schedule_reference_week(df[:1]))
+        self.assertIsNone(schedule_reference_week(pd.DataFrame({'Orig': ['LHR']})))
+
+    def test_dated_schedules_get_the_local_times_of_their_week(self):
+        undated = preprocess_schedule(self.df.copy(), 'bitmask')
+        self.assertIsNone(schedule_reference_week(undated))
+        for engine in ['bitmask', 'exploded']:
+            for eff, week in [('2030-01-09', '2030-01-07'), ('2030-07-03', '2030-07-01')]:
+                with self.subTest(engine=engine, eff=eff):
+                    df = self.df.copy()
+                    df['Eff'] = pd.Timestamp(eff)
+                    dated = preprocess_schedule(df.copy(), engine)
+                    expected = preprocess_schedule(df, engine, ref_date=week)
+                    pd.testing.assert_frame_equal(dated, expected)
+        # Winter and summer local times differ, so the derived week was applied
+        winter, summer = (preprocess_schedule(self.df.assign(Eff=pd.Timestamp(eff)), 'bitmask') for eff in ['2030-01-09', '2030-07-03'])
+        self.assertFalse(np.allclose(winter['DLcl'], summer['DLcl'], equal_nan=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
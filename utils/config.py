@@ -1,6 +1,11 @@
 # Configuration parameters for the application
 
-import pendulum
+import os
+
+# Reference data lives next to the code, so the pipeline can be imported from any working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AIRPORT_DATA_PATH = os.path.join(ROOT_DIR, 'data', 'airport_data.pkl')
+AIRPORT_REGISTRY_PATH = os.path.join(ROOT_DIR, 'data', 'airport_registry.npy')  # built by classes/airport.py
 
 HUB = 'NUM'
 
@@ -15,8 +20,20 @@ MAX_MISSED_CONNECT_TIME = -120/1440  # in minutes
 MAX_CIRCUITY = 1.5 #multiple of the direct distance
 MAX_ABS_CIRCUITY = 1200 #in km
 
- #Reference date to apply Daylight Savings Time
-REF_DATE = pendulum.now().date()
+# Minimum ground time between an aircraft's arrival and its next departure, when no specific one is defined
+MIN_GROUND_TIME = 45  # in minutes
+
+# Reference week to apply Daylight Savings Time: the date of day 1 (Monday), e.g. datetime.date(2030, 4, 1).
+# Local times are then recomputed from UTC with the offsets of that week. None uses the week of the earliest
+# 'Eff' date of dated schedules and keeps the local times of the file otherwise
+REF_DATE = None
+
+# Cache for parsed and pre-processed schedules, least recently used entries are evicted above the size limit
+CACHE_DIR = os.path.join(ROOT_DIR, 'cache')
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # in bytes
+
+# State kept between incremental builds. Outside the cache directory, so cache eviction never drops it
+STATE_DIR = os.path.join(ROOT_DIR, 'state')
 
 # Time columns that need to be converted to fraction of day 
 time_columns = ['STD', 'STA', 'DLcl', 'ALcl', 'Blk Hrs']
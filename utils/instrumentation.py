@@ -0,0 +1,269 @@
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, the process peak memory is then not reported
+    resource = None
+
+
+def count_rows(value):
+    """
+    Counts the rows of a stage input or output: a DataFrame, or a tuple/list of DataFrames.
+
+    Parameters:
+    value: The stage input or output.
+
+    Returns:
+    int or None: Total number of rows, None if nothing in the value has rows.
+    """
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        counts = [count_rows(item) for item in value]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def max_rss_bytes():
+    """
+    Returns the peak resident memory of the process so far, or None where it cannot be read.
+
+    Returns:
+    int or None: Bytes.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def cache_counters(caches):
+    """
+    Reads the hit and miss counters of the monitored caches.
+
+    Parameters:
+    caches (dict): Name -> functools.lru_cache wrapped function, or a dict with 'hits' and 'misses'.
+
+    Returns:
+    dict: Name -> (hits, misses).
+    """
+    counters = {}
+    for name, cache in caches.items():
+        if hasattr(cache, 'cache_info'):
+            info = cache.cache_info()
+            counters[name] = (info.hits, info.misses)
+        else:
+            counters[name] = (cache['hits'], cache['misses'])
+    return counters
+
+
+class RunReport:
+    """
+    Records wall time, memory, row counts and cache hits for every stage of a pipeline run.
+
+    Stages are run through RunReport.stage. Stages may be nested (e.g. the pre-processing
+    stages inside a cache miss), nested stages record their parent and are left out of the total.
+    """
+
+    def __init__(self, name = 'pipeline', caches = None, trace_memory = False, profile_stage = None, profile_path = None, profile_limit = 25):
+        """
+        Parameters:
+        name (str): Name of the run.
+        caches (dict): Caches whose hits and misses are reported per stage, see cache_counters.
+        trace_memory (bool): Measure the peak Python memory of every stage with tracemalloc. Exact,
+            but slows allocation-heavy stages down. Without it only the process peak is reported.
+        profile_stage (str): Name of a stage to run under cProfile, None to profile nothing.
+        profile_path (str): Where to dump the profile (.prof, for snakeviz/pstats). Not dumped if None.
+        profile_limit (int): Number of functions by cumulative time kept in the report.
+        """
+        self.name = name
+        self.caches = caches or {}
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path
+        self.profile_limit = profile_limit
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.stages = []
+        self.profile = None
+        self._stack = []
+
+        # Only a report that started tracing stops it, an outer tracemalloc session is left running
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stops memory tracing if this report started it. Called by write_json and print_summary."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def stage(self, name, function, *args, **kwargs):
+        """
+        Runs function(*args, **kwargs) as a named stage and records it.
+
+        Rows in are counted on the first positional argument, rows out on the result.
+
+        Parameters:
+        name (str): Name of the stage.
+        function (callable): The stage.
+        *args, **kwargs: Arguments of the stage.
+
+        Returns:
+        The result of the stage.
+        """
+        record = {'stage': name, 'parent': self._stack[-1]['record']['stage'] if self._stack else None,
+                  'rows_in': count_rows(args[0]) if args else None}
+        # The tracemalloc peak is global: a nested stage resets it, so it hands its own peak up to the parent
+        frame = {'record': record, 'child_peak': 0}
+        self._stack.append(frame)
+        caches_before = cache_counters(self.caches)
+        if self.trace_memory:
+            traced_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        except Exception as error:
+            record['error'] = f'{type(error).__name__}: {error}'
+            raise
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame['child_peak'])
+                record['peak_traced_bytes'] = peak - traced_before
+                record['retained_traced_bytes'] = current - traced_before
+            record['max_rss_bytes'] = max_rss_bytes()
+            record['caches'] = {
+                cache: {'hits': hits - caches_before[cache][0], 'misses': misses - caches_before[cache][1]}
+                for cache, (hits, misses) in cache_counters(self.caches).items()
+                if (hits, misses) != caches_before[cache]
+            }
+            self._stack.pop()
+            if self.trace_memory and self._stack:
+                self._stack[-1]['child_peak'] = max(self._stack[-1]['child_peak'], peak)
+            self.stages.append(record)
+            if profiler is not None:
+                self._save_profile(name, profiler)
+
+        record['rows_out'] = count_rows(result)
+        return result
+
+    def _save_profile(self, name, profiler):
+        if self.profile_path is not None:
+            profile_dir = os.path.dirname(self.profile_path)
+            if profile_dir:
+                os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(self.profile_path)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(self.profile_limit)
+        self.profile = {'stage': name, 'path': self.profile_path, 'top_cumulative': text.getvalue().splitlines()}
+
+    @property
+    def total_seconds(self):
+        return sum(record['seconds'] for record in self.stages if record['parent'] is None)
+
+    def slowest_stage(self):
+        """
+        Returns the top-level stage that took the longest, or None if no stage has run.
+
+        Returns:
+        dict or None: The stage record.
+        """
+        top_level = [record for record in self.stages if record['parent'] is None]
+        return max(top_level, key=lambda record: record['seconds'], default=None)
+
+    def to_dict(self):
+        """
+        Returns the report as a JSON-serializable dict.
+
+        Returns:
+        dict: Run name, start time, total and slowest stage, stage records in completion order, profile.
+        """
+        slowest = self.slowest_stage()
+        return {
+            'name': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'total_seconds': self.total_seconds,
+            'slowest_stage': slowest['stage'] if slowest else None,
+            'stages': self.stages,
+            'profile': self.profile,
+        }
+
+    def to_frame(self):
+        """
+        Returns one row per stage, with its share of the total run time, e.g. for a summary sheet.
+
+        Returns:
+        pandas.DataFrame: The stage summary.
+        """
+        total = self.total_seconds
+        rows = []
+        for record in self.stages:
+            rows.append({
+                'Stage': record['stage'],
+                'Parent stage': record['parent'],
+                'Seconds': round(record['seconds'], 4),
+                'Share of run': round(record['seconds'] / total, 4) if total and record['parent'] is None else None,
+                'Rows in': record['rows_in'],
+                'Rows out': record.get('rows_out'),
+                'Peak traced memory (MiB)': round(record['peak_traced_bytes'] / 2**20, 1) if 'peak_traced_bytes' in record else None,
+                'Process peak memory (MiB)': round(record['max_rss_bytes'] / 2**20, 1) if record['max_rss_bytes'] is not None else None,
+                'Cache hits': ', '.join(f"{cache} {counts['hits']}/{counts['hits'] + counts['misses']}"
+                                        for cache, counts in record['caches'].items()),
+                'Error': record.get('error'),
+            })
+        return pd.DataFrame(rows)
+
+    def write_json(self, path):
+        """
+        Writes the report as JSON.
+
+        Parameters:
+        path (str): Path of the report file.
+        """
+        self.close()
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+    def print_summary(self):
+        """Prints the time of every top-level stage and its share of the run, marking the slowest."""
+        self.close()
+        total = self.total_seconds
+        slowest = self.slowest_stage()
+        for record in self.stages:
+            if record['parent'] is not None:
+                continue
+            marker = '  <- slowest' if record is slowest else ''
+            share = record['seconds'] / total if total else 0
+            print(f"{record['stage']:<34} {record['seconds']:9.3f} s {share:6.1%}{marker}")
+        print(f"{'Total':<34} {total:9.3f} s")